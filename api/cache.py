@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with hit/miss counters. With `ttl` (seconds)
+    set, entries also expire that long after they were stored.
+
+    `get_or_compute` and `aget_or_compute` deduplicate in-flight work: when
+    several callers miss on the same key at once, only the first one computes
+    the value and the others wait on its result.
+    """
+
+    def __init__(self, maxsize: int, name: Optional[str] = None, ttl: float = 0):
+        self.maxsize = max(0, maxsize)
+        self.name = name
+        self.ttl = max(0.0, ttl)
+        self._data = OrderedDict()
+        self._expires_at = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if self._live(key):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._expires_at.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expires_at.clear()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, computing it with `compute()` on a miss.
+        """
+        value, future, owner = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            self._complete(key, future, exception=e)
+            raise
+        self._complete(key, future, value=value)
+        return value
+
+    async def aget_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async variant of `get_or_compute`; `compute` is a coroutine function.
+        """
+        value, future, owner = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        if not owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            self._complete(key, future, exception=e)
+            raise
+        self._complete(key, future, value=value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_inflight": self.shared,
+                "evictions": self.evictions,
+                "ttl_seconds": self.ttl,
+                "expirations": self.expirations,
+                "hit_rate": ((self.hits + self.shared) / lookups) if lookups else 0.0,
+            }
+
+    def _lookup(self, key: Hashable):
+        with self._lock:
+            if self._live(key):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key], None, False
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.shared += 1
+                return _MISSING, future, False
+
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return _MISSING, future, True
+
+    def _complete(self, key: Hashable, future: Future, value: Any = _MISSING, exception: BaseException = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if exception is None:
+                self._store(key, value)
+
+        if exception is None:
+            future.set_result(value)
+        else:
+            future.set_exception(exception)
+
+    def _live(self, key: Hashable) -> bool:
+        """
+        Whether `key` is cached and not expired; expired entries are dropped.
+        """
+        if key not in self._data:
+            return False
+        if self.ttl and self._expires_at[key] <= time.monotonic():
+            del self._data[key]
+            del self._expires_at[key]
+            self.expirations += 1
+            return False
+        return True
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if self.maxsize == 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.ttl:
+            self._expires_at[key] = time.monotonic() + self.ttl
+        while len(self._data) > self.maxsize:
+            evicted, _ = self._data.popitem(last=False)
+            self._expires_at.pop(evicted, None)
+            self.evictions += 1
@@ -0,0 +1,257 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+from typing import List
+
+import clip
+import numpy as np
+import torch
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torchscript", "onnx")
+
+# Sample queries used for the text-tower parity check
+PARITY_TEXTS = [
+    "clear PET bottle",
+    "aluminum can",
+    "crushed cardboard box",
+    "black plastic film",
+]
+
+
+class _VisualTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        return self.model.encode_image(image)
+
+
+class _TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+class TorchClipBackend:
+    """
+    PyTorch eager execution of the fine-tuned CLIP model.
+    """
+
+    name = "torch"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def encode_image(self, batch: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.model.encode_image(batch.to(self.device)).float().cpu().numpy()
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.model.encode_text(tokens.to(self.device)).float().cpu().numpy()
+
+
+class TorchScriptClipBackend:
+    """
+    Traced, frozen TorchScript modules for the visual and text towers.
+    """
+
+    name = "torchscript"
+
+    def __init__(self, model, device):
+        self.device = device
+        export_dir = _export_dir()
+        image_example, text_example = _examples(model, device)
+        self.visual = self._load_or_trace(
+            os.path.join(export_dir, "visual.torchscript.pt"), _VisualTower(model), image_example
+        )
+        self.text = self._load_or_trace(
+            os.path.join(export_dir, "text.torchscript.pt"), _TextTower(model), text_example
+        )
+
+    def _load_or_trace(self, path: str, module: torch.nn.Module, example: torch.Tensor):
+        if os.path.exists(path):
+            logger.info(f"Loading TorchScript module {path}")
+            return torch.jit.load(path, map_location=self.device)
+
+        started = time.monotonic()
+        with torch.no_grad():
+            traced = torch.jit.trace(module.eval(), example)
+            traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        _atomic_save(path, lambda tmp: torch.jit.save(traced, tmp))
+        logger.info(f"Traced TorchScript module {path} in {time.monotonic() - started:.2f}s")
+        return traced
+
+    def encode_image(self, batch: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.visual(batch.to(self.device)).float().cpu().numpy()
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.text(tokens.to(self.device)).float().cpu().numpy()
+
+
+class OnnxClipBackend:
+    """
+    ONNX Runtime (CPU execution provider) sessions for the visual and text towers.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model, device):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("CLIP_BACKEND=onnx requires the onnxruntime package") from e
+
+        export_dir = _export_dir()
+        image_example, text_example = _examples(model, device)
+        visual_path = os.path.join(export_dir, "visual.onnx")
+        text_path = os.path.join(export_dir, "text.onnx")
+        self._export(visual_path, _VisualTower(model), image_example, "image")
+        self._export(text_path, _TextTower(model), text_example, "tokens")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+        providers = ["CPUExecutionProvider"]
+        self.visual = ort.InferenceSession(visual_path, options, providers=providers)
+        self.text = ort.InferenceSession(text_path, options, providers=providers)
+
+    @staticmethod
+    def _export(path: str, module: torch.nn.Module, example: torch.Tensor, input_name: str):
+        if os.path.exists(path):
+            return
+
+        started = time.monotonic()
+        with torch.no_grad():
+            _atomic_save(path, lambda tmp: torch.onnx.export(
+                module.eval(),
+                (example,),
+                tmp,
+                input_names=[input_name],
+                output_names=["embedding"],
+                dynamic_axes={input_name: {0: "batch"}, "embedding": {0: "batch"}},
+                opset_version=17,
+            ))
+        logger.info(f"Exported ONNX model {path} in {time.monotonic() - started:.2f}s")
+
+    def encode_image(self, batch: torch.Tensor) -> np.ndarray:
+        return self.visual.run(None, {"image": batch.cpu().numpy().astype(np.float32)})[0]
+
+    def encode_text(self, tokens: torch.Tensor) -> np.ndarray:
+        return self.text.run(None, {"tokens": tokens.cpu().numpy()})[0]
+
+
+def build_clip_backend(model, device, name: str = None):
+    """
+    Build the CLIP backend selected by `settings.clip_backend`. Non-torch
+    backends must match the PyTorch embeddings within
+    `settings.clip_backend_cosine_tolerance`. An export that fails the check
+    is deleted and exported again once; only if that still fails is the
+    PyTorch backend used instead.
+    """
+    name = name or settings.clip_backend
+    reference = TorchClipBackend(model, device)
+    if name == "torch":
+        return reference
+    if name not in BACKENDS:
+        logger.error(f"Unknown CLIP_BACKEND={name}; using torch")
+        return reference
+    if name == "onnx" and str(device) != "cpu":
+        logger.warning("The ONNX backend only runs on CPU; using torch")
+        return reference
+    if name == "onnx" and settings.clip_quantize:
+        logger.warning("Dynamically quantized CLIP cannot be exported to ONNX; using torch")
+        return reference
+
+    backend_class = TorchScriptClipBackend if name == "torchscript" else OnnxClipBackend
+    for attempt in range(2):
+        started = time.monotonic()
+        try:
+            backend = backend_class(model, device)
+        except ImportError as e:
+            logger.warning(f"{e}; using torch")
+            return reference
+        except Exception as e:
+            logger.error(f"Could not build the {name} CLIP backend ({e}); using torch")
+            return reference
+        logger.info(f"Built {name} CLIP backend in {time.monotonic() - started:.2f}s")
+
+        parity = check_parity(reference, backend, model, device)
+        if parity["min_cosine"] >= 1.0 - settings.clip_backend_cosine_tolerance:
+            logger.info(f"{name} CLIP backend passed the parity check ({parity})")
+            return backend
+        if attempt == 0:
+            logger.warning(f"{name} CLIP backend failed the parity check ({parity}); re-exporting")
+            shutil.rmtree(_export_dir(), ignore_errors=True)
+
+    logger.error(f"Re-exported {name} CLIP backend failed the parity check ({parity}); using torch")
+    return reference
+
+
+def check_parity(reference, candidate, model, device, batch_size: int = 4) -> dict:
+    """
+    Compare the embeddings of two backends on a fixed image batch and the
+    sample text queries; returns the per-tower minimum cosine similarity.
+    """
+    generator = torch.Generator().manual_seed(0)
+    resolution = model.visual.input_resolution
+    images = torch.randn(batch_size, 3, resolution, resolution, generator=generator)
+    images = images.to(dtype=next(model.parameters()).dtype)
+    tokens = clip.tokenize(PARITY_TEXTS)
+
+    image_cosine = _min_cosine(reference.encode_image(images), candidate.encode_image(images))
+    text_cosine = _min_cosine(reference.encode_text(tokens), candidate.encode_text(tokens))
+    return {
+        "image_min_cosine": image_cosine,
+        "text_min_cosine": text_cosine,
+        "min_cosine": min(image_cosine, text_cosine),
+    }
+
+
+def _min_cosine(a: np.ndarray, b: np.ndarray) -> float:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.min(np.sum(a * b, axis=1)))
+
+
+def _examples(model, device) -> List[torch.Tensor]:
+    resolution = model.visual.input_resolution
+    dtype = next(model.parameters()).dtype
+    image_example = torch.zeros(1, 3, resolution, resolution, dtype=dtype, device=device)
+    text_example = clip.tokenize(PARITY_TEXTS[:1]).to(device)
+    return [image_example, text_example]
+
+
+def _export_dir() -> str:
+    """
+    Exported artifacts live next to the cached weights, one folder per model
+    version. The version includes the weights' SHA-256, so new weights at
+    the same S3 key are re-exported automatically.
+    """
+    digest = hashlib.sha256(settings.model_version.encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(settings.weights_cache_dir, "exported", digest)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _atomic_save(path: str, save):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,8 +1,11 @@
 import os
+import threading
 import boto3
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+from api.connection_pool import configure_pool, pinecone_pool_manager
+
 load_dotenv(".env.development")
 
 
@@ -16,16 +19,116 @@ class Settings:
         self.aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
         self.aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
         self.s3_clients = {}  # Dictionary to cache clients by region
+        # Presigned URLs are reused until this many seconds before they expire
+        self.presigned_url_expires_seconds = int(os.getenv("PRESIGNED_URL_EXPIRES_SECONDS", 3600))
+        self.presigned_url_refresh_margin_seconds = int(os.getenv("PRESIGNED_URL_REFRESH_MARGIN_SECONDS", 600))
+        self.presigned_url_cache_size = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", 20000))
+        # Small crop thumbnails served by search (api/thumbnails.py)
+        self.thumbnails_enabled = os.getenv("THUMBNAILS_ENABLED", "true").lower() == "true"
+        self.thumbnail_max_side = int(os.getenv("THUMBNAIL_MAX_SIDE", 256))
+        # "webp" or "jpeg"; WebP falls back to JPEG if Pillow lacks WebP support
+        self.thumbnail_format = os.getenv("THUMBNAIL_FORMAT", "webp").lower()
+        self.thumbnail_quality = int(os.getenv("THUMBNAIL_QUALITY", 80))
 
         # Pinecone services
         self.api_key = os.getenv("PINECONE_API_KEY")
         self.index_name = os.getenv("PINECONE_INDEX_NAME")
         self.k = int(os.getenv("PINECONE_TOP_K", 20))
+        # One pooled client per process (see get_pinecone_index)
+        self.pinecone_pool_maxsize = int(os.getenv("PINECONE_POOL_MAXSIZE", os.getenv("IO_WORKERS", 32)))
+        self.pinecone_keepalive_seconds = int(os.getenv("PINECONE_KEEPALIVE_SECONDS", 60))
+        self.pinecone_connect_timeout = float(os.getenv("PINECONE_CONNECT_TIMEOUT", 5))
+        self.pinecone_read_timeout = float(os.getenv("PINECONE_READ_TIMEOUT", 30))
+        self._pinecone_index = None
+        self._pinecone_lock = threading.Lock()
+
+        # Vector store backend: "pinecone" or "local" (api/vector_store.py)
+        self.vector_store = os.getenv("VECTOR_STORE", "pinecone")
+        # Snapshot directory the local store is loaded from and saved to
+        self.vector_store_path = os.getenv("VECTOR_STORE_PATH", "")
+        self.vector_store_metric = os.getenv("VECTOR_STORE_METRIC", "cosine")
+        # The local store switches from exact search to HNSW at this size
+        self.vector_store_ann_threshold = int(os.getenv("VECTOR_STORE_ANN_THRESHOLD", 20000))
+        self.hnsw_m = int(os.getenv("HNSW_M", 16))
+        self.hnsw_ef_construction = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+        self.hnsw_ef_search = int(os.getenv("HNSW_EF_SEARCH", 64))
+        # Serve Pinecone queries from an in-memory mirror bootstrapped from VECTOR_STORE_PATH
+        self.vector_mirror = os.getenv("VECTOR_MIRROR", "false").lower() == "true"
+        self.vector_mirror_reconcile_seconds = float(os.getenv("VECTOR_MIRROR_RECONCILE_SECONDS", 300))
+        # Queries fall back to Pinecone when the mirror was last synced longer ago than this
+        self.vector_mirror_max_staleness_seconds = float(os.getenv("VECTOR_MIRROR_MAX_STALENESS_SECONDS", 900))
+        # Cache of top-k query results; writes through the API invalidate it in every
+        # pre-forked worker, other writes show up within the TTL
+        self.query_cache_size = int(os.getenv("QUERY_CACHE_SIZE", 2048))
+        self.query_cache_ttl_seconds = float(os.getenv("QUERY_CACHE_TTL_SECONDS", 300))
+        # Pinecone applies writes eventually; results of queries made this soon after a
+        # write through the API are not cached
+        self.query_cache_write_settle_seconds = float(os.getenv("QUERY_CACHE_WRITE_SETTLE_SECONDS", 10))
+
+        # Crop metadata log (api/metadata_log.py): fold segments into the snapshot
+        # every this many seconds; 0 leaves compaction to scripts/compact_metadata_log.py
+        self.metadata_compaction_seconds = float(os.getenv("METADATA_COMPACTION_SECONDS", 3600))
+        # Segments younger than this are left for the next compaction
+        self.metadata_log_compact_grace_seconds = float(os.getenv("METADATA_LOG_COMPACT_GRACE_SECONDS", 900))
+        # Attempts at a conditional (ETag) metadata write before giving up on conflicts
+        self.metadata_write_max_attempts = int(os.getenv("METADATA_WRITE_MAX_ATTEMPTS", 5))
+        # The in-memory metadata table checks S3 for changes at most this often
+        self.metadata_table_refresh_seconds = float(os.getenv("METADATA_TABLE_REFRESH_SECONDS", 10))
+        # Group commit: metadata writes arriving within this window share one segment
+        self.metadata_commit_max_wait_ms = float(os.getenv("METADATA_COMMIT_MAX_WAIT_MS", 200))
+        self.metadata_commit_max_records = int(os.getenv("METADATA_COMMIT_MAX_RECORDS", 500))
 
         # Model path
         self.model_path = os.getenv("MODEL_PATH")
         self.model = os.getenv("MODEL")
         self.model_dim = int(os.getenv("MODEL_DIM", 512))
+        # Quantize CLIP's Linear layers to int8 (CPU only)
+        self.clip_quantize = os.getenv("CLIP_QUANTIZE", "false").lower() == "true"
+        # SHA-256 of the fine-tuned weights, set once they are fetched (see model_version)
+        self.model_weights_sha256 = None
+
+        # Local model weights cache
+        self.weights_cache_dir = os.getenv("WEIGHTS_CACHE_DIR", "/tmp/udo-weights")
+        # Skip the S3 HEAD check and use the newest cached weights
+        self.weights_offline = os.getenv("WEIGHTS_OFFLINE", "false").lower() == "true"
+        # Re-check the SHA-256 of cached weights before loading them
+        self.weights_cache_verify = os.getenv("WEIGHTS_CACHE_VERIFY", "true").lower() == "true"
+        # CLIP inference runtime: "torch", "torchscript" or "onnx" (onnxruntime, see requirements-optional.txt)
+        self.clip_backend = os.getenv("CLIP_BACKEND", "torch").lower()
+        # Max allowed 1 - cosine between the selected backend and PyTorch embeddings
+        self.clip_backend_cosine_tolerance = float(os.getenv("CLIP_BACKEND_COSINE_TOLERANCE", 1e-3))
+        # Models to load at startup instead of on first use ("clip", "detect_model")
+        self.warmup_models = [
+            name.strip() for name in os.getenv("WARMUP_MODELS", "").split(",") if name.strip()
+        ]
+
+        # Embedding micro-batching
+        self.embed_batch_max_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+        self.embed_batch_max_wait_ms = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+        # Reduced-resolution JPEG decoding before CLIP preprocessing
+        self.fast_image_decode = os.getenv("FAST_IMAGE_DECODE", "true").lower() == "true"
+
+        # Pre-forked serving (api/gunicorn_conf.py)
+        self.serve_workers = int(os.getenv("SERVE_WORKERS", 2))
+        # Torch intra-op threads per worker; 0 splits the CPU cores evenly across workers
+        self.torch_threads_per_worker = int(os.getenv("TORCH_THREADS_PER_WORKER", 0))
+
+        # Executors for blocking work (queue size 0 means unbounded)
+        self.inference_workers = int(os.getenv("INFERENCE_WORKERS", 2))
+        self.inference_max_queue = int(os.getenv("INFERENCE_MAX_QUEUE", 64))
+        self.io_workers = int(os.getenv("IO_WORKERS", 32))
+        self.io_max_queue = int(os.getenv("IO_MAX_QUEUE", 256))
+
+        # /search/batch: queries per request, and vector lookups in flight per request
+        self.search_batch_max_queries = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", 256))
+        self.search_batch_concurrency = int(os.getenv("SEARCH_BATCH_CONCURRENCY", 16))
+
+        # Embedding caches
+        self.text_embedding_cache_size = int(os.getenv("TEXT_EMBEDDING_CACHE_SIZE", 1024))
+        self.image_embedding_cache_size = int(os.getenv("IMAGE_EMBEDDING_CACHE_SIZE", 2048))
+        # Optional on-disk tier for image embeddings; disabled when unset
+        self.image_embedding_cache_dir = os.getenv("IMAGE_EMBEDDING_CACHE_DIR", "")
+        self.image_embedding_cache_disk_mb = int(os.getenv("IMAGE_EMBEDDING_CACHE_DISK_MB", 512))
 
         # Google OAuth
         self.google_client_id = os.getenv("GOOGLE_CLIENT_ID")
@@ -34,6 +137,18 @@ class Settings:
         self.jwt_secret = os.getenv("JWT_SECRET")
         self.allowed_emails = os.getenv("ALLOWED_EMAILS", "").split(",")
 
+    @property
+    def model_version(self) -> str:
+        """
+        Identifies the embedding space; part of every embedding cache key.
+        Includes the weights digest once CLIP is loaded, so weights replaced
+        at the same S3 key never reuse embeddings of the old ones.
+        """
+        version = f"{self.model}:{self.model_path}" + (":int8" if self.clip_quantize else "")
+        if self.model_weights_sha256:
+            version += f":{self.model_weights_sha256[:16]}"
+        return version
+
     def get_s3_client(self, region_name=None):
         """Get or create an S3 client for the specified region."""
         region_name = region_name or self.default_region
@@ -51,34 +166,42 @@ class Settings:
 
     def get_pinecone_index(self):
         """
-        Initialize and return the Pinecone index.
+        Return the process-wide Pinecone index handle, creating it on first use.
+        Its connection pool is sized to PINECONE_POOL_MAXSIZE with TCP keep-alive.
         """
+        if self._pinecone_index is not None:
+            return self._pinecone_index
         if not self.api_key or not self.index_name:
             raise ValueError("Pinecone API key or index name is not set.")
 
-        pc = Pinecone(api_key=self.api_key, source_tag="pinecone:stl_sample_app")
-        return pc.Index(self.index_name)
+        # Concurrent first calls from the I/O pool must not each build a client
+        with self._pinecone_lock:
+            if self._pinecone_index is None:
+                pc = Pinecone(api_key=self.api_key, source_tag="pinecone:stl_sample_app")
+                index = pc.Index(self.index_name)
+                pool_manager = pinecone_pool_manager(index)
+                if pool_manager is not None:
+                    configure_pool(pool_manager, self.pinecone_pool_maxsize, self.pinecone_keepalive_seconds)
+                self._pinecone_index = index
+        return self._pinecone_index
+
+    def reset_clients(self):
+        """
+        Drop cached clients, e.g. in a forked worker whose connections would
+        otherwise be shared with the parent.
+        """
+        self.s3_clients = {}
+        self._pinecone_index = None
+        self._pinecone_lock = threading.Lock()
 
     def generate_presigned_url(self, s3_uri):
-        if not s3_uri:
-            return None
-
-        path_without_prefix = s3_uri[5:]
-        bucket_name, key = path_without_prefix.split("/", 1)
-
-        region_name = (
-            "us-east-1" if bucket_name == "glacier-ml-training"
-            else "us-west-2" if bucket_name == "scanner-data.us-west-2"
-            else self.default_region
-        )
-
-        s3_client = self.get_s3_client(region_name=region_name)
+        """
+        Presigned GET URL for an s3:// URI, reused from the presigned URL cache
+        until shortly before it expires.
+        """
+        from api.presign import presigned_urls
 
-        return s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket_name, "Key": key},
-            ExpiresIn=3600,
-        )
+        return presigned_urls.sign(s3_uri)
 
 
 settings = Settings()
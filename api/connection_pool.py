@@ -0,0 +1,70 @@
+import logging
+import socket
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def keepalive_socket_options(idle_seconds: int) -> list:
+    """
+    TCP keep-alive options so idle pooled connections aren't silently
+    dropped by load balancers between bursts of traffic.
+    """
+    from urllib3.connection import HTTPConnection
+
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # Linux-only knobs
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle_seconds))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle_seconds // 4)))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4))
+    return options
+
+
+def pinecone_pool_manager(index):
+    """
+    urllib3 PoolManager behind a Pinecone Index handle, or None if the client
+    library's layout differs from the pinned pinecone-client version.
+    """
+    try:
+        return index._vector_api.api_client.rest_client.pool_manager
+    except AttributeError:
+        return None
+
+
+def configure_pool(pool_manager, maxsize: int, keepalive_seconds: int):
+    """
+    Size the pool and enable keep-alive. Must run before the first request,
+    since urllib3 creates the per-host pools lazily from these settings.
+    """
+    pool_manager.connection_pool_kw.update(
+        maxsize=maxsize,
+        block=False,
+        socket_options=keepalive_socket_options(keepalive_seconds),
+    )
+
+
+def pool_stats(pool_manager) -> Optional[dict]:
+    """
+    Connections opened versus requests served by a urllib3 PoolManager;
+    every request beyond the first on a connection reused it.
+    """
+    if pool_manager is None:
+        return None
+    opened = 0
+    requests = 0
+    for key in pool_manager.pools.keys():
+        pool = pool_manager.pools.get(key)
+        if pool is None:
+            continue
+        opened += pool.num_connections
+        requests += pool.num_requests
+    return {
+        "pools": len(pool_manager.pools),
+        "maxsize": pool_manager.connection_pool_kw.get("maxsize"),
+        "connections_opened": opened,
+        "requests": requests,
+        "connections_reused": max(0, requests - opened),
+        "reuse_rate": (max(0, requests - opened) / requests) if requests else 0.0,
+    }
@@ -0,0 +1,309 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from api.cache import LRUCache
+from api.config import settings
+from api.embedding_service import embedding_service
+from api.executors import inference_executor, io_executor
+from api.resources import resources
+
+logger = logging.getLogger(__name__)
+
+
+class DiskEmbeddingCache:
+    """
+    Size-bounded on-disk embedding store. Each entry is one file of raw
+    float32 values; the least recently used files are removed once the
+    directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> size, oldest first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def get(self, namespace: str, key: str) -> Optional[List[float]]:
+        path = self._path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._forget(path)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        return np.frombuffer(data, dtype=np.float32).tolist()
+
+    def put(self, namespace: str, key: str, embedding: List[float]) -> None:
+        path = self._path(namespace, key)
+        data = np.asarray(embedding, dtype=np.float32).tobytes()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write embedding cache entry {path}: {e}")
+            return
+
+        with self._lock:
+            self._forget(path)
+            self._entries[path] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _path(self, namespace: str, key: str) -> str:
+        return os.path.join(self.directory, namespace, f"{key}.f32")
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".f32"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _forget(self, path: str):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ImageEmbeddingCache:
+    """
+    Content-addressed image embedding cache shared by every endpoint that
+    embeds image bytes. Keys are the SHA-256 of the bytes plus the model
+    version; lookups go memory first, then the optional disk tier.
+
+    The disk tier outlives the process, so with it enabled CLIP is loaded
+    before the first lookup: the model version then includes the digest of
+    the weights, which can change at the same S3 key.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[DiskEmbeddingCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    @staticmethod
+    def content_key(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def namespace(self) -> str:
+        if self.disk and not resources.is_loaded("clip"):
+            resources.clip
+        return hashlib.sha256(settings.model_version.encode("utf-8")).hexdigest()[:16]
+
+    async def anamespace(self) -> str:
+        if self.disk and not resources.is_loaded("clip"):
+            await inference_executor.run(lambda: resources.clip)
+        return self.namespace()
+
+    def get_or_compute(self, image_bytes: bytes, compute: Callable[[], List[float]]) -> List[float]:
+        namespace, key = self.namespace(), self.content_key(image_bytes)
+
+        def load():
+            embedding = self.disk.get(namespace, key) if self.disk else None
+            if embedding is None:
+                embedding = compute()
+                if self.disk:
+                    self.disk.put(namespace, key, embedding)
+            return embedding
+
+        return self.memory.get_or_compute((namespace, key), load)
+
+    async def aget_or_compute(
+        self, image_bytes: bytes, compute: Callable[[], Awaitable[List[float]]]
+    ) -> List[float]:
+        namespace, key = await self.anamespace(), self.content_key(image_bytes)
+
+        async def load():
+            embedding = await io_executor.run(self.disk.get, namespace, key) if self.disk else None
+            if embedding is None:
+                embedding = await compute()
+                if self.disk:
+                    await io_executor.run(self.disk.put, namespace, key, embedding)
+            return embedding
+
+        return await self.memory.aget_or_compute((namespace, key), load)
+
+    async def aget(self, image_bytes: bytes) -> Optional[List[float]]:
+        """
+        Cached embedding for `image_bytes` (memory, then disk), or None.
+        """
+        namespace, key = await self.anamespace(), self.content_key(image_bytes)
+        embedding = self.memory.get((namespace, key))
+        if embedding is None and self.disk:
+            embedding = await io_executor.run(self.disk.get, namespace, key)
+            if embedding is not None:
+                self.memory.put((namespace, key), embedding)
+        return embedding
+
+    async def aput(self, image_bytes: bytes, embedding: List[float]):
+        namespace, key = await self.anamespace(), self.content_key(image_bytes)
+        self.memory.put((namespace, key), embedding)
+        if self.disk:
+            await io_executor.run(self.disk.put, namespace, key, embedding)
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk else None,
+        }
+
+
+text_embedding_cache = LRUCache(settings.text_embedding_cache_size, name="text_embeddings")
+
+image_embedding_cache = ImageEmbeddingCache(
+    LRUCache(settings.image_embedding_cache_size, name="image_embeddings"),
+    DiskEmbeddingCache(
+        settings.image_embedding_cache_dir,
+        settings.image_embedding_cache_disk_mb * 1024 * 1024,
+    ) if settings.image_embedding_cache_dir else None,
+)
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a search query for cache lookups. CLIP's tokenizer already
+    lowercases and collapses whitespace, so this never changes the embedding.
+    """
+    return " ".join(text.split()).lower()
+
+
+async def aencode_text_cached(text: str) -> List[float]:
+    """
+    Encode a text query, reusing the embedding of an identical earlier query.
+    Concurrent identical queries share a single encode.
+    """
+    normalized = normalize_query(text)
+    key = (settings.model_version, normalized)
+    return await text_embedding_cache.aget_or_compute(
+        key, lambda: embedding_service.aencode_text(normalized)
+    )
+
+
+def encode_image_bytes_cached(image_bytes: bytes) -> List[float]:
+    """
+    Encode raw image bytes, reusing the embedding of identical bytes seen before.
+    """
+    def compute():
+        return embedding_service.submit_image_bytes([image_bytes]).result()[0]
+
+    return image_embedding_cache.get_or_compute(image_bytes, compute)
+
+
+async def aencode_image_bytes_cached(image_bytes: bytes) -> List[float]:
+    """
+    Async variant of `encode_image_bytes_cached`.
+    """
+    async def compute():
+        return (await embedding_service.aencode_image_bytes([image_bytes]))[0]
+
+    return await image_embedding_cache.aget_or_compute(image_bytes, compute)
+
+
+async def aencode_texts_cached(texts: List[str]) -> List[List[float]]:
+    """
+    Encode many text queries, batching the ones not cached into forward
+    passes of up to `EMBED_BATCH_MAX_SIZE`.
+    """
+    normalized = [normalize_query(text) for text in texts]
+    embeddings = [text_embedding_cache.get((settings.model_version, text)) for text in normalized]
+    missing = list(dict.fromkeys(text for text, embedding in zip(normalized, embeddings) if embedding is None))
+    if missing:
+        chunks = await asyncio.gather(*[
+            asyncio.wrap_future(embedding_service.submit_texts(chunk)) for chunk in _chunks(missing)
+        ])
+        encoded = dict(zip(missing, [embedding for chunk in chunks for embedding in chunk]))
+        for text, embedding in encoded.items():
+            text_embedding_cache.put((settings.model_version, text), embedding)
+        embeddings = [embedding if embedding is not None else encoded[text] for text, embedding in zip(normalized, embeddings)]
+    return embeddings
+
+
+async def aencode_images_bytes_cached(images: List[bytes]) -> List[List[float]]:
+    """
+    Encode many images, batching the ones not cached into forward passes of
+    up to `EMBED_BATCH_MAX_SIZE`.
+    """
+    embeddings = list(await asyncio.gather(*[image_embedding_cache.aget(image_bytes) for image_bytes in images]))
+    missing = {}
+    for image_bytes, embedding in zip(images, embeddings):
+        if embedding is None:
+            missing.setdefault(ImageEmbeddingCache.content_key(image_bytes), image_bytes)
+    if missing:
+        chunks = await asyncio.gather(*[
+            embedding_service.aencode_image_bytes(chunk) for chunk in _chunks(list(missing.values()))
+        ])
+        encoded = dict(zip(missing, [embedding for chunk in chunks for embedding in chunk]))
+        await asyncio.gather(*[
+            image_embedding_cache.aput(image_bytes, encoded[key]) for key, image_bytes in missing.items()
+        ])
+        embeddings = [
+            embedding if embedding is not None else encoded[ImageEmbeddingCache.content_key(image_bytes)]
+            for image_bytes, embedding in zip(images, embeddings)
+        ]
+    return embeddings
+
+
+def _chunks(items: list) -> List[list]:
+    size = embedding_service.max_batch_size
+    return [items[start:start + size] for start in range(0, len(items), size)]
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+import clip
+import torch
+from PIL import Image
+
+from api.config import settings
+from api.executors import inference_executor
+from api.preprocessing import preprocess_bytes, preprocess_images
+from api.resources import resources
+
+logger = logging.getLogger(__name__)
+
+
+class _EncodeJob:
+    """
+    A single encode request: one or more samples of the same kind plus the
+    future the caller is waiting on.
+    """
+
+    __slots__ = ("kind", "inputs", "size", "future", "enqueued_at")
+
+    def __init__(self, kind: str, inputs, size: int):
+        self.kind = kind
+        self.inputs = inputs
+        self.size = size
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class EmbeddingService:
+    """
+    Shared CLIP encoder used by every endpoint.
+
+    Encode requests are queued and a single worker thread groups them into
+    batches: it waits at most `max_wait_ms` after the first request for others
+    to arrive, stops early once `max_batch_size` samples are pending, and runs
+    one forward pass per modality. Each caller's future is resolved with its
+    own slice of the output.
+
+    Inputs are tokenized or preprocessed by the caller before they are
+    queued, so a bad input fails only its own request. If a batched forward
+    pass still fails, its jobs are re-run one at a time and only the jobs
+    that fail again get the exception.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        # A forked child inherits neither the worker thread nor a usable queue
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+        # Metrics
+        self._pending_samples = 0
+        self._batches = 0
+        self._samples = 0
+        self._max_batch_size_seen = 0
+        self._batch_size_histogram: Dict[int, int] = {}
+        self._total_queue_wait = 0.0
+        self._total_forward_time = 0.0
+        self._errors = 0
+
+    # -----------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------
+
+    def submit_images(self, images: List[Image.Image]) -> Future:
+        """
+        Preprocess the images in the calling thread and queue them for encoding.
+        The returned future resolves to one embedding (list of floats) per image.
+        """
+        return self.submit_image_tensor(preprocess_images(images, self.input_resolution))
+
+    def submit_image_bytes(self, images: List[bytes]) -> Future:
+        """
+        Decode and preprocess encoded images in the calling thread, then queue
+        them for encoding.
+        """
+        return self.submit_image_tensor(preprocess_bytes(images, self.input_resolution))
+
+    def submit_image_tensor(self, batch: torch.Tensor) -> Future:
+        """
+        Queue an already preprocessed (N, 3, H, W) tensor for encoding.
+        """
+        return self._submit(_EncodeJob("image", batch, batch.shape[0]))
+
+    def submit_texts(self, texts: List[str]) -> Future:
+        """
+        Tokenize query strings in the calling thread and queue them for
+        encoding. Texts longer than CLIP's context raise here, in the caller.
+        """
+        texts = list(texts)
+        if not texts:
+            return self._submit(_EncodeJob("text", None, 0))
+        return self._submit(_EncodeJob("text", clip.tokenize(texts), len(texts)))
+
+    def encode_images(self, images: List[Image.Image]) -> List[List[float]]:
+        return self.submit_images(images).result()
+
+    def encode_image(self, image: Image.Image) -> List[float]:
+        return self.encode_images([image])[0]
+
+    def encode_text(self, text: str) -> List[float]:
+        return self.submit_texts([text]).result()[0]
+
+    async def aencode_images(self, images: List[Image.Image]) -> List[List[float]]:
+        # Preprocessing is CPU-bound, so it runs on the inference pool
+        future = await inference_executor.run(self.submit_images, images)
+        return await asyncio.wrap_future(future)
+
+    async def aencode_image(self, image: Image.Image) -> List[float]:
+        return (await self.aencode_images([image]))[0]
+
+    async def aencode_image_bytes(self, images: List[bytes]) -> List[List[float]]:
+        future = await inference_executor.run(self.submit_image_bytes, images)
+        return await asyncio.wrap_future(future)
+
+    async def aencode_text(self, text: str) -> List[float]:
+        return (await asyncio.wrap_future(self.submit_texts([text])))[0]
+
+    @property
+    def input_resolution(self) -> int:
+        model, _, _ = resources.clip
+        return model.visual.input_resolution
+
+    def stats(self) -> dict:
+        """
+        Queue depth and batching metrics for the /metrics endpoint.
+        """
+        with self._lock:
+            batches = self._batches
+            return {
+                "backend": resources.clip_backend.name if resources.is_loaded("clip_backend") else None,
+                "queue_depth": self._queue.qsize(),
+                "pending_samples": self._pending_samples,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "samples": self._samples,
+                "errors": self._errors,
+                "avg_batch_size": (self._samples / batches) if batches else 0.0,
+                "max_batch_size_seen": self._max_batch_size_seen,
+                "batch_size_histogram": dict(sorted(self._batch_size_histogram.items())),
+                "avg_queue_wait_ms": (self._total_queue_wait / batches * 1000.0) if batches else 0.0,
+                "avg_forward_ms": (self._total_forward_time / batches * 1000.0) if batches else 0.0,
+            }
+
+    # -----------------------------------------------------------------
+    # Worker
+    # -----------------------------------------------------------------
+
+    def _submit(self, job: _EncodeJob) -> Future:
+        if job.size == 0:
+            job.future.set_result([])
+            return job.future
+
+        self._ensure_worker()
+        with self._lock:
+            self._pending_samples += job.size
+        self._queue.put(job)
+        return job.future
+
+    def _reset_after_fork(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pending_samples = 0
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(
+                target=self._run, name="embedding-service", daemon=True
+            )
+            self._worker.start()
+            logger.info(
+                "Embedding service started (max_batch_size=%d, max_wait_ms=%.1f)",
+                self.max_batch_size,
+                self.max_wait * 1000.0,
+            )
+
+    def _collect(self) -> List[_EncodeJob]:
+        """
+        Block for the first job, then keep draining the queue until the batch
+        is full or the wait window has elapsed.
+        """
+        jobs = [self._queue.get()]
+        pending = jobs[0].size
+        deadline = time.monotonic() + self.max_wait
+
+        while pending < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            pending += job.size
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = self._collect()
+            for kind in ("image", "text"):
+                batch = [
+                    job for job in jobs
+                    if job.kind == kind and job.future.set_running_or_notify_cancel()
+                ]
+                if batch:
+                    self._encode(kind, batch)
+
+            with self._lock:
+                self._pending_samples -= sum(job.size for job in jobs)
+
+    def _forward(self, kind: str, jobs: List[_EncodeJob]) -> List[List[float]]:
+        backend = resources.clip_backend
+        inputs = torch.cat([job.inputs for job in jobs])
+        output = backend.encode_image(inputs) if kind == "image" else backend.encode_text(inputs)
+        return output.tolist()
+
+    def _encode(self, kind: str, jobs: List[_EncodeJob]):
+        started = time.monotonic()
+        size = sum(job.size for job in jobs)
+        try:
+            rows = self._forward(kind, jobs)
+        except Exception as e:
+            logger.error(f"Error encoding {kind} batch of {size}: {str(e)}")
+            with self._lock:
+                self._errors += 1
+            if len(jobs) == 1:
+                jobs[0].future.set_exception(e)
+            else:
+                # Isolate the failing job(s) instead of failing the whole batch
+                self._encode_each(kind, jobs)
+            return
+
+        offset = 0
+        for job in jobs:
+            job.future.set_result(rows[offset:offset + job.size])
+            offset += job.size
+
+        finished = time.monotonic()
+        with self._lock:
+            self._batches += 1
+            self._samples += size
+            self._max_batch_size_seen = max(self._max_batch_size_seen, size)
+            self._batch_size_histogram[size] = self._batch_size_histogram.get(size, 0) + 1
+            self._total_queue_wait += sum(started - job.enqueued_at for job in jobs) / len(jobs)
+            self._total_forward_time += finished - started
+
+
+    def _encode_each(self, kind: str, jobs: List[_EncodeJob]):
+        for job in jobs:
+            try:
+                job.future.set_result(self._forward(kind, [job]))
+            except Exception as e:
+                logger.error(f"Error encoding {kind} job of {job.size}: {str(e)}")
+                job.future.set_exception(e)
+
+
+embedding_service = EmbeddingService(
+    max_batch_size=settings.embed_batch_max_size,
+    max_wait_ms=settings.embed_batch_max_wait_ms,
+)
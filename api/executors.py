@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturated(HTTPException):
+    """
+    Raised when an executor's queue is full; surfaces to clients as a 503.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(status_code=503, detail=f"The {name} pool is saturated. Please retry shortly.")
+
+
+class BoundedExecutor:
+    """
+    Thread pool for blocking work that must stay off the asyncio event loop.
+
+    At most `max_workers` tasks run at once and at most `max_queue` wait for a
+    thread (0 means unbounded); beyond that new work is rejected with a 503
+    instead of piling up. Active/queued counts and wait/run times are kept so
+    /metrics shows when the pool is the bottleneck.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+
+        self._active = 0
+        self._queued = 0
+        self._peak_active = 0
+        self._peak_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected += 1
+                logger.warning(f"{self.name} pool saturated: {self._active} active, {self._queued} queued")
+                raise ExecutorSaturated(self.name)
+            self._queued += 1
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        enqueued = time.monotonic()
+
+        def task():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._peak_active = max(self._peak_active, self._active)
+                self._total_wait += started - enqueued
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._failed += int(failed)
+                    self._total_run += time.monotonic() - started
+
+        return self._executor.submit(task)
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+                "utilization": self._active / self.max_workers,
+                "peak_active": self._peak_active,
+                "peak_queued": self._peak_queued,
+                "submitted": self._submitted,
+                "completed": completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": (self._total_wait / completed * 1000.0) if completed else 0.0,
+                "avg_run_ms": (self._total_run / completed * 1000.0) if completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+# CPU-bound model work: YOLO, image decoding/cropping and CLIP preprocessing
+inference_executor = BoundedExecutor(
+    "inference", settings.inference_workers, settings.inference_max_queue
+)
+
+# Blocking network and disk I/O: boto3, Pinecone, DynamoDB, requests
+io_executor = BoundedExecutor("io", settings.io_workers, settings.io_max_queue)
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for pre-forked serving.
+
+    gunicorn -c api/gunicorn_conf.py api.index:app
+
+The app is imported and the model weights are loaded once in the master
+process. Workers are forked afterwards and share them copy-on-write instead
+of each loading its own copy. Each worker gets its own share of the CPU
+cores for torch's intra-op threads, so workers don't oversubscribe them, and
+builds its CLIP backend (TorchScript / ONNX Runtime sessions) only after
+that thread count is set.
+"""
+import gc
+import logging
+import os
+
+import torch
+
+# Imported before forking so the workers share its write generation
+import api.query_cache  # noqa: F401
+from api.config import settings
+from api.model_loader import process_rss_mb
+from api.resources import MODEL_RESOURCES, PREFORK_MODEL_RESOURCES, resources
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = settings.serve_workers
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before any worker is forked
+    resources.warm_up(settings.warmup_models or list(MODEL_RESOURCES), PREFORK_MODEL_RESOURCES)
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # the workers don't write to (and un-share) the parent's pages
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Models loaded in master {os.getpid()}: RSS {process_rss_mb()} MB, {resources.stats()}")
+
+
+def post_fork(server, worker):
+    threads = settings.torch_threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    torch.set_num_threads(threads)
+    resources.reset_after_fork()
+    # Inference sessions are built per worker, sized to its thread count
+    resources.warm_up(settings.warmup_models or list(MODEL_RESOURCES))
+    logger.info(f"Worker {worker.pid} started with {threads} torch threads")
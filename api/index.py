@@ -1,8 +1,15 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from api.auth import router as auth_router
+from api.config import settings
+from api.executors import inference_executor, io_executor
+from api.metadata_log import metadata_log
+from api.resources import resources
 from api.v1.endpoints import (
     text,
     image,
@@ -15,9 +22,32 @@ from api.v1.endpoints import (
     labeling,
     run_models,
     summary,
+    metrics,
+    batch,
 )
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model warm-up can take a while; keep it off the event loop
+    await inference_executor.run(resources.startup)
+    if settings.metadata_compaction_seconds > 0:
+        metadata_log.start_compaction(settings.metadata_compaction_seconds)
+    else:
+        logger.warning(
+            "METADATA_COMPACTION_SECONDS=0: the API will not compact the metadata log; "
+            "run scripts/compact_metadata_log.py regularly or segments will pile up"
+        )
+    yield
+    metadata_log.stop_compaction()
+    resources.shutdown()
+    inference_executor.shutdown()
+    io_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add session middleware for Authlib
 # Make sure you use a unique, random secret_key in production
@@ -48,6 +78,8 @@ app.include_router(review.router, prefix="/api")
 app.include_router(labeling.router, prefix="/api")
 app.include_router(run_models.router, prefix="/api")
 app.include_router(summary.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
 
 # Register Auth Routes
 app.include_router(auth_router, prefix="/api")
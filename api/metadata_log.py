@@ -0,0 +1,585 @@
+import csv
+import io
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from api.config import settings
+from api.metadata_summary import METADATA_SUMMARY_KEY
+from api.metadata_table import MetadataTable
+
+logger = logging.getLogger(__name__)
+
+# Compacted snapshot, in the CSV format the rest of the tooling already reads
+METADATA_SNAPSHOT_KEY = "universal-db/metadata.csv"
+
+# Append-only segments written since the last compaction
+METADATA_LOG_PREFIX = "universal-db/metadata-log/"
+
+# S3 user metadata on the snapshot: key of the last segment folded into it
+COMPACTED_THROUGH = "compacted-through"
+
+# Columns of a new snapshot, in order; extra columns of an existing snapshot are kept
+METADATA_COLUMNS = [
+    "id",
+    "color",
+    "material",
+    "brand",
+    "shape",
+    "original_s3_uri",
+    "s3_file_path",
+    "coordinates",
+    "timestamp",
+    "robot",
+    "datetime_taken",
+    "comment",
+    "labeler_name",
+    "modifier",
+    "status",
+    "pick_point",
+]
+
+# Attempts at reading a consistent snapshot + tail while a compaction runs
+READ_ATTEMPTS = 3
+
+# S3 error codes of a failed conditional write (If-Match / If-None-Match)
+CONFLICT_CODES = ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
+
+
+class MetadataLog:
+    """
+    Crop metadata stored as a compacted CSV snapshot plus a log of small
+    append-only segments.
+
+    Each write puts one new segment object of JSON-lines records (`insert`
+    with a full row, or `update` with the changed fields), so its cost does
+    not depend on the size of the table and concurrent writers never
+    overwrite each other. Segment keys start with a nanosecond timestamp, so
+    listing them returns them in write order.
+
+    Readers merge the snapshot with every segment newer than the snapshot's
+    `compacted-through` key. `compact()` folds segments older than the grace
+    period into a new snapshot and deletes them; the grace period leaves
+    room for writes whose key was taken before a slow upload finished, so it
+    must exceed the S3 client's longest request.
+
+    Both kinds of writes are conditional on the object's ETag: segments are
+    only created if their key is unused (If-None-Match), and a compaction
+    only replaces the snapshot it read (If-Match). On a conflict the write is
+    re-applied against the current state and retried, so several processes
+    can compact concurrently.
+
+    `table()` keeps a process-wide merged table in memory. It is refreshed
+    at most every `METADATA_TABLE_REFRESH_SECONDS`: the snapshot is fetched
+    with a conditional GET and only re-parsed when its ETag changed, and only
+    segments not applied yet are read. Writes committed by this process are
+    applied to it right away. The S3 reads of a refresh run without holding
+    the table lock, so a slow refresh never delays committed writes; readers
+    keep getting the previous table until the refreshed one is swapped in.
+
+    Each compaction also writes a small summary document with the snapshot's
+    facet counts (see api/metadata_summary.py), for tooling that should not
+    have to download the CSV and for scripts/recount_summary.py to verify.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        snapshot_key: str = METADATA_SNAPSHOT_KEY,
+        log_prefix: str = METADATA_LOG_PREFIX,
+        summary_key: str = METADATA_SUMMARY_KEY,
+        max_attempts: int = None,
+    ):
+        self.bucket = bucket
+        self.snapshot_key = snapshot_key
+        self.summary_key = summary_key
+        self.log_prefix = log_prefix
+        self.max_attempts = max(1, max_attempts or settings.metadata_write_max_attempts)
+        self.table_refresh_seconds = settings.metadata_table_refresh_seconds
+
+        # Process-wide merged table (see table())
+        self._table: Optional[MetadataTable] = None
+        # Guards the table state below; never held across S3 calls
+        self._table_lock = threading.Lock()
+        # One refresh at a time
+        self._refresh_lock = threading.Lock()
+        # Records committed while a refresh is in flight, by segment key
+        self._committed_during_refresh: Optional[dict] = None
+        self._table_etag: Optional[str] = None
+        self._table_compacted_through = ""
+        self._table_segments = set()
+        self._table_checked_at = 0.0
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self._segments_written = 0
+        self._records_written = 0
+        self._reads = 0
+        self._read_retries = 0
+        self._compactions = 0
+        self._compaction_errors = 0
+        self._summary_errors = 0
+        self._segment_conflicts = 0
+        self._snapshot_conflicts = 0
+        self._retries = 0
+        self._last_compaction = {}
+        self._table_refreshes = 0
+        self._table_snapshot_loads = 0
+        self._table_not_modified = 0
+        self._table_refresh_errors = 0
+
+    # -----------------------------------------------------------------
+    # Writes
+    # -----------------------------------------------------------------
+
+    def insert(self, row: dict) -> str:
+        return self.append([insert_record(row)])
+
+    def update(self, row_id: str, fields: dict) -> str:
+        return self.append([update_record(row_id, fields)])
+
+    def append(self, records: List[dict]) -> str:
+        """
+        Write `records` as one new segment; returns the segment key.
+        """
+        body = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+        for attempt in range(self.max_attempts):
+            key = f"{self.log_prefix}{time.time_ns():020d}-{uuid.uuid4().hex[:12]}.jsonl"
+            try:
+                settings.get_s3_client().put_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Body=body,
+                    ContentType="application/x-ndjson",
+                    IfNoneMatch="*",
+                )
+            except ClientError as e:
+                if not is_conflict(e) or attempt == self.max_attempts - 1:
+                    raise
+                # The key is taken; retry under a new one
+                with self._lock:
+                    self._segment_conflicts += 1
+                    self._retries += 1
+                continue
+            with self._lock:
+                self._segments_written += 1
+                self._records_written += len(records)
+            return key
+
+    # -----------------------------------------------------------------
+    # Reads
+    # -----------------------------------------------------------------
+
+    def read(self) -> MetadataTable:
+        """
+        Snapshot merged with the log tail.
+
+        Segments are listed before the snapshot is read. If a listed segment
+        newer than the snapshot has disappeared by the time it is read, a
+        compaction replaced the snapshot in between, so the read starts over.
+        """
+        for attempt in range(READ_ATTEMPTS):
+            segment_keys = self.list_segments()
+            table, compacted_through, _ = self.read_snapshot()
+            tail = [key for key in segment_keys if key > compacted_through]
+            segments = self.read_segments(tail)
+            if all(records is not None for records in segments):
+                for records in segments:
+                    for record in records:
+                        table.apply(record)
+                with self._lock:
+                    self._reads += 1
+                return table
+            with self._lock:
+                self._read_retries += 1
+            logger.info(f"Metadata log compacted during read (attempt {attempt + 1}); retrying")
+        raise RuntimeError("Could not read a consistent metadata snapshot; compactions keep replacing it.")
+
+    def read_snapshot(self, if_none_match: Optional[str] = None) -> Optional[Tuple[MetadataTable, str, Optional[str]]]:
+        """
+        (table, compacted-through key, ETag) of the current snapshot; an
+        empty table and no ETag if there is none yet. With `if_none_match`,
+        returns None without downloading when the ETag is unchanged.
+        """
+        condition = {"IfNoneMatch": if_none_match} if if_none_match else {}
+        try:
+            response = settings.get_s3_client().get_object(Bucket=self.bucket, Key=self.snapshot_key, **condition)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("304", "NotModified"):
+                return None
+            if code in ("NoSuchKey", "404"):
+                return MetadataTable(METADATA_COLUMNS, []), "", None
+            raise
+        compacted_through = (response.get("Metadata") or {}).get(COMPACTED_THROUGH, "")
+        return parse_snapshot(response["Body"].read()), compacted_through, response.get("ETag")
+
+    def list_segments(self) -> List[str]:
+        paginator = settings.get_s3_client().get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.log_prefix):
+            keys += [item["Key"] for item in page.get("Contents", [])]
+        return sorted(keys)
+
+    def read_segments(self, keys: List[str]) -> List[Optional[List[dict]]]:
+        """
+        Records of each segment, in order; None for segments that no longer exist.
+        """
+        if not keys:
+            return []
+        with ThreadPoolExecutor(max_workers=min(16, len(keys))) as pool:
+            return list(pool.map(self._read_segment, keys))
+
+    def _read_segment(self, key: str) -> Optional[List[dict]]:
+        try:
+            response = settings.get_s3_client().get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        lines = response["Body"].read().decode("utf-8").splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+
+    # -----------------------------------------------------------------
+    # In-memory table
+    # -----------------------------------------------------------------
+
+    def table(self) -> MetadataTable:
+        """
+        The process-wide merged table, refreshed if it was last checked more
+        than `table_refresh_seconds` ago. If a refresh fails, the previous
+        table is served.
+        """
+        with self._table_lock:
+            table, fresh = self._table, self._table_is_fresh()
+        if fresh:
+            return table
+        # While another thread refreshes, serve the current table rather than wait
+        if not self._refresh_lock.acquire(blocking=table is None):
+            return table
+        try:
+            with self._table_lock:
+                if self._table_is_fresh():
+                    return self._table
+            try:
+                self._refresh_table()
+            except Exception as e:
+                if self._table is None:
+                    raise
+                with self._lock:
+                    self._table_refresh_errors += 1
+                logger.error(f"Metadata table refresh failed, serving the previous table: {str(e)}")
+            return self._table
+        finally:
+            self._refresh_lock.release()
+
+    def apply_committed(self, segment_key: str, records: List[dict]):
+        """
+        Apply records this process just committed to the in-memory table, so
+        its own writes are visible before the next refresh.
+        """
+        with self._table_lock:
+            if self._table is None:
+                return
+            for record in records:
+                self._table.apply(record)
+            self._table_segments.add(segment_key)
+            if self._committed_during_refresh is not None:
+                self._committed_during_refresh[segment_key] = records
+
+    def _table_is_fresh(self) -> bool:
+        return self._table is not None and time.monotonic() - self._table_checked_at < self.table_refresh_seconds
+
+    def _refresh_table(self):
+        """
+        Bring the table up to date with S3. Called with `_refresh_lock` held;
+        `_table_lock` is only taken to read the current state and to apply or
+        swap in the result.
+        """
+        with self._table_lock:
+            current, current_etag = self._table, self._table_etag
+            current_compacted_through, current_segments = self._table_compacted_through, set(self._table_segments)
+            self._committed_during_refresh = {}
+        try:
+            for attempt in range(READ_ATTEMPTS):
+                segment_keys = self.list_segments()
+                snapshot = self.read_snapshot(if_none_match=current_etag if current is not None else None)
+                if snapshot is None:
+                    compacted_through = current_compacted_through
+                    tail = [key for key in segment_keys if key > compacted_through and key not in current_segments]
+                else:
+                    table, compacted_through, etag = snapshot
+                    tail = [key for key in segment_keys if key > compacted_through]
+
+                segments = self.read_segments(tail)
+                if any(records is None for records in segments):
+                    # Compacted while we were reading; the snapshot has changed
+                    with self._lock:
+                        self._read_retries += 1
+                    continue
+
+                if snapshot is None:
+                    self._apply_tail(tail, segments)
+                    with self._lock:
+                        self._table_not_modified += 1
+                else:
+                    # The new table is private until it is swapped in
+                    for records in segments:
+                        for record in records:
+                            table.apply(record)
+                    self._swap_table(table, etag, compacted_through, tail)
+                    with self._lock:
+                        self._table_snapshot_loads += 1
+                with self._lock:
+                    self._table_refreshes += 1
+                return
+            raise RuntimeError("Could not refresh the metadata table; compactions keep replacing the snapshot.")
+        finally:
+            with self._table_lock:
+                self._committed_during_refresh = None
+
+    def _apply_tail(self, tail: List[str], segments: List[List[dict]]):
+        with self._table_lock:
+            for key, records in zip(tail, segments):
+                # Skip segments this process committed (and applied) meanwhile
+                if key in self._table_segments:
+                    continue
+                for record in records:
+                    self._table.apply(record)
+                self._table_segments.add(key)
+            self._table_checked_at = time.monotonic()
+
+    def _swap_table(self, table: MetadataTable, etag: Optional[str], compacted_through: str, tail: List[str]):
+        with self._table_lock:
+            segments = set(tail)
+            # Writes committed during the refresh went to the old table; carry them over
+            for key, records in (self._committed_during_refresh or {}).items():
+                if key > compacted_through and key not in segments:
+                    for record in records:
+                        table.apply(record)
+                    segments.add(key)
+            self._table = table
+            self._table_etag = etag
+            self._table_compacted_through = compacted_through
+            self._table_segments = segments
+            self._table_checked_at = time.monotonic()
+
+    # -----------------------------------------------------------------
+    # Compaction
+    # -----------------------------------------------------------------
+
+    def compact(self, grace_seconds: float = None) -> dict:
+        """
+        Fold the segments older than `grace_seconds` into a new snapshot and
+        delete them.
+
+        The new snapshot is only written if the snapshot it was built from is
+        still current. If another compaction replaced it first, the remaining
+        segments are re-applied to the new snapshot and the write is retried.
+        Segments at or below the snapshot's compacted-through key are already
+        part of it (left over from another compaction) and are only deleted.
+        """
+        grace_seconds = settings.metadata_log_compact_grace_seconds if grace_seconds is None else grace_seconds
+        started = time.monotonic()
+        cutoff = f"{self.log_prefix}{time.time_ns() - int(grace_seconds * 1e9):020d}"
+
+        for attempt in range(self.max_attempts):
+            table, compacted_through, etag = self.read_snapshot()
+            segment_keys = [key for key in self.list_segments() if key < cutoff]
+            folded = [key for key in segment_keys if key > compacted_through]
+            leftovers = [key for key in segment_keys if key <= compacted_through]
+            if not folded:
+                self._delete_segments(leftovers)
+                return {"segments": 0, "rows": len(table), "attempts": attempt + 1}
+
+            segments = self.read_segments(folded)
+            if any(records is None for records in segments):
+                # Another compaction folded some of them in the meantime
+                self._record_conflict(f"segments compacted concurrently (attempt {attempt + 1})")
+                continue
+
+            records = 0
+            for segment in segments:
+                for record in segment:
+                    table.apply(record)
+                    records += 1
+
+            try:
+                self._put_snapshot(table, folded[-1], etag)
+            except ClientError as e:
+                if not is_conflict(e):
+                    raise
+                self._record_conflict(f"snapshot replaced concurrently (attempt {attempt + 1})")
+                continue
+            self._delete_segments(leftovers + folded)
+            self.write_summary(table, folded[-1])
+
+            result = {
+                "segments": len(folded),
+                "records": records,
+                "rows": len(table),
+                "orphan_updates": table.orphan_updates,
+                "attempts": attempt + 1,
+                "seconds": time.monotonic() - started,
+            }
+            with self._lock:
+                self._compactions += 1
+                self._last_compaction = result
+            logger.info(f"Metadata log compacted: {result}")
+            return result
+
+        raise RuntimeError(f"Metadata compaction gave up after {self.max_attempts} conflicting attempts.")
+
+    def _put_snapshot(self, table: MetadataTable, compacted_through: str, etag: Optional[str]):
+        # Only replace the snapshot this one was built from (or create it if there was none)
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        settings.get_s3_client().put_object(
+            Bucket=self.bucket,
+            Key=self.snapshot_key,
+            Body=table.to_csv(),
+            ContentType="text/csv",
+            Metadata={COMPACTED_THROUGH: compacted_through},
+            **condition,
+        )
+
+    def write_summary(self, table: MetadataTable, compacted_through: str):
+        """
+        Store the facet counts of `table` as the summary document. Failures
+        are only logged: the document is derived data and the next
+        compaction rewrites it.
+        """
+        document = {
+            COMPACTED_THROUGH: compacted_through,
+            "generated_at": time.time(),
+            "summary": table.summary(),
+        }
+        try:
+            settings.get_s3_client().put_object(
+                Bucket=self.bucket,
+                Key=self.summary_key,
+                Body=json.dumps(document, separators=(",", ":")).encode("utf-8"),
+                ContentType="application/json",
+            )
+        except Exception as e:
+            with self._lock:
+                self._summary_errors += 1
+            logger.error(f"Error writing metadata summary document: {str(e)}")
+
+    def read_summary(self) -> Optional[dict]:
+        """
+        The summary document written by the last compaction, or None.
+        """
+        try:
+            response = settings.get_s3_client().get_object(Bucket=self.bucket, Key=self.summary_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def _record_conflict(self, reason: str):
+        with self._lock:
+            self._snapshot_conflicts += 1
+            self._retries += 1
+        logger.info(f"Metadata compaction conflict: {reason}; retrying")
+
+    def _delete_segments(self, keys: List[str]):
+        s3_client = settings.get_s3_client()
+        for start in range(0, len(keys), 1000):
+            response = s3_client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+            for error in response.get("Errors", []):
+                logger.error(f"Could not delete compacted metadata segment {error.get('Key')}: {error.get('Message')}")
+
+    def start_compaction(self, interval_seconds: float):
+        """
+        Compact every `interval_seconds` on a background thread.
+        """
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run_compaction, args=(interval_seconds,), name="metadata-compaction", daemon=True
+        )
+        self._thread.start()
+
+    def stop_compaction(self):
+        self._stopped.set()
+        self._thread = None
+
+    def _run_compaction(self, interval_seconds: float):
+        while not self._stopped.wait(interval_seconds):
+            try:
+                self.compact()
+            except Exception as e:
+                with self._lock:
+                    self._compaction_errors += 1
+                logger.error(f"Metadata log compaction failed: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "segments_written": self._segments_written,
+                "records_written": self._records_written,
+                "reads": self._reads,
+                "read_retries": self._read_retries,
+                "compactions": self._compactions,
+                "compaction_errors": self._compaction_errors,
+                "summary_errors": self._summary_errors,
+                "segment_conflicts": self._segment_conflicts,
+                "snapshot_conflicts": self._snapshot_conflicts,
+                "retries": self._retries,
+                "last_compaction": dict(self._last_compaction),
+                "table": {
+                    **(self._table.stats() if self._table is not None else {}),
+                    "refreshes": self._table_refreshes,
+                    "snapshot_loads": self._table_snapshot_loads,
+                    "not_modified": self._table_not_modified,
+                    "refresh_errors": self._table_refresh_errors,
+                },
+            }
+
+
+def is_conflict(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") in CONFLICT_CODES
+
+
+def insert_record(row: dict) -> dict:
+    """
+    Log record adding a row; `row` must carry its `id`.
+    """
+    return {"op": "insert", "id": row["id"], "fields": {name: _cell(value) for name, value in row.items() if name != "id"}}
+
+
+def update_record(row_id: str, fields: dict) -> dict:
+    return {"op": "update", "id": row_id, "fields": {name: _cell(value) for name, value in fields.items()}}
+
+
+def parse_snapshot(data: bytes) -> MetadataTable:
+    text = data.decode("utf-8")
+    if not text.strip():
+        return MetadataTable(METADATA_COLUMNS, [])
+    # Older exports of the snapshot are tab-separated
+    delimiter = "\t" if "\t" in text.split("\n", 1)[0] else ","
+    reader = csv.DictReader(io.StringIO(text, newline=""), delimiter=delimiter, restval="")
+    fieldnames = reader.fieldnames or METADATA_COLUMNS
+    return MetadataTable(fieldnames, reader)
+
+
+def _cell(value) -> str:
+    # Values are stored as the CSV writer would render them
+    return "" if value is None else str(value)
+
+
+metadata_log = MetadataLog(settings.s3_bucket_name)
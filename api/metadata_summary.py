@@ -0,0 +1,88 @@
+from typing import Dict, Iterable
+
+# Summary document written next to the snapshot by each compaction
+METADATA_SUMMARY_KEY = "universal-db/metadata-summary.json"
+
+# Columns the facet counts depend on
+FACET_COLUMNS = ("status", "color", "material", "brand", "shape", "robot", "modifier")
+
+# Summary key -> column, for the columns counted by exact value
+VALUE_FACETS = {
+    "colorCounts": "color",
+    "materialCounts": "material",
+    "shapeCounts": "shape",
+    "robotCounts": "robot",
+}
+
+
+class FacetCounts:
+    """
+    Per-value counts of the active rows, as returned by /summary.
+
+    Counts are updated row by row: `add` when a row is inserted, and
+    `remove` of the old values followed by `add` of the new ones when a row
+    changes, so the summary never needs a pass over the table. Brands are
+    counted case-insensitively and reported in title case; modifiers are
+    comma-separated and counted individually.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.counts: Dict[str, Dict[str, int]] = {key: {} for key in VALUE_FACETS}
+        self.brands: Dict[str, int] = {}
+        self.modifiers: Dict[str, int] = {}
+
+    def add(self, row: dict):
+        self._count(row, 1)
+
+    def remove(self, row: dict):
+        self._count(row, -1)
+
+    def to_summary(self) -> dict:
+        # Unify brand names by case, e.g. "pepsi" -> "Pepsi"
+        brand_counts = {}
+        for brand, count in self.brands.items():
+            brand_counts[brand.title()] = brand_counts.get(brand.title(), 0) + count
+
+        return {
+            "totalCrops": self.total,
+            "colorCounts": dict(self.counts["colorCounts"]),
+            "materialCounts": dict(self.counts["materialCounts"]),
+            "brandCounts": brand_counts,
+            "shapeCounts": dict(self.counts["shapeCounts"]),
+            "robotCounts": dict(self.counts["robotCounts"]),
+            # Only active rows are counted
+            "statusCounts": {"active": self.total} if self.total else {},
+            "modifierCounts": dict(self.modifiers),
+        }
+
+    def _count(self, row: dict, delta: int):
+        if (row.get("status") or "").strip().lower() != "active":
+            return
+        self.total += delta
+
+        for key, column in VALUE_FACETS.items():
+            _bump(self.counts[key], (row.get(column) or "").strip(), delta)
+        _bump(self.brands, (row.get("brand") or "").strip().lower(), delta)
+        for modifier in (row.get("modifier") or "").split(","):
+            _bump(self.modifiers, modifier.strip(), delta)
+
+
+def count_rows(rows: Iterable[dict]) -> FacetCounts:
+    """
+    Full recount over `rows`, to check the incrementally maintained counts.
+    """
+    counts = FacetCounts()
+    for row in rows:
+        counts.add(row)
+    return counts
+
+
+def _bump(counts: Dict[str, int], value: str, delta: int):
+    if not value:
+        return
+    count = counts.get(value, 0) + delta
+    if count > 0:
+        counts[value] = count
+    else:
+        counts.pop(value, None)
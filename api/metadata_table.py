@@ -0,0 +1,213 @@
+import csv
+import io
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from api.metadata_summary import FACET_COLUMNS, FacetCounts
+
+# Low-cardinality columns, stored dictionary-encoded (one int code per row)
+DICTIONARY_COLUMNS = (
+    "color",
+    "material",
+    "brand",
+    "shape",
+    "robot",
+    "modifier",
+    "status",
+    "labeler_name",
+    "original_s3_uri",
+)
+
+# Columns with a value -> rows index besides the `id` index; /new's duplicate
+# check looks crops up by both
+INDEXED_COLUMNS = ("original_s3_uri", "s3_file_path")
+
+
+class _DictionaryColumn:
+    """
+    Column of repeated strings: each distinct value is stored once and every
+    row holds a 4-byte code into the value list.
+    """
+
+    __slots__ = ("codes", "values", "lookup")
+
+    def __init__(self, size: int = 0):
+        self.values: List[str] = [""]
+        self.lookup: Dict[str, int] = {"": 0}
+        self.codes = array("I", bytes(4 * size))
+
+    def __getitem__(self, position: int) -> str:
+        return self.values[self.codes[position]]
+
+    def __setitem__(self, position: int, value: str):
+        self.codes[position] = self._encode(value)
+
+    def append(self, value: str):
+        self.codes.append(self._encode(value))
+
+    def _encode(self, value: str) -> int:
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.lookup[value] = code
+        return code
+
+
+class _PlainColumn(list):
+    """
+    Column of mostly distinct strings (ids, paths, coordinates, comments).
+    """
+
+    def __init__(self, size: int = 0):
+        super().__init__([""] * size)
+
+
+class MetadataTable:
+    """
+    Crop metadata rows in columnar form.
+
+    Low-cardinality columns are dictionary-encoded, the others are plain
+    string lists. Rows are found by `id` through a hash index and by
+    `original_s3_uri` / `s3_file_path` through secondary indexes. Rows keep
+    the snapshot's order and new rows are appended; rows are never removed
+    (deletes only change `status`). The /summary facet counts are kept up to
+    date as rows are added and changed.
+    """
+
+    def __init__(self, fieldnames: Iterable[str], rows: Iterable[dict] = ()):
+        self.fieldnames: List[str] = []
+        self.columns: Dict[str, list] = {}
+        self.size = 0
+        self.id_index: Dict[str, int] = {}
+        self.indexes: Dict[str, Dict[str, List[int]]] = {name: {} for name in INDEXED_COLUMNS}
+        self.orphan_updates = 0
+        self.facets = FacetCounts()
+        self._lock = threading.RLock()
+
+        for name in fieldnames:
+            self._add_column(name)
+        for row in rows:
+            self._append(row.get("id") or "", row)
+
+    def __len__(self) -> int:
+        return self.size
+
+    # -----------------------------------------------------------------
+    # Lookups
+    # -----------------------------------------------------------------
+
+    def get(self, row_id: str) -> Optional[dict]:
+        with self._lock:
+            position = self.id_index.get(row_id)
+            return self.row(position) if position is not None else None
+
+    def find(self, column: str, value: str) -> List[dict]:
+        """
+        Rows whose indexed `column` equals `value`.
+        """
+        with self._lock:
+            return [self.row(position) for position in self.indexes[column].get(value, [])]
+
+    def row(self, position: int) -> dict:
+        return {name: self.columns[name][position] for name in self.fieldnames}
+
+    def summary(self) -> dict:
+        with self._lock:
+            return self.facets.to_summary()
+
+    def rows(self) -> Iterator[dict]:
+        with self._lock:
+            rows = [self.row(position) for position in range(self.size)]
+        return iter(rows)
+
+    # -----------------------------------------------------------------
+    # Writes
+    # -----------------------------------------------------------------
+
+    def apply(self, record: dict):
+        """
+        Apply one metadata log record. Updates of ids that were never
+        inserted are dropped, as the old in-place CSV rewrite did.
+        """
+        fields = record.get("fields") or {}
+        with self._lock:
+            for name in fields:
+                if name not in self.columns:
+                    self._add_column(name)
+
+            position = self.id_index.get(record["id"])
+            if position is not None:
+                facets_changed = any(name in FACET_COLUMNS for name in fields)
+                if facets_changed:
+                    self.facets.remove(self._facet_row(position))
+                for name, value in fields.items():
+                    self._set(position, name, value)
+                if facets_changed:
+                    self.facets.add(self._facet_row(position))
+            elif record["op"] == "insert":
+                self._append(record["id"], fields)
+            else:
+                self.orphan_updates += 1
+
+    def to_csv(self) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        with self._lock:
+            writer.writerow(self.fieldnames)
+            columns = [self.columns[name] for name in self.fieldnames]
+            for position in range(self.size):
+                writer.writerow([column[position] for column in columns])
+        return buffer.getvalue().encode("utf-8")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self.size,
+                "columns": len(self.fieldnames),
+                "distinct_values": {
+                    name: len(column.values)
+                    for name, column in self.columns.items()
+                    if isinstance(column, _DictionaryColumn)
+                },
+                "indexed_values": {name: len(index) for name, index in self.indexes.items()},
+            }
+
+    def _add_column(self, name: str):
+        if name in self.columns:
+            return
+        column_type = _DictionaryColumn if name in DICTIONARY_COLUMNS else _PlainColumn
+        self.columns[name] = column_type(self.size)
+        self.fieldnames.append(name)
+
+    def _append(self, row_id: str, fields: dict):
+        position = self.size
+        for name, column in self.columns.items():
+            value = row_id if name == "id" else fields.get(name)
+            column.append("" if value is None else value)
+        self.size += 1
+        if row_id:
+            self.id_index[row_id] = position
+        self.facets.add(self._facet_row(position))
+        for name, index in self.indexes.items():
+            value = self.columns[name][position] if name in self.columns else ""
+            if value:
+                index.setdefault(value, []).append(position)
+
+    def _facet_row(self, position: int) -> dict:
+        return {name: self.columns[name][position] for name in FACET_COLUMNS if name in self.columns}
+
+    def _set(self, position: int, name: str, value: str):
+        index = self.indexes.get(name)
+        if index is not None:
+            previous = self.columns[name][position]
+            if previous == value:
+                return
+            if previous:
+                index[previous].remove(position)
+                if not index[previous]:
+                    del index[previous]
+            if value:
+                index.setdefault(value, []).append(position)
+        self.columns[name][position] = value
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+from api.config import settings
+from api.metadata_log import MetadataLog, insert_record, metadata_log, update_record
+
+logger = logging.getLogger(__name__)
+
+
+class _WriteJob:
+    """
+    Log records from one request plus the future the request is waiting on.
+    """
+
+    __slots__ = ("records", "future", "enqueued_at")
+
+    def __init__(self, records: List[dict]):
+        self.records = records
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MetadataWriteQueue:
+    """
+    Group commit for metadata log writes.
+
+    Inserts from /new, edits from /update and status changes from /delete are
+    queued, and a single worker thread writes everything that arrived within
+    `max_wait_ms` of the first pending write (or up to `max_records`) as one
+    log segment. Each caller's future resolves once the segment holding its
+    records is stored, so a request still only returns after its change is
+    durable; a burst of edits costs one or two S3 PUTs instead of one each.
+    """
+
+    def __init__(self, log: MetadataLog, max_records: int, max_wait_ms: float):
+        self.log = log
+        self.max_records = max(1, max_records)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        # A forked child inherits neither the worker thread nor a usable queue
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+        # Metrics
+        self._commits = 0
+        self._records = 0
+        self._jobs = 0
+        self._errors = 0
+        self._commit_size_histogram: Dict[int, int] = {}
+        self._total_queue_wait = 0.0
+        self._total_commit_time = 0.0
+
+    # -----------------------------------------------------------------
+    # Public API
+    # -----------------------------------------------------------------
+
+    def submit(self, records: List[dict]) -> Future:
+        """
+        Queue log records; the future resolves to the key of the segment they
+        were committed in.
+        """
+        job = _WriteJob(list(records))
+        if not job.records:
+            job.future.set_result(None)
+            return job.future
+
+        self._ensure_worker()
+        self._queue.put(job)
+        return job.future
+
+    def commit(self, records: List[dict]) -> str:
+        return self.submit(records).result()
+
+    async def acommit(self, records: List[dict]) -> str:
+        return await asyncio.wrap_future(self.submit(records))
+
+    async def ainsert(self, row: dict) -> str:
+        return await self.acommit([insert_record(row)])
+
+    async def aupdate(self, row_id: str, fields: dict) -> str:
+        return await self.acommit([update_record(row_id, fields)])
+
+    def stats(self) -> dict:
+        with self._lock:
+            commits = self._commits
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_records": self.max_records,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "commits": commits,
+                "records": self._records,
+                "requests": self._jobs,
+                "errors": self._errors,
+                "avg_records_per_commit": (self._records / commits) if commits else 0.0,
+                "commit_size_histogram": dict(sorted(self._commit_size_histogram.items())),
+                "avg_queue_wait_ms": (self._total_queue_wait / commits * 1000.0) if commits else 0.0,
+                "avg_commit_ms": (self._total_commit_time / commits * 1000.0) if commits else 0.0,
+            }
+
+    # -----------------------------------------------------------------
+    # Worker
+    # -----------------------------------------------------------------
+
+    def _reset_after_fork(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="metadata-writes", daemon=True)
+            self._worker.start()
+            logger.info(
+                "Metadata write queue started (max_records=%d, max_wait_ms=%.1f)",
+                self.max_records,
+                self.max_wait * 1000.0,
+            )
+
+    def _collect(self) -> List[_WriteJob]:
+        """
+        Block for the first job, then keep draining the queue until the
+        commit is full or the wait window has elapsed.
+        """
+        jobs = [self._queue.get()]
+        pending = len(jobs[0].records)
+        deadline = time.monotonic() + self.max_wait
+
+        while pending < self.max_records:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            pending += len(job.records)
+        return jobs
+
+    def _run(self):
+        while True:
+            jobs = [job for job in self._collect() if job.future.set_running_or_notify_cancel()]
+            if jobs:
+                self._commit(jobs)
+
+    def _commit(self, jobs: List[_WriteJob]):
+        started = time.monotonic()
+        records = [record for job in jobs for record in job.records]
+        try:
+            segment_key = self.log.append(records)
+        except Exception as e:
+            logger.error(f"Error committing {len(records)} metadata records: {str(e)}")
+            with self._lock:
+                self._errors += 1
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        self.log.apply_committed(segment_key, records)
+        for job in jobs:
+            job.future.set_result(segment_key)
+
+        finished = time.monotonic()
+        with self._lock:
+            self._commits += 1
+            self._records += len(records)
+            self._jobs += len(jobs)
+            self._commit_size_histogram[len(records)] = self._commit_size_histogram.get(len(records), 0) + 1
+            self._total_queue_wait += sum(started - job.enqueued_at for job in jobs) / len(jobs)
+            self._total_commit_time += finished - started
+
+
+metadata_writes = MetadataWriteQueue(
+    metadata_log,
+    max_records=settings.metadata_commit_max_records,
+    max_wait_ms=settings.metadata_commit_max_wait_ms,
+)
@@ -1,39 +1,97 @@
+import io
+import logging
+import time
+
 import torch
 import clip
-from ultralytics import YOLO
 from api.config import settings
+from api.weights_cache import fetch_weights, weights_sha256
+
+logger = logging.getLogger(__name__)
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
+WEIGHTS_BUCKET = "glacier-ml-training"
+DETECT_ANYTHING_WEIGHTS_KEY = "artifacts/dev/DETECT-ANYTHING/YOLOV11M_1280/cleaned/best.pt"
+
 
 def get_clip_model():
     weights_path = settings.model_path
     clip_model = settings.model
 
-    model, preprocess = clip.load(clip_model, device=device)
-    finetuned_weights_path = "/tmp/best_fine_tuned_clip_model.pth"
+    started = time.monotonic()
+    model, preprocess = clip.load(clip_model, device=device, download_root=settings.weights_cache_dir)
+    logger.info(f"Loaded base CLIP {clip_model} in {time.monotonic() - started:.2f}s")
 
-    s3_client = settings.get_s3_client()
-    s3_client.download_file("glacier-ml-training", weights_path, finetuned_weights_path)
+    started = time.monotonic()
+    finetuned_weights_path = fetch_weights(WEIGHTS_BUCKET, weights_path)
+    settings.model_weights_sha256 = weights_sha256(finetuned_weights_path)
+    logger.info(f"Fetched fine-tuned CLIP weights in {time.monotonic() - started:.2f}s")
+
+    started = time.monotonic()
     model.load_state_dict(torch.load(finetuned_weights_path, map_location=device, weights_only=True))
     model.eval()
+    logger.info(f"Loaded fine-tuned CLIP state dict in {time.monotonic() - started:.2f}s")
+
+    if settings.clip_quantize:
+        if device != "cpu":
+            logger.warning("CLIP_QUANTIZE is only supported on CPU; keeping float weights")
+        else:
+            model = quantize_clip_model(model)
 
     return model, device, preprocess
 
 
-model, device, preprocess = get_clip_model()
+def quantize_clip_model(model):
+    """
+    Dynamically quantize the Linear layers of both transformer towers to int8.
+    Attention in/out projections are left in float by PyTorch.
+    """
+    before_mb, rss_before_mb = model_size_mb(model), process_rss_mb()
+    started = time.monotonic()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    after_mb, rss_after_mb = model_size_mb(model), process_rss_mb()
+    logger.info(
+        f"Quantized CLIP to int8 in {time.monotonic() - started:.2f}s: "
+        f"weights {before_mb:.1f} MB -> {after_mb:.1f} MB, "
+        f"process RSS {rss_before_mb} MB -> {rss_after_mb} MB"
+    )
+    return model
+
+
+def model_size_mb(model) -> float:
+    """
+    Serialized size of the model's state dict, which includes packed int8 weights.
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def process_rss_mb():
+    """
+    Current resident set size of this process in MB (Linux only, else None).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
 
 
 def get_detect_anything_model():
-    bucket_name = "glacier-ml-training"
-    object_key = "artifacts/dev/DETECT-ANYTHING/YOLOV11M_1280/cleaned/best.pt"
-    local_path = "/tmp/ultralytics_weights.pt"
+    # Imported here so workers that never run detection don't pay for ultralytics
+    from ultralytics import YOLO
 
-    s3_client = settings.get_s3_client()
-    s3_client.download_file(bucket_name, object_key, local_path)
+    started = time.monotonic()
+    local_path = fetch_weights(WEIGHTS_BUCKET, DETECT_ANYTHING_WEIGHTS_KEY)
+    logger.info(f"Fetched YOLO weights in {time.monotonic() - started:.2f}s")
 
+    started = time.monotonic()
     detect_model = YOLO(local_path).to(device)
+    logger.info(f"Loaded YOLO model in {time.monotonic() - started:.2f}s")
     return detect_model
-
-
-da_model = get_detect_anything_model()
\ No newline at end of file
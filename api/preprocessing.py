@@ -0,0 +1,104 @@
+import io
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+import torch
+from PIL import Image
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Normalization constants of CLIP's `preprocess`
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# JPEG draft decoding keeps the shorter side at least this many times the
+# model resolution, so the final bicubic resize still sees enough detail
+DRAFT_OVERSAMPLE = 2
+
+
+def decode_image(image_bytes: bytes, min_side: Optional[int] = None) -> Image.Image:
+    """
+    Decode image bytes to an RGB PIL image without going through a file.
+
+    With `min_side`, JPEGs are decoded at the smallest DCT scale (1/2, 1/4 or
+    1/8) that keeps both sides at least `min_side` pixels, which skips most of
+    the decoding work for large frames that end up at 224px anyway.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if min_side and image.format == "JPEG":
+        image.draft("RGB", (min_side, min_side))
+    return image.convert("RGB")
+
+
+def resize_and_crop(image: Image.Image, n_px: int) -> np.ndarray:
+    """
+    Bicubic-resize the shorter side to `n_px` and center-crop to a square,
+    exactly as CLIP's `preprocess` does; returns an (n_px, n_px, 3) uint8 array.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    width, height = image.size
+    short, long = (width, height) if width <= height else (height, width)
+    if short != n_px:
+        new_long = int(n_px * long / short)
+        size = (n_px, new_long) if width <= height else (new_long, n_px)
+        image = image.resize(size, Image.BICUBIC)
+        width, height = size
+
+    left = int(round((width - n_px) / 2.0))
+    top = int(round((height - n_px) / 2.0))
+    return np.asarray(image.crop((left, top, left + n_px, top + n_px)))
+
+
+def to_tensor(arrays: Sequence[np.ndarray]) -> torch.Tensor:
+    """
+    Stack (H, W, 3) uint8 arrays and scale/normalize them in one vectorized
+    step; returns an (N, 3, H, W) float32 tensor.
+    """
+    batch = torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2).float()
+    mean = torch.tensor(CLIP_MEAN).view(1, 3, 1, 1) * 255.0
+    std = torch.tensor(CLIP_STD).view(1, 3, 1, 1) * 255.0
+    return batch.sub_(mean).div_(std).contiguous()
+
+
+def preprocess_images(images: Sequence[Image.Image], n_px: int) -> torch.Tensor:
+    """
+    Batched equivalent of `torch.stack([preprocess(image) for image in images])`.
+    """
+    return to_tensor([resize_and_crop(image, n_px) for image in images])
+
+
+def preprocess_bytes(images: Sequence[bytes], n_px: int) -> torch.Tensor:
+    """
+    Decode and preprocess encoded images into one (N, 3, n_px, n_px) tensor.
+    """
+    min_side = n_px * DRAFT_OVERSAMPLE if settings.fast_image_decode else None
+    arrays = []
+    for image_bytes in images:
+        with decode_image(image_bytes, min_side) as image:
+            arrays.append(resize_and_crop(image, n_px))
+    return to_tensor(arrays)
+
+
+def check_parity(images: List[bytes], preprocess, n_px: int) -> dict:
+    """
+    Compare this module against CLIP's `preprocess` on the same encoded images.
+    Full-resolution decoding should match to float rounding; draft decoding
+    differs slightly in pixels, which `max_abs_diff_draft` shows.
+    """
+    reference = torch.stack([
+        preprocess(Image.open(io.BytesIO(image_bytes))) for image_bytes in images
+    ])
+    exact = to_tensor([resize_and_crop(decode_image(image_bytes), n_px) for image_bytes in images])
+    draft = to_tensor([
+        resize_and_crop(decode_image(image_bytes, n_px * DRAFT_OVERSAMPLE), n_px) for image_bytes in images
+    ])
+    return {
+        "images": len(images),
+        "max_abs_diff_exact": float((reference - exact).abs().max()),
+        "max_abs_diff_draft": float((reference - draft).abs().max()),
+        "mean_abs_diff_draft": float((reference - draft).abs().mean()),
+    }
@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+from api.cache import LRUCache
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Buckets whose region is known up front; others are looked up once
+BUCKET_REGIONS = {
+    "glacier-ml-training": "us-east-1",
+    "scanner-data.us-west-2": "us-west-2",
+}
+
+
+class PresignedUrlCache:
+    """
+    Presigned GET URLs keyed by S3 URI.
+
+    A URL is reused until `refresh_margin` seconds before it expires, so the
+    same image keeps the same URL across searches and the browser can cache
+    it. Each bucket's region is resolved once.
+    """
+
+    def __init__(self, expires_in: int, refresh_margin: int, maxsize: int):
+        self.expires_in = expires_in
+        self.refresh_margin = min(refresh_margin, expires_in // 2)
+        self.urls = LRUCache(maxsize, name="presigned_urls", ttl=self.expires_in - self.refresh_margin)
+        self._regions: Dict[str, str] = dict(BUCKET_REGIONS)
+        self._lock = threading.Lock()
+        self.signed = 0
+
+    def sign(self, s3_uri: Optional[str]) -> Optional[str]:
+        if not s3_uri:
+            return None
+        return self.urls.get_or_compute(s3_uri, lambda: self._sign(s3_uri))
+
+    def sign_many(self, s3_uris: Iterable[Optional[str]]) -> Dict[str, Optional[str]]:
+        """
+        Sign every distinct URI of a result page at once; returns {uri: url}.
+        """
+        return {s3_uri: self.sign(s3_uri) for s3_uri in dict.fromkeys(uri for uri in s3_uris if uri)}
+
+    def bucket_region(self, bucket: str) -> str:
+        region = self._regions.get(bucket)
+        if region is not None:
+            return region
+        try:
+            location = settings.get_s3_client().get_bucket_location(Bucket=bucket)
+            # us-east-1 buckets report no location constraint
+            region = location.get("LocationConstraint") or "us-east-1"
+        except Exception as e:
+            logger.warning(f"Could not resolve the region of bucket {bucket} ({e}); using {settings.default_region}")
+            region = settings.default_region
+        with self._lock:
+            self._regions[bucket] = region
+        return region
+
+    def stats(self) -> dict:
+        return {
+            **self.urls.stats(),
+            "signed": self.signed,
+            "expires_in": self.expires_in,
+            "refresh_margin": self.refresh_margin,
+            "bucket_regions": dict(self._regions),
+        }
+
+    def _sign(self, s3_uri: str) -> str:
+        bucket_name, key = s3_uri[5:].split("/", 1)
+        s3_client = settings.get_s3_client(region_name=self.bucket_region(bucket_name))
+        url = s3_client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket_name, "Key": key},
+            ExpiresIn=self.expires_in,
+        )
+        with self._lock:
+            self.signed += 1
+        return url
+
+
+presigned_urls = PresignedUrlCache(
+    expires_in=settings.presigned_url_expires_seconds,
+    refresh_margin=settings.presigned_url_refresh_margin_seconds,
+    maxsize=settings.presigned_url_cache_size,
+)
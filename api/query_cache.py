@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from api.cache import LRUCache
+from api.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Write generation in shared memory. Created at import, so pre-forked workers
+# (gunicorn preload_app, see api/gunicorn_conf.py) all share the parent's
+# counter and a write in one worker invalidates every worker's cache.
+_shared_generation = multiprocessing.Value("Q", 0)
+# time.monotonic() of the last write, shared the same way. CLOCK_MONOTONIC is
+# system-wide, so the workers' readings compare.
+_shared_last_write = multiprocessing.Value("d", float("-inf"))
+
+
+class CachedVectorStore(VectorStore):
+    """
+    Vector store wrapper that caches query results.
+
+    Results are kept in a TTL + LRU cache keyed by a fingerprint of the query
+    vector, top_k, the filter and the include flags, plus the index
+    generation. Every upsert or delete made through this store bumps the
+    generation, which is shared with the other workers forked from the same
+    parent, so no result cached before a write made through the API on this
+    host is served after it.
+
+    The backend is eventually consistent: a query that runs right after a
+    write may not see it yet. Results of queries started within
+    `settle_seconds` of the last write are returned but not cached, so a
+    stale read is not pinned for the whole TTL. Writes made elsewhere (other
+    hosts, scripts) are picked up once the TTL expires, so
+    `QUERY_CACHE_TTL_SECONDS` bounds how stale a result can be.
+    """
+
+    def __init__(self, store: VectorStore, maxsize: int, ttl: float, settle_seconds: float = 0.0):
+        self.store = store
+        self.name = store.name
+        self.cache = LRUCache(maxsize, name="query_results", ttl=ttl)
+        self.settle_seconds = max(0.0, settle_seconds)
+        self._lock = threading.Lock()
+        self._miss_seconds = 0.0
+        self._misses_timed = 0
+        self._settling = 0
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, include_values=False):
+        key = (
+            _shared_generation.value,
+            fingerprint(vector),
+            top_k,
+            json.dumps(filter, sort_keys=True) if filter else None,
+            include_metadata,
+            include_values,
+        )
+
+        settling = []
+
+        def compute():
+            started = time.monotonic()
+            if started - _shared_last_write.value < self.settle_seconds:
+                settling.append(True)
+            response = self.store.query(vector, top_k, filter, include_metadata, include_values)
+            with self._lock:
+                self._miss_seconds += time.monotonic() - started
+                self._misses_timed += 1
+            return response
+
+        response = self.cache.get_or_compute(key, compute)
+        if settling:
+            # The backend may not have applied the last write yet
+            self.cache.invalidate(key)
+            with self._lock:
+                self._settling += 1
+        return response
+
+    def fetch(self, ids):
+        return self.store.fetch(ids)
+
+    def upsert(self, vectors):
+        try:
+            return self.store.upsert(vectors)
+        finally:
+            self.bump_generation()
+
+    def delete(self, ids=None, filter=None, delete_all=False):
+        try:
+            return self.store.delete(ids=ids, filter=filter, delete_all=delete_all)
+        finally:
+            self.bump_generation()
+
+    def describe_index_stats(self):
+        return self.store.describe_index_stats()
+
+    def list_ids(self, batch_size=100):
+        return self.store.list_ids(batch_size)
+
+    @property
+    def generation(self) -> int:
+        return _shared_generation.value
+
+    def bump_generation(self):
+        """
+        Invalidate every cached result, in every worker, and start the
+        settle window in which new results are not cached.
+        """
+        with _shared_generation.get_lock():
+            _shared_generation.value += 1
+            _shared_last_write.value = time.monotonic()
+        self.cache.clear()
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            avg_miss = (self._miss_seconds / self._misses_timed) if self._misses_timed else 0.0
+            settling = self._settling
+        stats["generation"] = self.generation
+        stats["avg_miss_ms"] = avg_miss * 1000.0
+        stats["settle_seconds"] = self.settle_seconds
+        stats["not_cached_settling"] = settling
+        # Each hit (or shared in-flight lookup) skipped one backend query
+        stats["saved_seconds_estimate"] = (stats["hits"] + stats["shared_inflight"]) * avg_miss
+        return {**self.store.stats(), "query_cache": stats}
+
+    def close(self):
+        self.store.close()
+
+
+def fingerprint(vector) -> bytes:
+    """
+    Digest of the query vector's float32 bytes.
+    """
+    data = np.asarray(vector, dtype=np.float32).tobytes()
+    return hashlib.blake2b(data, digest_size=16).digest()
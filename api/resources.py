@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict
+
+import boto3
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+# DynamoDB table backing the labeling queue
+DDB_TABLE_NAME = "UDOLabelingQueue"
+
+# WARMUP_MODELS name -> resource it loads
+MODEL_RESOURCES = {
+    "clip": "clip_backend",
+    "detect_model": "detect_model",
+}
+
+# WARMUP_MODELS name -> resource loaded before forking: plain torch weights
+# only, since ONNX Runtime / TorchScript sessions own thread pools that are
+# not fork-safe and size them from the parent's thread count
+PREFORK_MODEL_RESOURCES = {
+    "clip": "clip",
+    "detect_model": "detect_model",
+}
+
+# Resources a pre-forked worker keeps from the parent process
+FORK_SHARED_RESOURCES = {"clip", "detect_model"}
+
+
+class Resources:
+    """
+    Process-wide container for the API's clients and models.
+
+    Nothing is created at import time. Each resource is built once, on first
+    use, and how long it took is recorded. The FastAPI lifespan calls
+    `startup()` to initialize the clients and, depending on `WARMUP_MODELS`,
+    load models eagerly instead of on the first request that needs them.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self.init_seconds: Dict[str, float] = {}
+
+    # -----------------------------------------------------------------
+    # Resources
+    # -----------------------------------------------------------------
+
+    @property
+    def s3_client(self):
+        return self._get("s3_client", settings.get_s3_client)
+
+    @property
+    def vector_store(self):
+        """
+        Vector store selected by `VECTOR_STORE`.
+        """
+        from api.vector_store import build_vector_store
+
+        return self._get("vector_store", build_vector_store)
+
+    @property
+    def labeling_table(self):
+        return self._get(
+            "labeling_table",
+            lambda: boto3.resource("dynamodb", region_name=settings.default_region).Table(DDB_TABLE_NAME),
+        )
+
+    @property
+    def clip(self):
+        """
+        (model, device, preprocess) for the fine-tuned CLIP model.
+        """
+        from api.model_loader import get_clip_model
+
+        return self._get("clip", get_clip_model)
+
+    @property
+    def clip_backend(self):
+        """
+        Inference backend for CLIP selected by `CLIP_BACKEND`.
+        """
+        from api.clip_backends import build_clip_backend
+
+        return self._get("clip_backend", lambda: build_clip_backend(*self.clip[:2]))
+
+    @property
+    def detect_model(self):
+        from api.model_loader import get_detect_anything_model
+
+        return self._get("detect_model", get_detect_anything_model)
+
+    # -----------------------------------------------------------------
+    # Lifecycle
+    # -----------------------------------------------------------------
+
+    def startup(self):
+        """
+        Initialize the clients and warm up the models listed in `WARMUP_MODELS`.
+        """
+        started = time.monotonic()
+        self.s3_client
+        self.vector_store
+        self.labeling_table
+        self.warm_up(settings.warmup_models)
+        logger.info(f"Resources ready in {time.monotonic() - started:.2f}s: {self.init_seconds}")
+
+    def warm_up(self, names, model_resources: Dict[str, str] = MODEL_RESOURCES):
+        for name in names:
+            if name not in model_resources:
+                logger.warning(f"Unknown model in WARMUP_MODELS: {name}")
+                continue
+            getattr(self, model_resources[name])
+
+    def shutdown(self):
+        if "vector_store" in self._values:
+            self._values["vector_store"].close()
+        self._values.clear()
+        self.init_seconds.clear()
+
+    def reset_after_fork(self):
+        """
+        Called in each pre-forked worker. Models loaded by the parent are kept
+        and shared copy-on-write; network clients are dropped because their
+        connection pools must not be shared across processes.
+        """
+        for name in list(self._values):
+            if name not in FORK_SHARED_RESOURCES:
+                self._values.pop(name)
+                self.init_seconds.pop(name, None)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        settings.reset_clients()
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._values
+
+    def stats(self) -> dict:
+        return {
+            "initialized": sorted(self._values),
+            "init_seconds": dict(self.init_seconds),
+        }
+
+    def _get(self, name: str, factory: Callable):
+        if name in self._values:
+            return self._values[name]
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._values:
+                started = time.monotonic()
+                value = factory()
+                self.init_seconds[name] = time.monotonic() - started
+                logger.info(f"Initialized {name} in {self.init_seconds[name]:.2f}s")
+                self._values[name] = value
+        return self._values[name]
+
+
+resources = Resources()
@@ -0,0 +1,179 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from pydantic import BaseModel
+
+from api.presign import presigned_urls
+
+# Vector metadata field holding the crop's thumbnail URI (see api/thumbnails.py)
+THUMBNAIL_S3_URI = "thumbnail_s3_uri"
+
+# Fields of a search result, in response order
+RESULT_FIELDS = (
+    "class",
+    "date_added",
+    "file_type",
+    "s3_file_name",
+    "s3_file_path",
+    "s3_presigned_url",
+    "thumbnail_url",
+    "brand",
+    "modifier",
+    "pick_point",
+    "color",
+    "coordinates",
+    "datetime_taken",
+    "embedding_id",
+    "material",
+    "original_s3_uri",
+    "robot",
+    "shape",
+    "comment",
+    "labeler_name",
+    "timestamp",
+    "whole_image_presigned_url",
+)
+
+# Result fields holding presigned URLs, and the metadata field each one signs.
+# The whole frame is signed at full size: the viewer needs its natural size to
+# place the bounding box, and the browser only loads it when the viewer opens
+URL_FIELDS = {
+    "s3_presigned_url": "s3_file_path",
+    "thumbnail_url": THUMBNAIL_S3_URI,
+    "whole_image_presigned_url": "original_s3_uri",
+}
+
+# Metadata fields the search endpoints can filter on by exact value
+FILTER_FIELDS = ("color", "material", "brand", "shape", "robot")
+
+# Numeric copy of `datetime_taken` (seconds since the epoch) used for range
+# filters, since Pinecone only compares numbers
+DATETIME_TAKEN_TS = "datetime_taken_ts"
+
+
+class SearchFilters(BaseModel):
+    """
+    Structured filters pushed down into the vector query. Each field takes a
+    single value or a list of accepted values; the date range is inclusive.
+    """
+
+    color: Optional[Union[str, List[str]]] = None
+    material: Optional[Union[str, List[str]]] = None
+    brand: Optional[Union[str, List[str]]] = None
+    shape: Optional[Union[str, List[str]]] = None
+    robot: Optional[Union[str, List[str]]] = None
+    datetime_taken_from: Optional[datetime] = None
+    datetime_taken_to: Optional[datetime] = None
+
+
+def build_filter(filters: Optional[SearchFilters]) -> Optional[dict]:
+    """
+    Translate `filters` into a Pinecone metadata filter (None if empty).
+    """
+    if filters is None:
+        return None
+
+    clauses = {}
+    for field in FILTER_FIELDS:
+        value = getattr(filters, field)
+        if isinstance(value, list):
+            values = [item for item in value if item]
+            if values:
+                clauses[field] = {"$in": values}
+        elif value:
+            clauses[field] = {"$eq": value}
+
+    date_range = {}
+    if filters.datetime_taken_from is not None:
+        date_range["$gte"] = _timestamp(filters.datetime_taken_from)
+    if filters.datetime_taken_to is not None:
+        date_range["$lte"] = _timestamp(filters.datetime_taken_to)
+    if date_range:
+        clauses[DATETIME_TAKEN_TS] = date_range
+
+    return clauses or None
+
+
+def datetime_taken_timestamp(datetime_taken: Optional[str]) -> Optional[float]:
+    """
+    Parse a stored ISO-8601 `datetime_taken` into seconds since the epoch.
+    """
+    if not datetime_taken:
+        return None
+    try:
+        return _timestamp(datetime.fromisoformat(datetime_taken))
+    except ValueError:
+        return None
+
+
+def result_fields(fields: Optional[Sequence[str]] = None, full_size: bool = False) -> Tuple[str, ...]:
+    """
+    Validate a `fields=` projection; without one, every result field except
+    the full-size crop URL, which is added by `full_size`.
+    """
+    if not fields:
+        return tuple(field for field in RESULT_FIELDS if full_size or field != "s3_presigned_url")
+    unknown = [field for field in fields if field not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown result fields: {', '.join(unknown)}. Allowed: {', '.join(RESULT_FIELDS)}")
+    return tuple(dict.fromkeys(fields))
+
+
+def format_match(match: dict, fields: Sequence[str] = RESULT_FIELDS, urls: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Shape one vector store match as returned by the search endpoints, keeping
+    only `fields`. `urls` holds presigned URLs signed in bulk for the whole
+    page; URL fields are only signed when they are in `fields`.
+
+    `thumbnail_url` points at the crop's thumbnail (or the crop itself when it
+    has none yet).
+    """
+    metadata = match.get("metadata") or {}
+    if urls is None:
+        urls = presigned_urls.sign_many(_url_sources(metadata, fields))
+    return {
+        "score": match["score"],
+        "metadata": {
+            field: urls.get(_url_source(field, metadata)) if field in URL_FIELDS else metadata.get(field)
+            for field in fields
+        },
+    }
+
+
+def format_results(
+    query_response: dict,
+    fields: Optional[Sequence[str]] = None,
+    ids_only: bool = False,
+    full_size: bool = False,
+) -> List[dict]:
+    """
+    Format a page of matches. `ids_only` returns just ids and scores (query
+    without metadata for it); otherwise see `result_fields`.
+    """
+    matches = query_response["matches"]
+    if ids_only:
+        return [{"id": match["id"], "score": match["score"]} for match in matches]
+
+    fields = result_fields(fields, full_size)
+    uris = []
+    for match in matches:
+        uris += _url_sources(match.get("metadata") or {}, fields)
+    urls = presigned_urls.sign_many(uris) if uris else {}
+    return [format_match(match, fields, urls) for match in matches]
+
+
+def _url_source(field: str, metadata: dict) -> Optional[str]:
+    if field == "thumbnail_url":
+        return metadata.get(THUMBNAIL_S3_URI) or metadata.get("s3_file_path")
+    return metadata.get(URL_FIELDS[field])
+
+
+def _url_sources(metadata: dict, fields: Sequence[str]) -> List[Optional[str]]:
+    return [_url_source(field, metadata) for field in fields if field in URL_FIELDS]
+
+
+def _timestamp(value: datetime) -> float:
+    # Naive datetimes are taken as UTC, like the robots' capture times
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import logging
+import os
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from PIL import Image, features
+
+from api.config import settings
+from api.preprocessing import decode_image
+
+logger = logging.getLogger(__name__)
+
+# Thumbnails live next to the crops, under universal-db/ of the crop's bucket
+THUMBNAIL_PREFIX = "universal-db/thumbnails/"
+
+# Thumbnail keys are derived from the crop URI and never rewritten in place
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def thumbnail_format() -> Tuple[str, str, str]:
+    """
+    (PIL format, file extension, content type) of the thumbnails; WebP unless
+    THUMBNAIL_FORMAT asks for JPEG or Pillow was built without WebP support.
+    """
+    if settings.thumbnail_format == "webp" and features.check("webp"):
+        return "WEBP", "webp", "image/webp"
+    return "JPEG", "jpg", "image/jpeg"
+
+
+def thumbnail_uri(crop_s3_uri: str) -> str:
+    """
+    Deterministic thumbnail location for a crop, so ingest and the backfill
+    job agree on it and re-running either just overwrites the same object.
+    """
+    parsed = urlparse(crop_s3_uri)
+    stem = os.path.splitext(os.path.basename(parsed.path))[0]
+    digest = hashlib.sha1(crop_s3_uri.encode("utf-8")).hexdigest()[:16]
+    _, extension, _ = thumbnail_format()
+    return f"s3://{parsed.netloc}/{THUMBNAIL_PREFIX}{stem}_{digest}.{extension}"
+
+
+def make_thumbnail(image: Image.Image) -> bytes:
+    """
+    Encode `image` scaled down to fit THUMBNAIL_MAX_SIDE (never scaled up).
+    """
+    image_format, _, _ = thumbnail_format()
+    thumbnail = image.convert("RGB") if image.mode != "RGB" else image.copy()
+    thumbnail.thumbnail((settings.thumbnail_max_side, settings.thumbnail_max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, image_format, quality=settings.thumbnail_quality)
+    return buffer.getvalue()
+
+
+def make_thumbnail_from_bytes(image_bytes: bytes) -> bytes:
+    # Draft-decode JPEG crops close to the thumbnail size instead of at full resolution
+    return make_thumbnail(decode_image(image_bytes, min_side=settings.thumbnail_max_side))
+
+
+def upload_thumbnail(crop_s3_uri: str, thumbnail: bytes) -> str:
+    """
+    Store an encoded thumbnail for `crop_s3_uri`; returns its S3 URI.
+    """
+    s3_uri = thumbnail_uri(crop_s3_uri)
+    parsed = urlparse(s3_uri)
+    _, _, content_type = thumbnail_format()
+    settings.get_s3_client().put_object(
+        Bucket=parsed.netloc,
+        Key=parsed.path.lstrip("/"),
+        Body=thumbnail,
+        ContentType=content_type,
+        CacheControl=THUMBNAIL_CACHE_CONTROL,
+    )
+    return s3_uri
+
+
+def thumbnail_exists(crop_s3_uri: str) -> bool:
+    parsed = urlparse(thumbnail_uri(crop_s3_uri))
+    try:
+        settings.get_s3_client().head_object(Bucket=parsed.netloc, Key=parsed.path.lstrip("/"))
+        return True
+    except Exception:
+        return False
+
+
+def ensure_thumbnail(crop_s3_uri: str, image_bytes: bytes) -> Optional[str]:
+    """
+    Thumbnail URI for a crop, creating the thumbnail from the crop's bytes if
+    it doesn't exist yet. Returns None (and logs) on failure: a missing
+    thumbnail only means search falls back to the full-size crop.
+    """
+    if not settings.thumbnails_enabled or not crop_s3_uri:
+        return None
+    try:
+        if thumbnail_exists(crop_s3_uri):
+            return thumbnail_uri(crop_s3_uri)
+        return upload_thumbnail(crop_s3_uri, make_thumbnail_from_bytes(image_bytes))
+    except Exception as e:
+        logger.warning(f"Could not create a thumbnail for {crop_s3_uri}: {str(e)}")
+        return None
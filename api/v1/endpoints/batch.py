@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import binascii
+import logging
+from typing import Awaitable, Callable, List, Optional
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from api.config import settings
+from api.embedding_cache import (
+    aencode_image_bytes_cached,
+    aencode_images_bytes_cached,
+    aencode_text_cached,
+    aencode_texts_cached,
+)
+from api.executors import io_executor
+from api.resources import resources
+from api.search import SearchFilters, build_filter, format_results, result_fields
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class BatchQuery(BaseModel):
+    """
+    One search: exactly one of `text`, `image` (base64-encoded bytes) or
+    `s3_uri`. `filters` overrides the batch-level filters.
+    """
+
+    text: Optional[str] = None
+    image: Optional[str] = None
+    s3_uri: Optional[str] = None
+    filters: Optional[SearchFilters] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+    top_k: Optional[int] = None
+    filters: Optional[SearchFilters] = None
+    # Also return full-size crop URLs, not just thumbnails
+    full_size: bool = False
+    # Only return these result fields (see api.search.RESULT_FIELDS)
+    fields: Optional[List[str]] = None
+    # Only return ids and scores
+    ids_only: bool = False
+
+
+@router.post("/search/batch", response_class=ORJSONResponse)
+async def search_batch(request: BatchSearchRequest):
+    """
+    Run many text/image searches in one request. Inputs are encoded together,
+    the vector lookups run concurrently, and results come back in input order.
+    A failing query yields an error entry instead of failing the batch.
+    """
+    if len(request.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.search_batch_max_queries} queries are allowed per batch.",
+        )
+    try:
+        fields = result_fields(request.fields, request.full_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    count = len(request.queries)
+    errors: List[Optional[str]] = [None] * count
+    texts = {}
+    images = {}
+
+    # Resolve every input to a query string or image bytes
+    s3_reads = {}
+    for i, query in enumerate(request.queries):
+        inputs = [value for value in (query.text, query.image, query.s3_uri) if value]
+        if len(inputs) != 1:
+            errors[i] = "Each query needs exactly one of text, image or s3_uri."
+        elif query.text:
+            texts[i] = query.text
+        elif query.image:
+            try:
+                images[i] = base64.b64decode(query.image, validate=True)
+            except (binascii.Error, ValueError):
+                errors[i] = "image is not valid base64."
+        else:
+            s3_reads[i] = io_executor.run(read_s3_object, query.s3_uri)
+
+    for i, result in zip(s3_reads, await asyncio.gather(*s3_reads.values(), return_exceptions=True)):
+        if isinstance(result, BaseException):
+            errors[i] = _error_message(result)
+        else:
+            images[i] = result
+
+    # Encode all texts and all images, each as one batch
+    text_embeddings, image_embeddings = await asyncio.gather(
+        _encode(texts, aencode_texts_cached, aencode_text_cached),
+        _encode(images, aencode_images_bytes_cached, aencode_image_bytes_cached),
+    )
+    embeddings = {**text_embeddings, **image_embeddings}
+
+    # Look up every embedding concurrently, at most SEARCH_BATCH_CONCURRENCY at a time
+    semaphore = asyncio.Semaphore(max(1, settings.search_batch_concurrency))
+    top_k = request.top_k or settings.k
+
+    async def lookup(i: int, embedding: List[float]):
+        search_filter = build_filter(request.queries[i].filters or request.filters)
+        async with semaphore:
+            response = await io_executor.run(
+                resources.vector_store.query,
+                vector=embedding, top_k=top_k, filter=search_filter, include_metadata=not request.ids_only
+            )
+        return format_results(response, fields, request.ids_only)
+
+    lookups = {}
+    for i in range(count):
+        embedding = embeddings.get(i)
+        if isinstance(embedding, BaseException):
+            errors[i] = _error_message(embedding)
+        elif embedding is not None:
+            lookups[i] = lookup(i, embedding)
+    results = dict(zip(lookups, await asyncio.gather(*lookups.values(), return_exceptions=True)))
+
+    response = []
+    for i in range(count):
+        result = results.get(i)
+        if isinstance(result, BaseException):
+            errors[i] = _error_message(result)
+        if errors[i] is not None or result is None:
+            response.append({"index": i, "status": "error", "error": errors[i] or "Query was not processed."})
+        else:
+            response.append({"index": i, "status": "ok", "results": result})
+
+    failed = sum(1 for item in response if item["status"] == "error")
+    if failed:
+        logger.warning(f"Batch search: {failed} of {count} queries failed")
+    return ORJSONResponse({"results": response})
+
+
+def read_s3_object(s3_uri: str) -> bytes:
+    parsed = urlparse(s3_uri)
+    if parsed.scheme != "s3" or not parsed.netloc or not parsed.path.strip("/"):
+        raise ValueError(f"Invalid S3 URI: {s3_uri}")
+    response = settings.get_s3_client().get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip("/"))
+    return response["Body"].read()
+
+
+async def _encode(
+    inputs: dict,
+    encode_batch: Callable[[list], Awaitable[List[List[float]]]],
+    encode_one: Callable[[object], Awaitable[List[float]]],
+) -> dict:
+    """
+    Encode `inputs` ({index: input}) as one batch. If the batch fails (e.g.
+    one undecodable image), encode them one by one so only the bad inputs
+    end up with an error.
+    """
+    if not inputs:
+        return {}
+    try:
+        return dict(zip(inputs, await encode_batch(list(inputs.values()))))
+    except Exception as e:
+        logger.warning(f"Batch encode of {len(inputs)} inputs failed ({e}); encoding individually")
+    results = await asyncio.gather(*[encode_one(value) for value in inputs.values()], return_exceptions=True)
+    return dict(zip(inputs, results))
+
+
+def _error_message(error: BaseException) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return str(error) or error.__class__.__name__
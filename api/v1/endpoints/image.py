@@ -1,21 +1,38 @@
-import torch
 from PIL import Image
 import io
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import ORJSONResponse
 from api.config import settings
-from api import deps
-import tempfile
-from api.model_loader import model, device, preprocess
+from api.executors import io_executor
+from api.resources import resources
+from api.embedding_cache import aencode_image_bytes_cached
+from api.search import SearchFilters, build_filter, format_results, result_fields
 
 
 router = APIRouter()
 
-s3_client = settings.get_s3_client()
-
 
-@router.post("/search/image")
-async def query_image(file: UploadFile = File(...)):
+@router.post("/search/image", response_class=ORJSONResponse)
+async def query_image(
+    file: UploadFile = File(...),
+    filters: Optional[str] = Form(None),
+    full_size: bool = Form(False),
+    fields: Optional[str] = Form(None),
+    ids_only: bool = Form(False),
+):
+    """
+    `filters` is an optional JSON-encoded SearchFilters object; `full_size`
+    adds full-size crop URLs to the thumbnail URLs. `fields` is an optional
+    comma-separated projection of the result fields, and `ids_only` returns
+    just ids and scores.
+    """
     try:
+        search_filter = build_filter(SearchFilters.model_validate_json(filters)) if filters else None
+        projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        result_field_names = result_fields(projection, full_size)
+
         # Read and validate the image
         contents = await file.read()
         with Image.open(io.BytesIO(contents)) as img:
@@ -27,61 +44,18 @@ async def query_image(file: UploadFile = File(...)):
                 detail="We only support BMP, GIF, JPG, JPEG, and PNG for images. Please upload a valid image file.",
             )
 
-        # Save the image temporarily for processing
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(contents)
-            local_image_path = temp_file.name
-
-        # Preprocess the image and generate embeddings
-        image = preprocess(Image.open(local_image_path)).unsqueeze(0).to(device)
-        with torch.no_grad():  # Add no_grad here
-            embeddings = model.encode_image(image).cpu().numpy().tolist()[0]
+        # Generate embeddings, reusing any earlier embedding of the same bytes
+        embeddings = await aencode_image_bytes_cached(contents)
 
         # Query Pinecone with the generated embeddings
-        query_response = deps.index.query(
-            vector=embeddings, top_k=settings.k, include_metadata=True
+        query_response = await io_executor.run(
+            resources.vector_store.query,
+            vector=embeddings, top_k=settings.k, filter=search_filter, include_metadata=not ids_only
         )
 
-        matches = query_response["matches"]
-        results = []
-
-        for match in matches:
-            metadata = match["metadata"]
-            s3_file_path = metadata.get("s3_file_path")
-            s3_file_name = metadata.get("s3_file_name")
-
-            results.append(
-                {
-                    "score": match["score"],
-                    "metadata": {
-                        "class": metadata.get("class"),
-                        "date_added": metadata.get("date_added"),
-                        "file_type": metadata.get("file_type"),
-                        "s3_file_name": s3_file_name,
-                        "s3_file_path": s3_file_path,
-                        "s3_presigned_url": settings.generate_presigned_url(
-                            s3_file_path
-                        ),
-                        "brand": metadata.get("brand"),
-                        "modifier": metadata.get("modifier"),
-                        "pick_point": metadata.get("pick_point"),
-                        "color": metadata.get("color"),
-                        "coordinates": metadata.get("coordinates"),
-                        "datetime_taken": metadata.get("datetime_taken"),
-                        "embedding_id": metadata.get("embedding_id"),
-                        "material": metadata.get("material"),
-                        "original_s3_uri": metadata.get("original_s3_uri"),
-                        "robot": metadata.get("robot"),
-                        "shape": metadata.get("shape"),
-                        "comment": metadata.get("comment"),
-                        "labeler_name": metadata.get("labeler_name"),
-                        "timestamp": metadata.get("timestamp"),
-                        "whole_image_presigned_url": settings.generate_presigned_url(
-                            metadata.get("original_s3_uri")
-                        ),
-                    },
-                }
-            )
-        return {"results": results}
+        return ORJSONResponse({"results": format_results(query_response, result_field_names, ids_only)})
+    except HTTPException:
+        # Keeps 503s from saturated executors (and our own 400s) as they are
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
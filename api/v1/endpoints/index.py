@@ -1,13 +1,16 @@
 from fastapi import APIRouter, HTTPException
-from api import deps
+from api.executors import io_executor
+from api.resources import resources
 
 router = APIRouter()
 
 @router.get("/index/info")
 async def get_index_info():
     try:
-        index_info = deps.index.describe_index_stats()
+        index_info = await io_executor.run(resources.vector_store.describe_index_stats)
         total_vectors = index_info['total_vector_count']
         return {"total_vectors": total_vectors}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve index info: {str(e)}")
@@ -14,22 +14,18 @@ from pydantic import BaseModel
 from PIL import Image
 import piexif
 import piexif.helper
-import torch
 from urllib.parse import urlparse
-import boto3
 
 from api.config import settings
-from api.model_loader import model, device, preprocess
+from api.executors import io_executor
+from api.resources import resources
+from api.embedding_cache import aencode_image_bytes_cached
+from api.thumbnails import make_thumbnail, upload_thumbnail
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
-# DynamoDB Setup
-DDB_TABLE_NAME = "UDOLabelingQueue"
-dynamodb = boto3.resource("dynamodb", region_name=settings.default_region)
-table = dynamodb.Table(DDB_TABLE_NAME)
-
 # Crop output folder (still S3)
 CROP_OUTPUT_FOLDER = "s3://glacier-ml-training/universal-db/crops_for_labeling/"
 
@@ -96,7 +92,7 @@ def get_labeling_list():
                     if diff_mins > EXPIRATION_MINUTES:
                         new_ts = now.isoformat()
                         # Mark in_progress = false
-                        table.update_item(
+                        resources.labeling_table.update_item(
                             Key={
                                 "shard": item["shard"],
                                 "s3_uri_bounding_box": item["s3_uri_bounding_box"],
@@ -161,6 +157,18 @@ async def similarity_search(
         original_s3_uri = payload.original_s3_uri
         bounding_box = payload.bounding_box
 
+    # DynamoDB, S3 and Pinecone calls block, so run them on the I/O pool; decoding,
+    # preprocessing and encoding the crop run on the inference pool
+    item = await io_executor.run(prepare_similarity_item, original_s3_uri, bounding_box, now_str)
+    image_bytes = await io_executor.run(read_s3_bytes, item["crop_s3_uri"])
+    embedding = await aencode_image_bytes_cached(image_bytes)
+    return await io_executor.run(finish_similarity_search, item, embedding, now_str)
+
+
+def prepare_similarity_item(original_s3_uri: str, bounding_box: List[float], now_str: str) -> Dict[str, Any]:
+    """
+    Find or create the labeling item for the crop and make sure the crop exists in S3.
+    """
     s3_uri_bb = build_s3_uri_bounding_box_int(original_s3_uri, bounding_box)
     item = find_item_by_s3_and_box(original_s3_uri, bounding_box)
 
@@ -185,9 +193,9 @@ async def similarity_search(
             "difficult": "false",
             "updated_timestamp": now_str
         }
-        table.put_item(Item=item)
+        resources.labeling_table.put_item(Item=item)
     else:
-        table.update_item(
+        resources.labeling_table.update_item(
             Key={
                 "shard": item["shard"],
                 "s3_uri_bounding_box": item["s3_uri_bounding_box"]},
@@ -198,12 +206,11 @@ async def similarity_search(
 
     embedding_id = item.get("embedding_id", "")
     if embedding_id:
-        pinecone_index = settings.get_pinecone_index()
-        fetch_resp = pinecone_index.fetch(ids=[embedding_id])
-        vector_data = fetch_resp.vectors.get(embedding_id)
-        if vector_data and vector_data.metadata:
-            pinecone_meta = vector_data.metadata
-            table.update_item(
+        fetch_resp = resources.vector_store.fetch([embedding_id])
+        vector_data = fetch_resp["vectors"].get(embedding_id)
+        if vector_data and vector_data.get("metadata"):
+            pinecone_meta = vector_data["metadata"]
+            resources.labeling_table.update_item(
                 Key={"shard": item["shard"], "s3_uri_bounding_box": item["s3_uri_bounding_box"]},
                 UpdateExpression="SET new_crop_metadata = :n, updated_timestamp = :u",
                 ExpressionAttributeValues={":n": json.dumps(pinecone_meta), ":u": now_str}
@@ -212,15 +219,21 @@ async def similarity_search(
 
     if not item.get("crop_s3_uri"):
         new_crop_uri = create_and_upload_crop(original_s3_uri, bounding_box)
-        table.update_item(
+        resources.labeling_table.update_item(
             Key={"shard": item["shard"], "s3_uri_bounding_box": item["s3_uri_bounding_box"]},
             UpdateExpression="SET crop_s3_uri = :c, updated_timestamp = :u",
             ExpressionAttributeValues={":c": new_crop_uri, ":u": now_str}
         )
         item["crop_s3_uri"] = new_crop_uri
 
-    embeddings = generate_embeddings(item["crop_s3_uri"])
-    top_match = query_pinecone_for_top_match(embeddings, exclude_s3_file_path=item["crop_s3_uri"])
+    return item
+
+
+def finish_similarity_search(item: Dict[str, Any], embedding: List[float], now_str: str) -> Dict[str, Any]:
+    """
+    Look up the most similar crop in Pinecone and record it on the labeling item.
+    """
+    top_match = query_pinecone_for_top_match(embedding, exclude_s3_file_path=item["crop_s3_uri"])
     similar_crop_s3_uri = ""
     similar_metadata = {}
     score = None
@@ -228,7 +241,7 @@ async def similarity_search(
         score = top_match["score"]
         similar_metadata = top_match["metadata"]
         similar_crop_s3_uri = similar_metadata.get("s3_file_path", "")
-        table.update_item(
+        resources.labeling_table.update_item(
             Key={"shard": item["shard"], "s3_uri_bounding_box": item["s3_uri_bounding_box"]},
             UpdateExpression="SET similar_crop_s3_uri = :s, similar_crop_metadata = :m, updated_timestamp = :u",
             ExpressionAttributeValues={
@@ -249,7 +262,7 @@ async def similarity_search(
         "similar_crop_presigned_url": presigned_similar,
         "similar_crop_metadata": similar_metadata,
         "score": score,
-        "embedding_id": embedding_id,
+        "embedding_id": item.get("embedding_id", ""),
     }
 
 
@@ -270,7 +283,7 @@ def update_dynamodb_final(payload: UpdateDynamoDBRequest):
     old_s3_uri_bb = item["s3_uri_bounding_box"]
 
     # Delete the old item using the new primary key
-    table.delete_item(Key={"shard": old_shard, "s3_uri_bounding_box": old_s3_uri_bb})
+    resources.labeling_table.delete_item(Key={"shard": old_shard, "s3_uri_bounding_box": old_s3_uri_bb})
 
     updated_item = dict(item)
     updated_item["shard"] = "LABELED"
@@ -298,7 +311,7 @@ def update_dynamodb_final(payload: UpdateDynamoDBRequest):
     updated_item["similar"] = "true" if incoming_filtered == similar_filtered else "false"
 
     # Put the new item (with the same sort key)
-    table.put_item(Item=updated_item)
+    resources.labeling_table.put_item(Item=updated_item)
 
     return {"message": "Crop updated. Labeling session ended.", "status": "ok"}
 
@@ -313,7 +326,7 @@ def update_dynamodb_embedding(payload: UpdateDynamoDBEmbeddingRequest):
         raise HTTPException(status_code=404, detail="Row not found in DB.")
 
     now_str = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    table.update_item(
+    resources.labeling_table.update_item(
         Key={"shard": item["shard"], "s3_uri_bounding_box": item["s3_uri_bounding_box"]},
         UpdateExpression="SET embedding_id = :eid, updated_timestamp = :uts",
         ExpressionAttributeValues={
@@ -356,7 +369,7 @@ def delete_item(original_s3_uri: str, bounding_box: str):
         raise HTTPException(status_code=404, detail="Item not found in DB")
 
     # 2) Delete from table using the known shard + s3_uri_bounding_box
-    table.delete_item(
+    resources.labeling_table.delete_item(
         Key={"shard": item["shard"], "s3_uri_bounding_box": item["s3_uri_bounding_box"]}
     )
 
@@ -385,7 +398,7 @@ def mark_unreviewed(payload: BulkItemsPayload):
             continue
 
         # 1) Delete old item
-        table.delete_item(Key={"shard": old_shard, "s3_uri_bounding_box": old_key})
+        resources.labeling_table.delete_item(Key={"shard": old_shard, "s3_uri_bounding_box": old_key})
 
         # 2) Insert new item with shard="UNLABELED", labeled="false"
         new_item = dict(item_obj)
@@ -393,7 +406,7 @@ def mark_unreviewed(payload: BulkItemsPayload):
         new_item["labeled"] = "false"
         new_item["updated_timestamp"] = now_str
 
-        table.put_item(Item=new_item)
+        resources.labeling_table.put_item(Item=new_item)
         processed += 1
 
     return {
@@ -406,7 +419,7 @@ def mark_unreviewed(payload: BulkItemsPayload):
 # ---------------------------------------------------------------------
 
 def query_by_shard(shard_val: str) -> List[Dict[str, Any]]:
-    resp = table.query(
+    resp = resources.labeling_table.query(
         KeyConditionExpression="#sd = :sh",
         ExpressionAttributeNames={"#sd": "shard"},
         ExpressionAttributeValues={":sh": shard_val},
@@ -445,7 +458,7 @@ def find_item_by_s3_and_box(s3_uri: str, bounding_box: List[float]) -> Optional[
     for shard in ["UNLABELED", "LABELED"]:
         for key in (int_key, float_key):
             try:
-                resp = table.get_item(Key={"shard": shard, "s3_uri_bounding_box": key})
+                resp = resources.labeling_table.get_item(Key={"shard": shard, "s3_uri_bounding_box": key})
                 if "Item" in resp:
                     return resp["Item"]
             except Exception as e:
@@ -531,6 +544,13 @@ def create_and_upload_crop(original_s3_uri: str, bounding_box: List[float]) -> s
         }
         embed_exif_metadata(local_crop, embedded_path, exif_meta)
         upload_s3_uri(embedded_path, final_s3)
+
+        # Thumbnail from the in-memory crop; /new reuses it when the crop is ingested
+        if settings.thumbnails_enabled:
+            try:
+                upload_thumbnail(final_s3, make_thumbnail(cropped))
+            except Exception as e:
+                logger.warning(f"Could not create a thumbnail for {final_s3}: {e}")
         return final_s3
 
 def embed_exif_metadata(input_path: str, output_path: str, metadata: Dict[str, Any]):
@@ -558,23 +578,17 @@ def upload_s3_uri(local_path: str, s3_uri: str):
     s3_client = settings.get_s3_client()
     s3_client.upload_file(local_path, bucket, key)
 
-def generate_embeddings(crop_s3_uri: str) -> List[float]:
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        local_file = os.path.join(tmp_dir, "crop.jpg")
-        download_s3_uri(crop_s3_uri, local_file)
-        with Image.open(local_file) as img:
-            img_tensor = preprocess(img).unsqueeze(0).to(device)
-            with torch.no_grad():
-                emb = model.encode_image(img_tensor).cpu().numpy().flatten().tolist()
-    return emb
+def read_s3_bytes(s3_uri: str) -> bytes:
+    parsed = urlparse(s3_uri)
+    response = settings.get_s3_client().get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip("/"))
+    return response["Body"].read()
 
 def query_pinecone_for_top_match(
     embedding: List[float],
     exclude_s3_file_path: Optional[str] = None
 ) -> Optional[Dict[str, Any]]:
-    pinecone_index = settings.get_pinecone_index()
     top_k = 5 if exclude_s3_file_path else 1
-    resp = pinecone_index.query(vector=embedding, top_k=top_k, include_metadata=True)
+    resp = resources.vector_store.query(vector=embedding, top_k=top_k, include_metadata=True)
     matches = resp.get("matches", [])
     if not matches:
         return None
@@ -595,9 +609,8 @@ def query_pinecone_for_exact_match(
     bounding_box: List[float]
 ) -> Optional[Dict[str, Any]]:
     bounding_box_str = ",".join([str(int(round(coord))) for coord in bounding_box])
-    pinecone_index = settings.get_pinecone_index()
-    random_vector = [random.random() for _ in range(768)]
-    resp = pinecone_index.query(
+    random_vector = [random.random() for _ in range(settings.model_dim)]
+    resp = resources.vector_store.query(
         vector=random_vector,
         filter={
             "original_s3_uri": original_s3_uri,
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+
+from api.embedding_service import embedding_service
+from api.executors import inference_executor, io_executor
+from api.resources import resources
+from api.embedding_cache import text_embedding_cache, image_embedding_cache
+from api.metadata_log import metadata_log
+from api.metadata_writes import metadata_writes
+from api.presign import presigned_urls
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Returns runtime metrics for the shared services used by the endpoints.
+    """
+    return {
+        "resources": resources.stats(),
+        "vector_store": resources.vector_store.stats() if resources.is_loaded("vector_store") else None,
+        "inference_executor": inference_executor.stats(),
+        "io_executor": io_executor.stats(),
+        "embedding_service": embedding_service.stats(),
+        "text_embedding_cache": text_embedding_cache.stats(),
+        "image_embedding_cache": image_embedding_cache.stats(),
+        "presigned_urls": presigned_urls.stats(),
+        "metadata_log": metadata_log.stats(),
+        "metadata_writes": metadata_writes.stats(),
+    }
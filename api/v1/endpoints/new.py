@@ -2,12 +2,14 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from typing import Optional, List, Union
 from PIL import Image
 import io
-import torch
-import csv
-import tempfile
 from api.config import settings
-from api.model_loader import model, device, preprocess
-from api import deps
+from api.embedding_cache import aencode_image_bytes_cached
+from api.executors import io_executor
+from api.metadata_log import METADATA_COLUMNS, metadata_log
+from api.metadata_writes import metadata_writes
+from api.resources import resources
+from api.search import DATETIME_TAKEN_TS, THUMBNAIL_S3_URI, datetime_taken_timestamp
+from api.thumbnails import ensure_thumbnail
 from datetime import datetime, timezone
 import uuid
 import os
@@ -20,8 +22,6 @@ import requests
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-index = settings.get_pinecone_index()
-
 router = APIRouter()
 
 @router.post("/new")
@@ -58,7 +58,7 @@ async def add_new_data(
         else:
             logger.info("No UploadFile provided. Using presigned_url...")
             try:
-                r = requests.get(presigned_url)
+                r = await io_executor.run(requests.get, presigned_url)
                 r.raise_for_status()
             except Exception as e:
                 logger.error(f"Failed to fetch image from presigned_url: {e}")
@@ -126,7 +126,7 @@ async def add_new_data(
             "original_s3_uri": original_s3_uri,
             "s3_file_path": s3_file_path,
         }
-        if check_duplicate_in_pinecone(duplicate_metadata):
+        if await io_executor.run(check_duplicate_in_pinecone, duplicate_metadata):
             raise HTTPException(
                 status_code=400, detail="Duplicate entry detected. Entry not added."
             )
@@ -152,11 +152,17 @@ async def add_new_data(
         metadata = {
             key: (value if value is not None else "") for key, value in metadata.items()
         }
-        save_to_pinecone(image_embeddings, metadata)
+        datetime_taken_ts = datetime_taken_timestamp(datetime_taken)
+        if datetime_taken_ts is not None:
+            metadata[DATETIME_TAKEN_TS] = datetime_taken_ts
+        thumbnail_s3_uri = await io_executor.run(ensure_thumbnail, s3_file_path, image_contents)
+        if thumbnail_s3_uri:
+            metadata[THUMBNAIL_S3_URI] = thumbnail_s3_uri
+        await io_executor.run(save_to_pinecone, image_embeddings, metadata)
 
         metadata["status"] = "active"
 
-        append_metadata_to_s3(metadata)
+        await append_metadata_to_s3(metadata)
 
         metadata["presigned_url"] = presigned_url
         metadata["whole_image_presigned_url"] = whole_image_presigned_url
@@ -198,27 +204,68 @@ def extract_metadata_from_user_comment(image_contents: bytes) -> dict:
         return {}
 
 
+def duplicate_criteria(metadata: dict) -> dict:
+    return {
+        key: value
+        for key, value in {
+            "color": metadata.get("color"),
+            "material": metadata.get("material"),
+            "brand": metadata.get("brand"),
+            "shape": metadata.get("shape"),
+            "modifier": metadata.get("modifier"),
+            "original_s3_uri": metadata.get("original_s3_uri"),
+        }.items()
+        if value
+    }
+
+
+def find_duplicate_in_metadata(metadata: dict) -> Optional[dict]:
+    """
+    Look for a live crop duplicating `metadata` in the in-memory metadata
+    table: one stored at the same `s3_file_path`, or one cut from the same
+    `original_s3_uri` with the same labels. Both go through the table's
+    indexes. It includes this process's writes as soon as they are
+    committed, so it also catches a resubmission that the vector store has
+    not made visible yet.
+    """
+    table = metadata_log.table()
+    if metadata.get("s3_file_path"):
+        for row in table.find("s3_file_path", metadata["s3_file_path"]):
+            if is_live(row):
+                return row
+
+    criteria = duplicate_criteria(metadata)
+    if not criteria.get("original_s3_uri"):
+        return None
+    for row in table.find("original_s3_uri", criteria["original_s3_uri"]):
+        if is_live(row) and all(row.get(key) == value for key, value in criteria.items()):
+            return row
+    return None
+
+
+def is_live(row: dict) -> bool:
+    return (row.get("status") or "").strip().lower() != "inactive"
+
+
 def check_duplicate_in_pinecone(metadata: dict) -> bool:
     """
-    Check if a duplicate entry exists in Pinecone by using metadata as a filter.
+    Check if a duplicate entry exists, first in the metadata table and then in
+    Pinecone by using metadata as a filter. Pinecone also holds crops that
+    were indexed without a metadata row (e.g. by scripts/).
     """
-    logger.info("Checking for duplicates in Pinecone...")
+    filter_criteria = duplicate_criteria(metadata)
     try:
-        filter_criteria = {
-            key: value
-            for key, value in {
-                "color": metadata.get("color"),
-                "material": metadata.get("material"),
-                "brand": metadata.get("brand"),
-                "shape": metadata.get("shape"),
-                "modifier": metadata.get("modifier"),
-                "original_s3_uri": metadata.get("original_s3_uri"),
-            }.items()
-            if value
-        }
+        row = find_duplicate_in_metadata(metadata)
+        if row is not None:
+            logger.info(f"Duplicate entry found in metadata: {row.get('id')}")
+            return True
+    except Exception as e:
+        logger.warning(f"Metadata duplicate check failed, checking Pinecone only: {str(e)}")
 
-        query_response = index.query(
-            vector=[0.0] * 512,
+    logger.info("Checking for duplicates in Pinecone...")
+    try:
+        query_response = resources.vector_store.query(
+            vector=[0.0] * settings.model_dim,
             filter=filter_criteria,
             top_k=1,
             include_metadata=True,
@@ -276,13 +323,11 @@ async def generate_image_embeddings(image_contents: bytes):
         with io.BytesIO(image_contents) as buffer:
             with Image.open(buffer) as img:
                 img.verify()
-                buffer.seek(0)
-                img = Image.open(buffer)
-                processed_image = preprocess(img).unsqueeze(0).to(device)
-        with torch.no_grad():
-            embeddings = model.encode_image(processed_image).cpu().numpy().tolist()[0]
+        embeddings = await aencode_image_bytes_cached(image_contents)
         logger.info("Image embeddings generated successfully.")
         return embeddings
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
@@ -312,7 +357,7 @@ def save_to_pinecone(embeddings, metadata):
                 "metadata": metadata,
             }
         ]
-        index.upsert(vector)
+        resources.vector_store.upsert(vector)
         return embedding_id
 
     except Exception as e:
@@ -322,86 +367,21 @@ def save_to_pinecone(embeddings, metadata):
         )
 
 
-def append_metadata_to_s3(metadata: dict) -> None:
+async def append_metadata_to_s3(metadata: dict) -> None:
     """
-    Append the metadata to a CSV file in S3, including the embedding ID.
+    Append the metadata, including the embedding ID, to the metadata log in S3.
+    Waits for the group commit that stores it.
     """
-    s3_client = settings.get_s3_client()
-    bucket_name = settings.s3_bucket_name
-    csv_key = "universal-db/metadata.csv"
+    row = {column: metadata.get(column, "") for column in METADATA_COLUMNS if column != "id"}
+    row["id"] = metadata.get("embedding_id", "")
 
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=csv_key)
-        file_exists = "Contents" in response
-        logger.info(f"File exists in S3: {file_exists}")
-
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file_name = temp_file.name
-
-            # If file exists, download it; otherwise, create it with headers
-            if file_exists:
-                logger.info(f"Downloading existing CSV from S3: {csv_key}")
-                s3_client.download_file(bucket_name, csv_key, temp_file_name)
-                logger.info("Existing CSV downloaded successfully.")
-            else:
-                logger.warning("CSV does not exist. Creating a new one with headers.")
-                with open(temp_file_name, "w", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(
-                        [
-                            "id",
-                            "color",
-                            "material",
-                            "brand",
-                            "shape",
-                            "original_s3_uri",
-                            "s3_file_path",
-                            "coordinates",
-                            "timestamp",
-                            "robot",
-                            "datetime_taken",
-                            "comment",
-                            "labeler_name",
-                            "modifier",
-                            "status",
-                            "pick_point",
-                        ]
-                    )
-
-            with open(temp_file_name, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        metadata.get("embedding_id", ""),
-                        metadata.get("color", ""),
-                        metadata.get("material", ""),
-                        metadata.get("brand", ""),
-                        metadata.get("shape", ""),
-                        metadata.get("original_s3_uri", ""),
-                        metadata.get("s3_file_path", ""),
-                        metadata.get("coordinates", ""),
-                        metadata.get("timestamp", ""),
-                        metadata.get("robot", ""),
-                        metadata.get("datetime_taken", ""),
-                        metadata.get("comment", ""),
-                        metadata.get("labeler_name", ""),
-                        metadata.get("modifier", ""),
-                        metadata.get("status", ""),
-                        metadata.get("pick_point", ""),
-                    ]
-                )
-                logger.info("Appended new metadata row (including labeler_name).")
-
-            logger.info(
-                f"Uploading updated CSV back to S3: bucket={bucket_name}, key={csv_key}"
-            )
-            s3_client.upload_file(temp_file_name, bucket_name, csv_key)
-            logger.info("Updated CSV uploaded to S3 successfully.")
-
+        segment_key = await metadata_writes.ainsert(row)
+        logger.info(f"Appended new metadata row to {segment_key}.")
     except Exception as e:
-        logger.error(f"Error updating CSV in S3: {str(e)}")
+        logger.error(f"Error writing metadata to S3: {str(e)}")
         raise HTTPException(
-            status_code=500, detail=f"Error updating CSV in S3: {str(e)}"
+            status_code=500, detail=f"Error writing metadata to S3: {str(e)}"
         )
 
 
@@ -1,64 +1,50 @@
+import asyncio
 import os
-import uuid
+import threading
 import json
-import tempfile
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
 from urllib.parse import urlparse
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
 from PIL import Image
-import torch
 
 from api.config import settings
-from api.model_loader import preprocess, model, da_model
+from api.executors import inference_executor, io_executor
+from api.preprocessing import decode_image
+from api.resources import resources
+from api.embedding_service import embedding_service
 import piexif
 import piexif.helper
 import boto3
 import logging
 
 router = APIRouter()
-pinecone_index = settings.get_pinecone_index()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# The ultralytics predictor keeps per-call state on the model, so two
+# inference threads must not run predict() on the shared model at once
+_detect_lock = threading.Lock()
 
 # --------------------------------------
 # Helper functions
 # --------------------------------------
 
-def download_s3_uri(s3_uri: str, local_path: str):
-    parsed = urlparse(s3_uri)
-    bucket = parsed.netloc
-    key = parsed.path.lstrip("/")
-    s3_client = settings.get_s3_client()
-    s3_client.download_file(bucket, key, local_path)
-
-def generate_embeddings_from_image(image: Image.Image) -> List[float]:
+async def generate_embeddings_from_images(images: List[Image.Image]) -> List[List[float]]:
     """
-    Use the CLIP model to generate an embedding from a Pillow Image object.
+    Preprocess all images into one tensor and encode them in a single batched forward pass.
     """
-    img_tensor = preprocess(image).unsqueeze(0)
-    if not torch.cuda.is_available():
-        model.to("cpu")
-        img_tensor = img_tensor.to("cpu")
-    else:
-        img_tensor = img_tensor.to(device)
-
-    with torch.no_grad():
-        emb = model.encode_image(img_tensor).cpu().numpy().flatten().tolist()
-    
-    return emb
+    if not images:
+        return []
+    return await embedding_service.aencode_images(images)
 
 def query_pinecone(embedding: List[float], top_k: int = 1) -> Optional[Dict[str, Any]]:
     """
     Queries Pinecone and returns the top match (with metadata).
     Returns None if no matches found.
     """
-    if not pinecone_index:
-        return None
-
-    resp = pinecone_index.query(
+    resp = resources.vector_store.query(
         vector=embedding,
         top_k=top_k,
         include_metadata=True
@@ -71,23 +57,35 @@ def query_pinecone(embedding: List[float], top_k: int = 1) -> Optional[Dict[str,
 
 def load_image_from_s3(s3_uri: str) -> Image.Image:
     """
-    Download from S3 into a temp file, load as PIL.Image
+    Read the object from S3 and decode it in memory as PIL.Image
     """
-    tmp_dir = tempfile.mkdtemp()
-    filename = f"temp_{uuid.uuid4().hex}.jpg"
-    local_path = os.path.join(tmp_dir, filename)
-    download_s3_uri(s3_uri, local_path)
-    return Image.open(local_path).convert("RGB")
+    parsed = urlparse(s3_uri)
+    response = settings.get_s3_client().get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip("/"))
+    return decode_image(response["Body"].read())
 
 def load_image_from_upload(image_file: UploadFile) -> Image.Image:
     """
-    Save the uploaded file locally, load as PIL.Image
+    Decode the uploaded file in memory as PIL.Image
     """
-    tmp_dir = tempfile.mkdtemp()
-    local_path = os.path.join(tmp_dir, image_file.filename)
-    with open(local_path, "wb") as f:
-        f.write(image_file.file.read())
-    return Image.open(local_path).convert("RGB")
+    return decode_image(image_file.file.read())
+
+def detect_and_crop(image: Image.Image):
+    """
+    Run YOLO on the image and crop every detected box, so all crops can go
+    through CLIP in one batch. Returns ([(box, confidence)], [crop]).
+    """
+    detect_model = resources.detect_model
+    with _detect_lock:
+        results = detect_model.predict(image)
+    boxes = []
+    crops = []
+    for result in results:
+        # result.boxes.data => [x1, y1, x2, y2, conf, cls_id]
+        for box_item in result.boxes.data.tolist():
+            x1, y1, x2, y2, confidence, _ = box_item
+            boxes.append(([x1, y1, x2, y2], float(confidence)))
+            crops.append(image.crop((x1, y1, x2, y2)))
+    return boxes, crops
 
 
 # ---------------------------------------------------------------------
@@ -110,7 +108,7 @@ async def detect_infer_metadata(
         # Expect a query param: ?s3_uri=...
         if not s3_uri:
             raise HTTPException(status_code=400, detail="Missing s3_uri in query params.")
-        image = load_image_from_s3(s3_uri)
+        image = await io_executor.run(load_image_from_s3, s3_uri)
 
     else:
         # POST => either an uploaded file or a form-based s3_uri
@@ -122,46 +120,42 @@ async def detect_infer_metadata(
 
         # If we have an uploaded file, use that
         if image_file and image_file.filename:
-            image = load_image_from_upload(image_file)
+            image = await io_executor.run(load_image_from_upload, image_file)
         elif s3_uri:
-            image = load_image_from_s3(s3_uri)
+            image = await io_executor.run(load_image_from_s3, s3_uri)
         else:
             raise HTTPException(status_code=400, detail="You must provide image_file or s3_uri in POST.")
 
     width, height = image.size
-    results = da_model.predict(image)
-    detections_response = []
+    boxes, crops = await inference_executor.run(detect_and_crop, image)
 
-    # Loop over each Results object
-    for result in results:
-        # result.boxes.data => [x1, y1, x2, y2, conf, cls_id]
-        for box_item in result.boxes.data.tolist():
-            x1, y1, x2, y2, confidence, _ = box_item
+    embeddings = await generate_embeddings_from_images(crops)
 
-            # Crop & embed for Pinecone
-            cropped = image.crop((x1, y1, x2, y2))
-            embedding = generate_embeddings_from_image(cropped)
-
-            # Query Pinecone
-            top_match = query_pinecone(embedding, top_k=1)
-            matched_metadata = {}
-            matched_score = None
-            if top_match:
-                matched_score = top_match["score"]
-                metadata = top_match.get("metadata", {})
-                matched_metadata = {
-                    "color": metadata.get("color"),
-                    "shape": metadata.get("shape"),
-                    "material": metadata.get("material"),
-                    "brand": metadata.get("brand"),
-                }
-
-            detections_response.append({
-                "box": [x1, y1, x2, y2],
-                "confidence": float(confidence),
-                "pinecone_score": matched_score,
-                "pinecone_metadata": matched_metadata
-            })
+    # Query Pinecone for all crops concurrently
+    top_matches = await asyncio.gather(
+        *[io_executor.run(query_pinecone, embedding, 1) for embedding in embeddings]
+    )
+
+    detections_response = []
+    for (box, confidence), top_match in zip(boxes, top_matches):
+        matched_metadata = {}
+        matched_score = None
+        if top_match:
+            matched_score = top_match["score"]
+            metadata = top_match.get("metadata", {})
+            matched_metadata = {
+                "color": metadata.get("color"),
+                "shape": metadata.get("shape"),
+                "material": metadata.get("material"),
+                "brand": metadata.get("brand"),
+            }
+
+        detections_response.append({
+            "box": box,
+            "confidence": confidence,
+            "pinecone_score": matched_score,
+            "pinecone_metadata": matched_metadata
+        })
 
     return {
         "status": "ok",
@@ -1,76 +1,48 @@
-import torch
-import clip
+from typing import List, Optional
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from api.config import settings
-from api import deps
-from api.model_loader import model, device
+from api.executors import io_executor
+from api.resources import resources
+from api.embedding_cache import aencode_text_cached
+from api.search import SearchFilters, build_filter, format_results, result_fields
 
 router = APIRouter()
 
 
 class TextQuery(BaseModel):
     query: str
+    filters: Optional[SearchFilters] = None
+    # Also return full-size crop URLs, not just thumbnails
+    full_size: bool = False
+    # Only return these result fields (see api.search.RESULT_FIELDS)
+    fields: Optional[List[str]] = None
+    # Only return ids and scores
+    ids_only: bool = False
 
 
-@router.post("/search/text")
+@router.post("/search/text", response_class=ORJSONResponse)
 async def query_text(query: TextQuery):
     try:
         if not query.query:
             raise HTTPException(
                 status_code=400, detail="The query text cannot be empty"
             )
+        fields = result_fields(query.fields, query.full_size)
 
-        with torch.no_grad():
-            text_tokens = clip.tokenize([query.query]).to(device)
-            text_embedding = (
-                model.encode_text(text_tokens).cpu().numpy().flatten().tolist()
-            )
+        text_embedding = await aencode_text_cached(query.query)
 
-        query_response = deps.index.query(
-            vector=text_embedding, top_k=settings.k, include_metadata=True
+        query_response = await io_executor.run(
+            resources.vector_store.query,
+            vector=text_embedding, top_k=settings.k, filter=build_filter(query.filters),
+            include_metadata=not query.ids_only
         )
 
-        matches = query_response["matches"]
-        results = []
-
-        for match in matches:
-            metadata = match["metadata"]
-            s3_file_path = metadata.get("s3_file_path")
-            s3_file_name = metadata.get("s3_file_name")
-
-            results.append(
-                {
-                    "score": match["score"],
-                    "metadata": {
-                        "class": metadata.get("class"),
-                        "date_added": metadata.get("date_added"),
-                        "file_type": metadata.get("file_type"),
-                        "s3_file_name": s3_file_name,
-                        "s3_file_path": s3_file_path,
-                        "s3_presigned_url": settings.generate_presigned_url(
-                            s3_file_path
-                        ),
-                        "brand": metadata.get("brand"),
-                        "modifier": metadata.get("modifier"),
-                        "pick_point": metadata.get("pick_point"),
-                        "color": metadata.get("color"),
-                        "coordinates": metadata.get("coordinates"),
-                        "datetime_taken": metadata.get("datetime_taken"),
-                        "embedding_id": metadata.get("embedding_id"),
-                        "material": metadata.get("material"),
-                        "original_s3_uri": metadata.get("original_s3_uri"),
-                        "robot": metadata.get("robot"),
-                        "shape": metadata.get("shape"),
-                        "comment": metadata.get("comment"),
-                        "labeler_name": metadata.get("labeler_name"),
-                        "timestamp": metadata.get("timestamp"),
-                        "whole_image_presigned_url": settings.generate_presigned_url(
-                            metadata.get("original_s3_uri")
-                        ),
-                    },
-                }
-            )
-        return {"results": results}
+        return ORJSONResponse({"results": format_results(query_response, fields, query.ids_only)})
+    except HTTPException:
+        # Keeps 503s from saturated executors (and our own 400s) as they are
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,15 +1,19 @@
 from fastapi import APIRouter, HTTPException, Form
 from typing import Optional, Union, List
 import logging
-import tempfile
-import csv
 
 from api.config import settings
+from api.executors import io_executor
+from api.metadata_writes import metadata_writes
+from api.resources import resources
+from api.search import DATETIME_TAKEN_TS, THUMBNAIL_S3_URI, datetime_taken_timestamp
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 router = APIRouter()
-index = settings.get_pinecone_index()
+
+# Metadata log columns an edit can change
+UPDATED_COLUMNS = ("color", "material", "brand", "shape", "comment", "modifier", "pick_point", "status", "labeler_name")
 
 @router.put("/update/{embedding_id}")
 async def update_metadata(
@@ -28,7 +32,7 @@ async def update_metadata(
     including multiple pick points of the form "x1,y1;x2,y2".
     """
     try:
-        current_metadata, current_vector = await fetch_metadata_from_pinecone(embedding_id)
+        current_metadata, current_vector = await io_executor.run(fetch_metadata_from_pinecone, embedding_id)
         if not current_metadata:
             raise HTTPException(status_code=404, detail="Metadata not found.")
 
@@ -56,8 +60,15 @@ async def update_metadata(
             "embedding_id": embedding_id,
             "pick_point": formatted_points,
         }
+        datetime_taken_ts = current_metadata.get(DATETIME_TAKEN_TS)
+        if datetime_taken_ts is None:
+            datetime_taken_ts = datetime_taken_timestamp(current_metadata["datetime_taken"])
+        if datetime_taken_ts is not None:
+            updated_metadata[DATETIME_TAKEN_TS] = datetime_taken_ts
+        if current_metadata.get(THUMBNAIL_S3_URI):
+            updated_metadata[THUMBNAIL_S3_URI] = current_metadata[THUMBNAIL_S3_URI]
 
-        await update_pinecone(embedding_id, updated_metadata, current_vector)
+        await io_executor.run(update_pinecone, embedding_id, updated_metadata, current_vector)
 
         updated_metadata["status"] = "active"
         await update_csv_in_s3(updated_metadata)
@@ -76,10 +87,23 @@ async def update_metadata(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-async def fetch_metadata_from_pinecone(embedding_id: str) -> dict:
+@router.get("/update/{embedding_id}/image")
+async def full_size_image(embedding_id: str):
+    """
+    Presigned URL of the full-size crop, for the edit modal's pick-point
+    editor; search results carry only the thumbnail by default.
+    """
+    current_metadata, _ = await io_executor.run(fetch_metadata_from_pinecone, embedding_id)
+    s3_file_path = current_metadata.get("s3_file_path")
+    if not s3_file_path:
+        raise HTTPException(status_code=404, detail="The crop has no s3_file_path.")
+    return {"s3_presigned_url": await io_executor.run(settings.generate_presigned_url, s3_file_path)}
+
+
+def fetch_metadata_from_pinecone(embedding_id: str) -> dict:
     """Fetch metadata from Pinecone using the embedding ID."""
     try:
-        current_metadata_response = index.fetch([embedding_id])
+        current_metadata_response = resources.vector_store.fetch([embedding_id])
         vectors = current_metadata_response.get("vectors", {})
         if embedding_id not in vectors:
             raise HTTPException(status_code=404, detail="Metadata not found.")
@@ -88,6 +112,8 @@ async def fetch_metadata_from_pinecone(embedding_id: str) -> dict:
         current_metadata = vectors[embedding_id]["metadata"]
         return current_metadata, current_vector
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching metadata from Pinecone: {str(e)}")
         raise HTTPException(
@@ -95,7 +121,7 @@ async def fetch_metadata_from_pinecone(embedding_id: str) -> dict:
         )
 
 
-async def update_pinecone(embedding_id: str, updated_metadata: dict, current_vector: list):
+def update_pinecone(embedding_id: str, updated_metadata: dict, current_vector: list):
     """Update the existing entry in Pinecone with new metadata."""
     try:
         vector = [
@@ -105,7 +131,7 @@ async def update_pinecone(embedding_id: str, updated_metadata: dict, current_vec
                 "metadata": updated_metadata,
             }
         ]
-        index.upsert(vector)
+        resources.vector_store.upsert(vector)
     except Exception as e:
         logger.error(f"Error updating Pinecone: {str(e)}")
         raise HTTPException(
@@ -115,69 +141,19 @@ async def update_pinecone(embedding_id: str, updated_metadata: dict, current_vec
 
 async def update_csv_in_s3(updated_metadata: dict):
     """
-    Update the CSV file in S3 with the new metadata row.
-    Ensures labeler_name is in the CSV headers and updated row.
+    Append the edited fields of the row to the metadata log in S3. Waits for
+    the group commit that stores them.
     """
-    logger.info("Updating CSV in S3...")
-    s3_client = settings.get_s3_client()
-    bucket_name = settings.s3_bucket_name
-    csv_key = "universal-db/metadata.csv"
+    logger.info("Updating metadata in S3...")
+    fields = {name: updated_metadata.get(name, "") for name in UPDATED_COLUMNS}
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file_name = temp_file.name
-            response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=csv_key)
-            file_exists = "Contents" in response
-
-            if not file_exists:
-                logger.warning("CSV does not exist in S3; cannot update a non-existent file.")
-                return
-
-            logger.info(f"Downloading existing CSV from S3: {csv_key}")
-            s3_client.download_file(bucket_name, csv_key, temp_file_name)
-            logger.info("CSV downloaded successfully.")
-
-            updated_rows = []
-            with open(temp_file_name, mode="r", newline="") as f:
-                reader = csv.DictReader(f)
-                if "id" not in reader.fieldnames:
-                    raise ValueError("CSV file missing required 'id' column in headers.")
-
-                # Ensure labeler_name column is in the headers
-                fieldnames = list(reader.fieldnames)
-                if "labeler_name" not in fieldnames:
-                    fieldnames.insert(fieldnames.index("comment") + 1, "labeler_name")
-
-                for row in reader:
-                    if row.get("id") == updated_metadata["embedding_id"]:
-                        # Update fields
-                        row["color"] = updated_metadata.get("color", row.get("color", ""))
-                        row["material"] = updated_metadata.get("material", row.get("material", ""))
-                        row["brand"] = updated_metadata.get("brand", row.get("brand", ""))
-                        row["shape"] = updated_metadata.get("shape", row.get("shape", ""))
-                        row["comment"] = updated_metadata.get("comment", row.get("comment", ""))
-                        row["modifier"] = updated_metadata.get("modifier", row.get("modifier", ""))
-                        row["pick_point"] = updated_metadata.get("pick_point", row.get("pick_point", ""))
-                        row["status"] = updated_metadata.get("status", row.get("status", ""))
-                        row["labeler_name"] = updated_metadata.get("labeler_name", row.get("labeler_name", ""))
-                    updated_rows.append(row)
-
-            with open(temp_file_name, mode="w", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(updated_rows)
-
-            logger.info(f"Uploading updated CSV back to S3: {csv_key}")
-            s3_client.upload_file(temp_file_name, bucket_name, csv_key)
-            logger.info("Updated CSV uploaded to S3 successfully.")
-
-    except ValueError as ve:
-        logger.error(f"ValueError: {str(ve)}")
-        raise HTTPException(status_code=400, detail=f"ValueError: {str(ve)}")
+        segment_key = await metadata_writes.aupdate(updated_metadata["embedding_id"], fields)
+        logger.info(f"Metadata update appended to {segment_key}.")
     except Exception as e:
-        logger.error(f"Error updating CSV in S3: {str(e)}")
+        logger.error(f"Error updating metadata in S3: {str(e)}")
         raise HTTPException(
-            status_code=500, detail=f"Error updating CSV in S3: {str(e)}"
+            status_code=500, detail=f"Error updating metadata in S3: {str(e)}"
         )
 
 
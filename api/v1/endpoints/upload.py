@@ -1,5 +1,6 @@
 from fastapi import APIRouter, UploadFile, HTTPException, Form
 from api.config import settings
+from api.executors import io_executor
 from PIL import Image
 import piexif
 import io
@@ -79,7 +80,7 @@ async def upload_image(file: UploadFile, metadata_key: str = Form("s3_file_path"
             )
 
         logger.info(f"Generating presigned URL for metadata value: {metadata_value}")
-        presigned_url = settings.generate_presigned_url(metadata_value)
+        presigned_url = await io_executor.run(settings.generate_presigned_url, metadata_value)
 
         if not presigned_url:
             logger.error("Failed to generate presigned URL.")
@@ -90,6 +91,8 @@ async def upload_image(file: UploadFile, metadata_key: str = Form("s3_file_path"
         logger.info(f"Presigned URL generated: {presigned_url}")
         return {"presignedUrl": presigned_url}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing upload-image endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,226 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from api.config import settings
+from api.vector_store import LocalVectorStore, VectorStore, build_local_store
+
+logger = logging.getLogger(__name__)
+
+
+class MirroredVectorStore(VectorStore):
+    """
+    Pinecone index with an in-memory mirror that answers top-k queries.
+
+    The mirror is bootstrapped from the snapshot at `snapshot_path`, kept
+    current by writing this process's upserts and deletes through to it, and
+    rebuilt from Pinecone by a background reconcile every
+    `VECTOR_MIRROR_RECONCILE_SECONDS` (which also picks up writes made by
+    other workers and scripts). Queries go to Pinecone instead whenever the
+    mirror was last synced more than `VECTOR_MIRROR_MAX_STALENESS_SECONDS`
+    ago. Fetches always read from Pinecone, since update/delete rely on them.
+    """
+
+    def __init__(
+        self,
+        primary: VectorStore,
+        snapshot_path: str = "",
+        reconcile_seconds: float = None,
+        max_staleness_seconds: float = None,
+    ):
+        self.primary = primary
+        self.name = f"{primary.name}+mirror"
+        self.snapshot_path = snapshot_path
+        self.reconcile_seconds = reconcile_seconds or settings.vector_mirror_reconcile_seconds
+        self.max_staleness = max_staleness_seconds or settings.vector_mirror_max_staleness_seconds
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._synced_at: Optional[float] = None
+        # Writes made while a reconcile is running, replayed onto its result
+        self._pending_writes: Optional[list] = None
+
+        # Metrics
+        self._local_queries = 0
+        self._fallback_queries = 0
+        self._local_seconds = 0.0
+        self._fallback_seconds = 0.0
+        self._reconciles = 0
+        self._reconcile_errors = 0
+        self._last_reconcile = {}
+
+        self.mirror = build_local_store()
+        self._load_snapshot()
+        self._thread = threading.Thread(target=self._run, name="vector-mirror", daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------------------
+    # VectorStore
+    # -----------------------------------------------------------------
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, include_values=False):
+        started = time.monotonic()
+        if self.is_fresh():
+            try:
+                response = self.mirror.query(vector, top_k, filter, include_metadata, include_values)
+                with self._lock:
+                    self._local_queries += 1
+                    self._local_seconds += time.monotonic() - started
+                return response
+            except ValueError as e:
+                logger.warning(f"Mirror query failed ({e}); querying {self.primary.name}")
+
+        response = self.primary.query(vector, top_k, filter, include_metadata, include_values)
+        with self._lock:
+            self._fallback_queries += 1
+            self._fallback_seconds += time.monotonic() - started
+        return response
+
+    def fetch(self, ids):
+        return self.primary.fetch(ids)
+
+    def upsert(self, vectors):
+        vectors = list(vectors)
+        count = self.primary.upsert(vectors)
+        self._write_through("upsert", vectors)
+        return count
+
+    def delete(self, ids=None, filter=None, delete_all=False):
+        response = self.primary.delete(ids=ids, filter=filter, delete_all=delete_all)
+        self._write_through("delete", {"ids": ids, "filter": filter, "delete_all": delete_all})
+        return response
+
+    def describe_index_stats(self):
+        return self.primary.describe_index_stats()
+
+    def list_ids(self, batch_size=100):
+        return self.primary.list_ids(batch_size)
+
+    def stats(self):
+        with self._lock:
+            local, fallback = self._local_queries, self._fallback_queries
+            return {
+                "backend": self.name,
+                "mirror_vectors": self.mirror.stats()["vectors"],
+                "fresh": self.is_fresh(),
+                "synced_age_seconds": (time.time() - self._synced_at) if self._synced_at else None,
+                "local_queries": local,
+                "fallback_queries": fallback,
+                "avg_local_ms": (self._local_seconds / local * 1000.0) if local else 0.0,
+                "avg_fallback_ms": (self._fallback_seconds / fallback * 1000.0) if fallback else 0.0,
+                "reconciles": self._reconciles,
+                "reconcile_errors": self._reconcile_errors,
+                "last_reconcile": dict(self._last_reconcile),
+                "primary": self.primary.stats(),
+            }
+
+    def close(self):
+        self._stopped.set()
+        if self.snapshot_path and self._synced_at is not None:
+            self.mirror.save(self.snapshot_path)
+
+    # -----------------------------------------------------------------
+    # Sync
+    # -----------------------------------------------------------------
+
+    def is_fresh(self) -> bool:
+        return self._synced_at is not None and time.time() - self._synced_at <= self.max_staleness
+
+    def reconcile(self):
+        """
+        Rebuild the mirror from the primary index and swap it in. Writes that
+        land while the copy is running are replayed onto the new mirror.
+        """
+        started = time.monotonic()
+        synced_at = time.time()
+        with self._lock:
+            self._pending_writes = []
+
+        try:
+            fresh = build_local_store()
+            for ids in self.primary.list_ids():
+                vectors = self.primary.fetch(ids)["vectors"]
+                fresh.upsert([
+                    {"id": vector_id, "values": vector["values"], "metadata": vector.get("metadata", {})}
+                    for vector_id, vector in vectors.items()
+                ])
+        except Exception as e:
+            with self._lock:
+                self._pending_writes = None
+                self._reconcile_errors += 1
+            logger.error(f"Vector mirror reconcile failed: {str(e)}")
+            return
+
+        with self._lock:
+            pending, self._pending_writes = self._pending_writes, None
+            try:
+                for operation, payload in pending:
+                    self._apply(fresh, operation, payload)
+            except Exception as e:
+                self._reconcile_errors += 1
+                logger.error(f"Vector mirror reconcile could not replay concurrent writes ({e}); keeping the current mirror")
+                return
+            old_ids = _all_ids(self.mirror)
+            new_ids = _all_ids(fresh)
+            self.mirror = fresh
+            self._synced_at = synced_at
+            self._reconciles += 1
+            self._last_reconcile = {
+                "seconds": time.monotonic() - started,
+                "vectors": len(new_ids),
+                "added": len(new_ids - old_ids),
+                "removed": len(old_ids - new_ids),
+            }
+        logger.info(f"Vector mirror reconciled: {self._last_reconcile}")
+
+        if self.snapshot_path:
+            fresh.save(self.snapshot_path)
+
+    def _load_snapshot(self):
+        snapshot = os.path.join(self.snapshot_path, "vectors.npz") if self.snapshot_path else ""
+        if not snapshot or not os.path.exists(snapshot):
+            logger.info("No vector mirror snapshot; queries use the primary index until the first reconcile")
+            return
+        try:
+            self.mirror.load(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load vector mirror snapshot {self.snapshot_path}: {str(e)}")
+            return
+        # The snapshot is as fresh as the time it was written
+        self._synced_at = os.path.getmtime(snapshot)
+
+    def _write_through(self, operation: str, payload):
+        with self._lock:
+            if self._pending_writes is not None:
+                self._pending_writes.append((operation, payload))
+            try:
+                self._apply(self.mirror, operation, payload)
+            except Exception as e:
+                # The primary has the write but the mirror doesn't; stop serving from it
+                logger.error(f"Vector mirror write-through failed ({e}); marking the mirror stale")
+                self._synced_at = None
+
+    @staticmethod
+    def _apply(store: LocalVectorStore, operation: str, payload):
+        if operation == "upsert":
+            store.upsert(payload)
+        else:
+            store.delete(**payload)
+
+    def _run(self):
+        # Catch up on writes made since the snapshot right away
+        while not self._stopped.is_set():
+            try:
+                self.reconcile()
+            except Exception as e:
+                # Keep the loop alive; the next round starts from scratch
+                with self._lock:
+                    self._reconcile_errors += 1
+                logger.error(f"Vector mirror reconcile failed: {str(e)}")
+            self._stopped.wait(self.reconcile_seconds)
+
+
+def _all_ids(store: LocalVectorStore) -> set:
+    return {vector_id for ids in store.list_ids(1000) for vector_id in ids}
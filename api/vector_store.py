@@ -0,0 +1,561 @@
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from numbers import Number
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from api.config import settings
+from api.connection_pool import pinecone_pool_manager, pool_stats
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("pinecone", "local")
+METRICS = ("cosine", "dotproduct", "euclidean")
+
+_MISSING = object()
+
+
+class VectorStore(ABC):
+    """
+    Interface shared by the vector store backends. Responses are plain dicts
+    shaped like Pinecone's:
+
+        query  -> {"matches": [{"id", "score", "metadata"?, "values"?}, ...]}
+        fetch  -> {"vectors": {id: {"id", "values", "metadata"}}}
+        describe_index_stats -> {"dimension", "total_vector_count", ...}
+
+    Filters use Pinecone's metadata filter language ($eq, $ne, $gt, $gte,
+    $lt, $lte, $in, $nin, $exists, $and, $or).
+    """
+
+    name = ""
+
+    @abstractmethod
+    def query(
+        self,
+        vector: List[float],
+        top_k: int,
+        filter: Optional[dict] = None,
+        include_metadata: bool = True,
+        include_values: bool = False,
+    ) -> dict:
+        ...
+
+    @abstractmethod
+    def fetch(self, ids: List[str]) -> dict:
+        ...
+
+    @abstractmethod
+    def upsert(self, vectors: List[dict]) -> int:
+        """
+        Insert or replace vectors given as {"id", "values", "metadata"} dicts.
+        """
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None, delete_all: bool = False):
+        ...
+
+    @abstractmethod
+    def describe_index_stats(self) -> dict:
+        ...
+
+    @abstractmethod
+    def list_ids(self, batch_size: int = 100) -> Iterable[List[str]]:
+        """
+        Yield every vector id, in batches.
+        """
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def close(self):
+        pass
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    The hosted Pinecone index. Every call carries a (connect, read) timeout.
+    """
+
+    name = "pinecone"
+
+    def __init__(self, index, request_timeout=None):
+        self.index = index
+        self.request_timeout = request_timeout or (settings.pinecone_connect_timeout, settings.pinecone_read_timeout)
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, include_values=False):
+        kwargs = {"filter": filter} if filter else {}
+        response = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            include_values=include_values,
+            _request_timeout=self.request_timeout,
+            **kwargs,
+        )
+        return response.to_dict()
+
+    def fetch(self, ids):
+        return self.index.fetch(ids=list(ids), _request_timeout=self.request_timeout).to_dict()
+
+    def upsert(self, vectors):
+        response = self.index.upsert(vectors=vectors, _request_timeout=self.request_timeout)
+        return response.upserted_count
+
+    def delete(self, ids=None, filter=None, delete_all=False):
+        if delete_all:
+            return self.index.delete(delete_all=True, _request_timeout=self.request_timeout)
+        if filter:
+            return self.index.delete(filter=filter, _request_timeout=self.request_timeout)
+        return self.index.delete(ids=list(ids or []), _request_timeout=self.request_timeout)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats(_request_timeout=self.request_timeout).to_dict()
+
+    def list_ids(self, batch_size=100):
+        # Only serverless indexes support listing ids
+        yield from self.index.list(limit=batch_size)
+
+    def stats(self):
+        return {"backend": self.name, "connection_pool": pool_stats(pinecone_pool_manager(self.index))}
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for offline runs and load tests.
+
+    Vectors live in a float32 matrix; queries are an exact NumPy scan until
+    the store holds `ann_threshold` vectors, after which an HNSW graph
+    (hnswlib, optional dependency) answers unfiltered and broadly filtered
+    queries. Metadata filters are evaluated in Python with Pinecone's
+    semantics. With `path` set, the store is loaded from and saved to a
+    snapshot directory.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        dimension: int,
+        metric: str = "cosine",
+        path: str = "",
+        ann_threshold: int = 20000,
+        hnsw_m: int = 16,
+        hnsw_ef_construction: int = 200,
+        hnsw_ef_search: int = 64,
+    ):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown vector store metric: {metric}")
+        self.dimension = dimension
+        self.metric = metric
+        self.path = path
+        self.ann_threshold = ann_threshold
+        self.hnsw_params = (hnsw_m, hnsw_ef_construction, hnsw_ef_search)
+
+        self._lock = threading.RLock()
+        self._count = 0
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._ids: List[str] = []
+        self._metadata: List[dict] = []
+        self._rows: Dict[str, int] = {}
+        self._ann: Optional[_HnswIndex] = None
+        self._ann_unavailable = False
+
+        if path and os.path.exists(os.path.join(path, "vectors.npz")):
+            self.load(path)
+
+    # -----------------------------------------------------------------
+    # VectorStore
+    # -----------------------------------------------------------------
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, include_values=False):
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError(f"Query vector dimension {query.shape[-1]} does not match the index dimension {self.dimension}")
+
+        with self._lock:
+            allowed = None
+            if filter:
+                allowed = np.fromiter(
+                    (matches_filter(metadata, filter) for metadata in self._metadata),
+                    dtype=bool,
+                    count=self._count,
+                )
+
+            rows, scores = None, None
+            if self._ann is not None and (allowed is None or allowed.sum() >= self.ann_threshold):
+                rows, scores = self._ann_search(query, top_k, allowed)
+            if rows is None:
+                rows, scores = self._exact_search(query, top_k, allowed)
+
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {"id": self._ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[row])
+                if include_values:
+                    match["values"] = self._vectors[row].tolist()
+                matches.append(match)
+        return {"matches": matches, "namespace": ""}
+
+    def fetch(self, ids):
+        vectors = {}
+        with self._lock:
+            for vector_id in ids:
+                row = self._rows.get(vector_id)
+                if row is not None:
+                    vectors[vector_id] = {
+                        "id": vector_id,
+                        "values": self._vectors[row].tolist(),
+                        "metadata": dict(self._metadata[row]),
+                    }
+        return {"vectors": vectors, "namespace": ""}
+
+    def upsert(self, vectors):
+        vectors = list(vectors)
+        if not vectors:
+            return 0
+        values = np.asarray([vector["values"] for vector in vectors], dtype=np.float32)
+        if values.ndim != 2 or values.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension does not match the index dimension {self.dimension}")
+
+        with self._lock:
+            self._reserve(self._count + len(vectors))
+            rows = []
+            for vector, vector_values in zip(vectors, values):
+                vector_id = str(vector["id"])
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append({})
+                self._vectors[row] = vector_values
+                self._metadata[row] = dict(vector.get("metadata") or {})
+                rows.append(row)
+            self._norms[rows] = np.linalg.norm(self._vectors[rows], axis=1)
+
+            if self._ann is not None:
+                self._ann.add([self._ids[row] for row in rows], self._vectors[rows])
+            else:
+                self._maybe_build_ann()
+        return len(vectors)
+
+    def delete(self, ids=None, filter=None, delete_all=False):
+        with self._lock:
+            if delete_all:
+                ids = list(self._ids)
+            elif filter:
+                ids = [
+                    vector_id for vector_id, metadata in zip(self._ids, self._metadata)
+                    if matches_filter(metadata, filter)
+                ]
+            elif isinstance(ids, str):
+                ids = [ids]
+
+            for vector_id in ids or []:
+                row = self._rows.pop(vector_id, None)
+                if row is None:
+                    continue
+                # Move the last row into the freed slot
+                last = self._count - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    self._vectors[row] = self._vectors[last]
+                    self._norms[row] = self._norms[last]
+                    self._ids[row] = moved_id
+                    self._metadata[row] = self._metadata[last]
+                    self._rows[moved_id] = row
+                self._ids.pop()
+                self._metadata.pop()
+                self._count -= 1
+                if self._ann is not None:
+                    self._ann.remove(vector_id)
+        return {}
+
+    def describe_index_stats(self):
+        with self._lock:
+            return {
+                "dimension": self.dimension,
+                "metric": self.metric,
+                "total_vector_count": self._count,
+                "namespaces": {"": {"vector_count": self._count}},
+                "ann": self._ann is not None,
+            }
+
+    def list_ids(self, batch_size=100):
+        with self._lock:
+            ids = list(self._ids)
+        for start in range(0, len(ids), batch_size):
+            yield ids[start:start + batch_size]
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "vectors": self._count, "ann": self._ann is not None}
+
+    def close(self):
+        if self.path:
+            self.save(self.path)
+
+    # -----------------------------------------------------------------
+    # Snapshots
+    # -----------------------------------------------------------------
+
+    def save(self, path: str):
+        """
+        Write the vectors and metadata to `path` (a directory), atomically.
+        """
+        started = time.monotonic()
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            ids = np.asarray(self._ids, dtype=str)
+            vectors = self._vectors[:self._count].copy()
+            metadata = list(self._metadata)
+
+        tmp_vectors = os.path.join(path, f"vectors.{os.getpid()}.tmp.npz")
+        tmp_metadata = os.path.join(path, f"metadata.{os.getpid()}.tmp.json")
+        np.savez(tmp_vectors, ids=ids, vectors=vectors)
+        with open(tmp_metadata, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_metadata, os.path.join(path, "metadata.json"))
+        os.replace(tmp_vectors, os.path.join(path, "vectors.npz"))
+        logger.info(f"Saved {len(metadata)} vectors to {path} in {time.monotonic() - started:.2f}s")
+
+    def load(self, path: str):
+        started = time.monotonic()
+        with np.load(os.path.join(path, "vectors.npz")) as data:
+            ids = [str(vector_id) for vector_id in data["ids"]]
+            vectors = data["vectors"].astype(np.float32)
+        with open(os.path.join(path, "metadata.json")) as f:
+            metadata = json.load(f)
+        if len(ids) != len(metadata) or (len(ids) and vectors.shape[1] != self.dimension):
+            raise ValueError(f"Vector store snapshot {path} is inconsistent or has the wrong dimension")
+
+        with self._lock:
+            self._count = len(ids)
+            self._vectors = vectors
+            self._norms = np.linalg.norm(vectors, axis=1) if len(ids) else np.zeros(0, dtype=np.float32)
+            self._ids = ids
+            self._metadata = metadata
+            self._rows = {vector_id: row for row, vector_id in enumerate(ids)}
+            self._ann = None
+            self._maybe_build_ann()
+        logger.info(f"Loaded {len(ids)} vectors from {path} in {time.monotonic() - started:.2f}s")
+
+    # -----------------------------------------------------------------
+    # Search
+    # -----------------------------------------------------------------
+
+    def _exact_search(self, query: np.ndarray, top_k: int, allowed: Optional[np.ndarray]):
+        candidates = np.arange(self._count) if allowed is None else np.flatnonzero(allowed)
+        if len(candidates) == 0 or top_k <= 0:
+            return [], []
+
+        vectors = self._vectors[candidates]
+        if self.metric == "euclidean":
+            diff = vectors - query
+            # Lower is better, as in Pinecone
+            scores = np.einsum("ij,ij->i", diff, diff)
+            order_scores = -scores
+        else:
+            scores = vectors @ query
+            if self.metric == "cosine":
+                scores = scores / np.maximum(self._norms[candidates] * np.linalg.norm(query), 1e-12)
+            order_scores = scores
+
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-order_scores, k - 1)[:k]
+        top = top[np.argsort(-order_scores[top], kind="stable")]
+        return candidates[top].tolist(), scores[top].tolist()
+
+    def _ann_search(self, query: np.ndarray, top_k: int, allowed: Optional[np.ndarray]):
+        accept = None
+        if allowed is not None:
+            accept = lambda vector_id: bool(allowed[self._rows[vector_id]])
+        try:
+            found = self._ann.query(query, top_k, accept)
+        except RuntimeError as e:
+            # hnswlib could not find top_k neighbours that pass the filter
+            logger.debug(f"ANN search fell back to exact search: {e}")
+            return None, None
+        rows = [self._rows[vector_id] for vector_id, _ in found]
+        return rows, [score for _, score in found]
+
+    def _reserve(self, size: int):
+        capacity = self._vectors.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        vectors[:self._count] = self._vectors[:self._count]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self._count] = self._norms[:self._count]
+        self._vectors, self._norms = vectors, norms
+
+    def _maybe_build_ann(self):
+        if self._ann_unavailable or self._count < self.ann_threshold:
+            return
+        try:
+            self._ann = _HnswIndex(self.dimension, self.metric, *self.hnsw_params)
+        except ImportError:
+            logger.warning("hnswlib is not installed; the local vector store keeps using exact search")
+            self._ann_unavailable = True
+            return
+        started = time.monotonic()
+        self._ann.add(self._ids[:self._count], self._vectors[:self._count])
+        logger.info(f"Built HNSW index over {self._count} vectors in {time.monotonic() - started:.2f}s")
+
+
+class _HnswIndex:
+    """
+    hnswlib graph keyed by vector id. Replaced or deleted vectors are marked
+    deleted in the graph and their slots reused.
+    """
+
+    _SPACES = {"cosine": "cosine", "dotproduct": "ip", "euclidean": "l2"}
+
+    def __init__(self, dimension: int, metric: str, m: int, ef_construction: int, ef_search: int):
+        import hnswlib
+
+        self.metric = metric
+        self.index = hnswlib.Index(space=self._SPACES[metric], dim=dimension)
+        self.index.init_index(max_elements=1024, M=m, ef_construction=ef_construction, allow_replace_deleted=True)
+        self.index.set_ef(ef_search)
+        self.labels: Dict[str, int] = {}
+        self.ids: Dict[int, str] = {}
+        self._next_label = 0
+
+    def add(self, ids: Iterable[str], vectors: np.ndarray):
+        ids = list(ids)
+        for vector_id in ids:
+            self.remove(vector_id)
+        labels = list(range(self._next_label, self._next_label + len(ids)))
+        self._next_label += len(ids)
+
+        needed = len(self.labels) + len(ids)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, self.index.get_max_elements() * 2))
+        self.index.add_items(vectors, labels, replace_deleted=True)
+        for vector_id, label in zip(ids, labels):
+            self.labels[vector_id] = label
+            self.ids[label] = vector_id
+
+    def remove(self, vector_id: str):
+        label = self.labels.pop(vector_id, None)
+        if label is not None:
+            self.ids.pop(label)
+            self.index.mark_deleted(label)
+
+    def query(self, vector: np.ndarray, top_k: int, accept: Optional[Callable[[str], bool]] = None):
+        k = min(top_k, len(self.labels))
+        if k <= 0:
+            return []
+        label_filter = (lambda label: accept(self.ids[label])) if accept else None
+        labels, distances = self.index.knn_query(vector, k=k, filter=label_filter)
+        return [
+            (self.ids[int(label)], self._score(float(distance)))
+            for label, distance in zip(labels[0], distances[0])
+        ]
+
+    def _score(self, distance: float) -> float:
+        # hnswlib returns 1 - similarity for cosine/ip and squared L2 for l2
+        return distance if self.metric == "euclidean" else 1.0 - distance
+
+
+def matches_filter(metadata: Dict[str, Any], filter: dict) -> bool:
+    """
+    Evaluate a Pinecone metadata filter against one record's metadata.
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            value = metadata.get(key, _MISSING)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                if not _OPERATORS[operator](value, operand):
+                    return False
+    return True
+
+
+def _values(value) -> list:
+    if value is _MISSING:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _compare(compare: Callable[[Number, Number], bool]):
+    def check(value, operand):
+        return (
+            isinstance(value, Number) and not isinstance(value, bool)
+            and isinstance(operand, Number) and compare(value, operand)
+        )
+    return check
+
+
+_OPERATORS = {
+    # A list-valued field matches if any of its elements does
+    "$eq": lambda value, operand: operand in _values(value),
+    "$ne": lambda value, operand: operand not in _values(value),
+    "$in": lambda value, operand: any(item in operand for item in _values(value)),
+    "$nin": lambda value, operand: not any(item in operand for item in _values(value)),
+    "$exists": lambda value, operand: (value is not _MISSING) == bool(operand),
+    "$gt": _compare(lambda value, operand: value > operand),
+    "$gte": _compare(lambda value, operand: value >= operand),
+    "$lt": _compare(lambda value, operand: value < operand),
+    "$lte": _compare(lambda value, operand: value <= operand),
+}
+
+
+def build_vector_store(name: str = None) -> VectorStore:
+    """
+    Build the vector store selected by `settings.vector_store`.
+    """
+    name = name or settings.vector_store
+    if name == "pinecone":
+        store = PineconeVectorStore(settings.get_pinecone_index())
+        if settings.vector_mirror:
+            from api.vector_mirror import MirroredVectorStore
+
+            store = MirroredVectorStore(store, settings.vector_store_path)
+    elif name == "local":
+        store = build_local_store(settings.vector_store_path)
+    else:
+        raise ValueError(f"Unknown VECTOR_STORE={name}; expected one of {BACKENDS}")
+
+    if settings.query_cache_size > 0:
+        from api.query_cache import CachedVectorStore
+
+        store = CachedVectorStore(
+            store,
+            settings.query_cache_size,
+            settings.query_cache_ttl_seconds,
+            settings.query_cache_write_settle_seconds,
+        )
+    return store
+
+
+def build_local_store(path: str = "") -> LocalVectorStore:
+    return LocalVectorStore(
+        dimension=settings.model_dim,
+        metric=settings.vector_store_metric,
+        path=path,
+        ann_threshold=settings.vector_store_ann_threshold,
+        hnsw_m=settings.hnsw_m,
+        hnsw_ef_construction=settings.hnsw_ef_construction,
+        hnsw_ef_search=settings.hnsw_ef_search,
+    )
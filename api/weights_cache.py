@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Optional
+
+from api.config import settings
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def fetch_weights(bucket: str, key: str, s3_client=None) -> str:
+    """
+    Return a local path for the model weights stored at s3://bucket/key.
+
+    Weights are cached under `settings.weights_cache_dir`, keyed by the S3 key
+    and the object's ETag. Online, a single HEAD request decides whether the
+    cached copy is still current; in offline mode (`WEIGHTS_OFFLINE=true`) the
+    newest verified copy is used without contacting S3 at all. `s3_client`
+    defaults to `settings.get_s3_client()`.
+    """
+    key_dir = os.path.join(settings.weights_cache_dir, _key_digest(bucket, key))
+
+    if settings.weights_offline:
+        entry = _latest_entry(key_dir)
+        if entry is None:
+            raise FileNotFoundError(f"Offline mode: no cached weights for s3://{bucket}/{key}")
+        logger.info(f"Offline mode: using cached weights {entry['path']} (etag={entry['etag']})")
+        return _verified_path(entry)
+
+    s3_client = s3_client or settings.get_s3_client()
+    started = time.monotonic()
+    try:
+        head = s3_client.head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        entry = _latest_entry(key_dir)
+        if entry is None:
+            raise
+        logger.warning(f"HEAD s3://{bucket}/{key} failed ({e}); falling back to cached {entry['path']}")
+        return _verified_path(entry)
+    etag = head["ETag"].strip('"')
+    logger.info(f"HEAD s3://{bucket}/{key} took {time.monotonic() - started:.2f}s (etag={etag})")
+
+    entry = _read_entry(os.path.join(key_dir, etag))
+    if entry is not None and entry["size"] == head["ContentLength"]:
+        try:
+            return _verified_path(entry)
+        except ValueError as e:
+            logger.warning(f"{e}; downloading a fresh copy")
+
+    return _download(s3_client, bucket, key, key_dir, etag, head)
+
+
+def weights_sha256(path: str) -> Optional[str]:
+    """
+    SHA-256 recorded for a path returned by `fetch_weights`, or None.
+    """
+    entry = _read_entry(os.path.dirname(path))
+    return entry["sha256"] if entry else None
+
+
+def _download(s3_client, bucket: str, key: str, key_dir: str, etag: str, head: dict) -> str:
+    entry_dir = os.path.join(key_dir, etag)
+    tmp_dir = os.path.join(key_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir, exist_ok=True)
+    filename = os.path.basename(key)
+    tmp_path = os.path.join(tmp_dir, filename)
+
+    try:
+        started = time.monotonic()
+        s3_client.download_file(bucket, key, tmp_path)
+        logger.info(f"Downloaded s3://{bucket}/{key} in {time.monotonic() - started:.2f}s")
+
+        started = time.monotonic()
+        sha256, md5 = _file_digests(tmp_path)
+        size = os.path.getsize(tmp_path)
+        if size != head["ContentLength"]:
+            raise ValueError(f"Size mismatch for s3://{bucket}/{key}: {size} != {head['ContentLength']}")
+        # Single-part, non-KMS uploads use the MD5 of the body as their ETag
+        if "-" not in etag and head.get("ServerSideEncryption") != "aws:kms" and md5 != etag:
+            raise ValueError(f"Checksum mismatch for s3://{bucket}/{key}: md5 {md5} != etag {etag}")
+        logger.info(f"Verified s3://{bucket}/{key} in {time.monotonic() - started:.2f}s")
+
+        entry = {
+            "bucket": bucket,
+            "key": key,
+            "etag": etag,
+            "size": size,
+            "sha256": sha256,
+            "path": os.path.join(entry_dir, filename),
+            "cached_at": time.time(),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(entry, f)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another process finished the same download first
+            if _read_entry(entry_dir) is None:
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    _remove_stale_entries(key_dir, keep=etag)
+    return entry["path"]
+
+
+def _verified_path(entry: dict) -> str:
+    path = entry["path"]
+    if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+        raise ValueError(f"Cached weights {path} are missing or truncated")
+    if settings.weights_cache_verify:
+        started = time.monotonic()
+        sha256, _ = _file_digests(path)
+        if sha256 != entry["sha256"]:
+            raise ValueError(f"Cached weights {path} failed checksum verification")
+        logger.info(f"Verified cached weights {path} in {time.monotonic() - started:.2f}s")
+    logger.info(f"Reusing cached weights {path}")
+    return path
+
+
+def _read_entry(entry_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(entry_dir, "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _latest_entry(key_dir: str) -> Optional[dict]:
+    if not os.path.isdir(key_dir):
+        return None
+    entries = [
+        _read_entry(os.path.join(key_dir, name))
+        for name in os.listdir(key_dir)
+        if not name.startswith(".")
+    ]
+    entries = [entry for entry in entries if entry is not None]
+    if not entries:
+        return None
+    return max(entries, key=lambda entry: entry["cached_at"])
+
+
+def _remove_stale_entries(key_dir: str, keep: str):
+    for name in os.listdir(key_dir):
+        if name != keep and not name.startswith("."):
+            shutil.rmtree(os.path.join(key_dir, name), ignore_errors=True)
+
+
+def _key_digest(bucket: str, key: str) -> str:
+    return hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()[:16]
+
+
+def _file_digests(path: str):
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
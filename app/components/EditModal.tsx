@@ -67,8 +67,10 @@ const EditModal: React.FC<EditModalProps> = ({
   const [pickPoints, setPickPoints] = useState<[number, number][]>([]);
   const [showPickPointModal, setShowPickPointModal] = useState(false);
 
-  // We'll store the s3_presigned_url for preview
+  // Full-size crop for the pick-point editor; the thumbnail only stands in
+  // for the preview while the full-size URL loads
   const [imageUrl, setImageUrl] = useState<string>("");
+  const [thumbnailUrl, setThumbnailUrl] = useState<string>("");
 
   // --------------------------------------------------------------------------
   // 1) On open, load existing fields & parse multi pick points
@@ -94,13 +96,26 @@ const EditModal: React.FC<EditModalProps> = ({
     const existingPoints = parsePickPoints(metadata.pick_point);
     setPickPoints(existingPoints);
 
-    // Use the image if we have a presigned URL
-    if (metadata.s3_presigned_url) {
-      setImageUrl(metadata.s3_presigned_url);
-    } else {
-      setImageUrl("");
-    }
-  }, [isOpen, metadata]);
+    // Search returns the thumbnail by default; pick points must be placed on the
+    // full-size crop, so sign it unless the result already carries it
+    setImageUrl(metadata.s3_presigned_url || "");
+    setThumbnailUrl(metadata.thumbnail_url || "");
+    if (metadata.s3_presigned_url || !metadata.embedding_id) return;
+
+    let cancelled = false;
+    axios
+      .get(`${apiUrl}/update/${metadata.embedding_id}/image`)
+      .then((response) => {
+        if (!cancelled) setImageUrl(response.data.s3_presigned_url || "");
+      })
+      .catch((error) => {
+        console.error("Full-size image error:", error);
+        if (!cancelled) setErrorMessage("Could not load the full-size image.");
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [isOpen, metadata, apiUrl]);
 
   // --------------------------------------------------------------------------
   // 2) Hide modifier dropdown on outside click
@@ -260,7 +275,7 @@ const EditModal: React.FC<EditModalProps> = ({
 
           {/* Scrollable Content */}
           <div className="flex-1 overflow-y-auto p-4 space-y-4">
-            {imageUrl ? (
+            {imageUrl || thumbnailUrl ? (
               <>
                 {/* The preview with multiple crosshairs */}
                 <div
@@ -268,7 +283,7 @@ const EditModal: React.FC<EditModalProps> = ({
                   style={{ margin: 0, padding: 0, lineHeight: 0 }}
                 >
                   <img
-                    src={imageUrl}
+                    src={imageUrl || thumbnailUrl}
                     alt="Preview"
                     style={{
                       objectFit: "contain",
@@ -293,7 +308,8 @@ const EditModal: React.FC<EditModalProps> = ({
                   <button
                     type="button"
                     onClick={handleSelectPickPoints}
-                    className="px-4 py-1 text-sm bg-gray-200 rounded hover:bg-gray-300"
+                    disabled={!imageUrl}
+                    className="px-4 py-1 text-sm bg-gray-200 rounded hover:bg-gray-300 disabled:opacity-50"
                   >
                     {pickPoints.length > 0 ? "Re-select points" : "Select pick points"}
                   </button>
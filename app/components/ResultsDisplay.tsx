@@ -11,7 +11,8 @@ interface Result {
     date_added?: string;
     s3_file_name?: string;
     s3_file_path?: string;
-    s3_presigned_url: string;
+    s3_presigned_url?: string;
+    thumbnail_url?: string;
     whole_image_presigned_url?: string;
     file_type: "image" | "video" | "text";
     start_offset_sec?: number;
@@ -150,6 +151,7 @@ const ResultsDisplay: React.FC<ResultsDisplayProps> = ({
                   ![
                     "file_type",
                     "s3_presigned_url",
+                    "thumbnail_url",
                     "s3_file_name",
                     "whole_image_presigned_url",
                     "color",
@@ -184,7 +186,7 @@ const ResultsDisplay: React.FC<ResultsDisplayProps> = ({
                   <div className="bg-white rounded-md shadow-md overflow-hidden flex flex-col">
                     <div className="mt-3 mr-3 ml-3">
                       <ImageContainer
-                        imageUrl={result.metadata.s3_presigned_url}
+                        imageUrl={result.metadata.thumbnail_url || result.metadata.s3_presigned_url || ""}
                         score={roundedScore}
                         pickPoints={pickPoints}
                         wholeImageUrl={result.metadata.whole_image_presigned_url}
@@ -45,7 +45,8 @@ interface Result {
     date_added?: string;
     s3_file_name?: string;
     s3_file_path?: string;
-    s3_presigned_url: string;
+    s3_presigned_url?: string;
+    thumbnail_url?: string;
     whole_image_presigned_url?: string;
     file_type: 'image' | 'video' | 'text';
     start_offset_sec?: number;
@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.search import DATETIME_TAKEN_TS, datetime_taken_timestamp
+from api.vector_store import build_vector_store
+
+
+def main(batch_size, dry_run):
+    """
+    Add the numeric datetime_taken_ts field, used by date range filters, to
+    every vector that has a parsable datetime_taken but no timestamp yet.
+    """
+    store = build_vector_store()
+    scanned = updated = unparsable = 0
+    try:
+        for ids in store.list_ids(batch_size):
+            vectors = store.fetch(ids)['vectors']
+            batch = []
+            for vector_id, vector in vectors.items():
+                scanned += 1
+                metadata = vector.get('metadata') or {}
+                if DATETIME_TAKEN_TS in metadata:
+                    continue
+                timestamp = datetime_taken_timestamp(metadata.get('datetime_taken'))
+                if timestamp is None:
+                    unparsable += 1
+                    continue
+                batch.append({
+                    'id': vector_id,
+                    'values': vector['values'],
+                    'metadata': {**metadata, DATETIME_TAKEN_TS: timestamp},
+                })
+            if batch and not dry_run:
+                store.upsert(batch)
+            updated += len(batch)
+            print(f"Scanned {scanned}, {'would update' if dry_run else 'updated'} {updated}, unparsable {unparsable}", end='\r')
+    finally:
+        store.close()
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill datetime_taken_ts on existing vectors for date range filters.')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of vectors fetched per request.')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the vectors that would be updated.')
+
+    args = parser.parse_args()
+    main(args.batch_size, args.dry_run)
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.search import THUMBNAIL_S3_URI
+from api.thumbnails import make_thumbnail_from_bytes, thumbnail_exists, thumbnail_uri, upload_thumbnail
+from api.vector_store import build_vector_store
+
+
+def create_thumbnail(crop_s3_uri, overwrite):
+    """
+    Make sure the crop's thumbnail exists; returns (thumbnail URI, created).
+    """
+    if not overwrite and thumbnail_exists(crop_s3_uri):
+        return thumbnail_uri(crop_s3_uri), False
+    parsed = urlparse(crop_s3_uri)
+    response = settings.get_s3_client().get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip('/'))
+    return upload_thumbnail(crop_s3_uri, make_thumbnail_from_bytes(response['Body'].read())), True
+
+
+def main(batch_size, workers, overwrite, dry_run):
+    """
+    Create thumbnails for crops ingested before thumbnails existed and record
+    their URIs in the vector metadata, so search serves them instead of the
+    full-size crops.
+    """
+    store = build_vector_store()
+    scanned = created = linked = failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for ids in store.list_ids(batch_size):
+                vectors = store.fetch(ids)['vectors']
+                pending = {
+                    vector_id: vector for vector_id, vector in vectors.items()
+                    if (vector.get('metadata') or {}).get('s3_file_path')
+                    and (overwrite or not vector['metadata'].get(THUMBNAIL_S3_URI))
+                }
+                scanned += len(vectors)
+                if dry_run:
+                    linked += len(pending)
+                    continue
+
+                futures = {
+                    vector_id: pool.submit(create_thumbnail, vector['metadata']['s3_file_path'], overwrite)
+                    for vector_id, vector in pending.items()
+                }
+                batch = []
+                for vector_id, future in futures.items():
+                    vector = pending[vector_id]
+                    try:
+                        s3_uri, was_created = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"\nFailed to create a thumbnail for {vector['metadata']['s3_file_path']}: {e}")
+                        continue
+                    created += was_created
+                    batch.append({
+                        'id': vector_id,
+                        'values': vector['values'],
+                        'metadata': {**vector['metadata'], THUMBNAIL_S3_URI: s3_uri},
+                    })
+                if batch:
+                    store.upsert(batch)
+                linked += len(batch)
+                print(f"Scanned {scanned}, created {created}, linked {linked}, failed {failed}", end='\r')
+    finally:
+        store.close()
+    print()
+    if dry_run:
+        print(f"{linked} of {scanned} vectors have no thumbnail yet")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill thumbnails for existing crops.')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of vectors fetched per request.')
+    parser.add_argument('--workers', type=int, default=8, help='Thumbnails created in parallel.')
+    parser.add_argument('--overwrite', action='store_true', help='Re-create thumbnails that already exist (e.g. after changing THUMBNAIL_MAX_SIDE).')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the vectors without a thumbnail.')
+
+    args = parser.parse_args()
+    main(args.batch_size, args.workers, args.overwrite, args.dry_run)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import time
+
+import clip
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.clip_backends import BACKENDS, TorchClipBackend, build_clip_backend, check_parity
+from api.model_loader import get_clip_model
+
+
+def time_backend(encode, inputs, iterations):
+    # Warm-up run so one-time allocation and graph optimization are not timed
+    encode(inputs)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encode(inputs)
+    return (time.perf_counter() - started) / iterations
+
+
+def main(backends, batch_sizes, iterations):
+    model, device, _ = get_clip_model()
+    reference = TorchClipBackend(model, device)
+    resolution = model.visual.input_resolution
+    print(f"Device: {device}, torch threads: {torch.get_num_threads()}")
+
+    for name in backends:
+        backend = build_clip_backend(model, device, name=name)
+        if backend.name != name:
+            print(f"{name}: not available, skipped")
+            continue
+
+        parity = check_parity(reference, backend, model, device)
+        print(f"\n{name}: image min cosine {parity['image_min_cosine']:.6f}, "
+              f"text min cosine {parity['text_min_cosine']:.6f}")
+
+        for batch_size in batch_sizes:
+            images = torch.randn(batch_size, 3, resolution, resolution)
+            tokens = clip.tokenize(["clear PET bottle"] * batch_size)
+            image_seconds = time_backend(backend.encode_image, images, iterations)
+            text_seconds = time_backend(backend.encode_text, tokens, iterations)
+            print(f"  batch {batch_size:>3}: "
+                  f"image {image_seconds * 1000:8.1f} ms ({batch_size / image_seconds:7.1f} img/s), "
+                  f"text {text_seconds * 1000:8.1f} ms ({batch_size / text_seconds:7.1f} txt/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare CLIP inference backends for latency, throughput and parity.')
+    parser.add_argument('-b', '--backends', type=str, default=','.join(BACKENDS), help='Comma-separated backends to benchmark.')
+    parser.add_argument('-s', '--batch-sizes', type=str, default='1,8,32', help='Comma-separated batch sizes.')
+    parser.add_argument('-n', '--iterations', type=int, default=20, help='Timed iterations per batch size.')
+
+    args = parser.parse_args()
+    main(
+        [name.strip() for name in args.backends.split(',') if name.strip()],
+        [int(size) for size in args.batch_sizes.split(',')],
+        args.iterations,
+    )
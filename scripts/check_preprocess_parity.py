@@ -0,0 +1,83 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.model_loader import get_clip_model
+from api.preprocessing import DRAFT_OVERSAMPLE, check_parity, decode_image, resize_and_crop, to_tensor
+
+s3_client = settings.get_s3_client()
+
+
+def list_images(bucket_name, prefix, limit):
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith(('jpeg', 'jpg', 'png', 'bmp', 'gif')):
+                keys.append(obj['Key'])
+                if len(keys) >= limit:
+                    return keys
+    return keys
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def normalized(embeddings):
+    embeddings = embeddings.float().numpy()
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def main(bucket_name, prefix, limit, max_abs_diff):
+    model, device, preprocess = get_clip_model()
+    n_px = model.visual.input_resolution
+
+    keys = list_images(bucket_name, prefix, limit)
+    images = [s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read() for key in keys]
+    print(f"Checking {len(images)} images from s3://{bucket_name}/{prefix}")
+
+    parity = check_parity(images, preprocess, n_px)
+    print(f"Pixel parity: {parity}")
+
+    reference, reference_seconds = timed(lambda: torch.stack([
+        preprocess(Image.open(io.BytesIO(image_bytes))) for image_bytes in images
+    ]))
+    draft, draft_seconds = timed(lambda: to_tensor([
+        resize_and_crop(decode_image(image_bytes, n_px * DRAFT_OVERSAMPLE), n_px) for image_bytes in images
+    ]))
+    print(f"Decode + preprocess: CLIP preprocess {reference_seconds:.2f}s, fast path {draft_seconds:.2f}s "
+          f"({reference_seconds / draft_seconds:.2f}x)")
+
+    with torch.no_grad():
+        cosines = np.sum(
+            normalized(model.encode_image(reference.to(device)).cpu())
+            * normalized(model.encode_image(draft.to(device)).cpu()),
+            axis=1,
+        )
+    print(f"Embedding cosine CLIP preprocess vs fast path: mean {cosines.mean():.5f}, min {cosines.min():.5f}")
+
+    if parity['max_abs_diff_exact'] > max_abs_diff:
+        print(f"FAIL: full-resolution preprocessing differs by {parity['max_abs_diff_exact']:.2e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check api/preprocessing.py against CLIP preprocess on real crops.')
+    parser.add_argument('-b', '--bucket', type=str, default='glacier-ml-training', help='The S3 bucket holding the crops.')
+    parser.add_argument('-f', '--folder', type=str, default='universal-db/crops_for_labeling/', help='The S3 prefix of the crops.')
+    parser.add_argument('-n', '--limit', type=int, default=100, help='Number of images to check.')
+    parser.add_argument('--max-abs-diff', type=float, default=1e-5, help='Allowed difference for full-resolution decoding.')
+
+    args = parser.parse_args()
+    main(args.bucket, args.folder, args.limit, args.max_abs_diff)
@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.metadata_log import metadata_log
+
+
+def main(grace_seconds, stats_only):
+    """
+    Fold the metadata log segments into universal-db/metadata.csv. Safe to run
+    alongside the API's own compaction (METADATA_COMPACTION_SECONDS).
+    """
+    if stats_only:
+        segments = metadata_log.list_segments()
+        table, compacted_through, _ = metadata_log.read_snapshot()
+        tail = [key for key in segments if key > compacted_through]
+        print(f"Snapshot rows: {len(table)}")
+        print(f"Compacted through: {compacted_through or '-'}")
+        print(f"Segments: {len(segments)} ({len(tail)} in the tail, {len(segments) - len(tail)} already compacted)")
+        return
+
+    result = metadata_log.compact(grace_seconds)
+    print(result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compact the metadata log into the metadata CSV snapshot.')
+    parser.add_argument('--grace-seconds', type=float, default=settings.metadata_log_compact_grace_seconds,
+                        help='Leave segments younger than this for the next compaction.')
+    parser.add_argument('--stats', action='store_true', help='Only report the snapshot and segment counts.')
+
+    args = parser.parse_args()
+    main(args.grace_seconds, args.stats)
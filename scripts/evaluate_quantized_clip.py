@@ -0,0 +1,104 @@
+import argparse
+import copy
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.model_loader import get_clip_model, model_size_mb, quantize_clip_model
+from api.vector_store import build_vector_store
+
+s3_client = settings.get_s3_client()
+
+
+def list_images(bucket_name, prefix, limit):
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].lower().endswith(('jpeg', 'jpg', 'png', 'bmp', 'gif')):
+                keys.append(obj['Key'])
+                if len(keys) >= limit:
+                    return keys
+    return keys
+
+
+def load_images(bucket_name, keys):
+    images = []
+    for key in keys:
+        body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+        images.append(Image.open(io.BytesIO(body)).convert('RGB'))
+    return images
+
+
+def encode(model, batch, batch_size):
+    outputs = []
+    started = time.perf_counter()
+    with torch.no_grad():
+        for i in range(0, len(batch), batch_size):
+            outputs.append(model.encode_image(batch[i:i + batch_size]).float().numpy())
+    return np.concatenate(outputs), time.perf_counter() - started
+
+
+def top_k_ids(index, embedding, top_k):
+    response = index.query(embedding.tolist(), top_k, include_metadata=False)
+    return [match['id'] for match in response['matches']]
+
+
+def main(bucket_name, prefix, limit, top_k, batch_size):
+    if settings.clip_quantize:
+        print("Unset CLIP_QUANTIZE so the float32 model is loaded as the reference.")
+        sys.exit(1)
+
+    fp32_model, device, preprocess = get_clip_model()
+    int8_model = quantize_clip_model(copy.deepcopy(fp32_model))
+    print(f"Model size: float32 {model_size_mb(fp32_model):.1f} MB, int8 {model_size_mb(int8_model):.1f} MB")
+
+    keys = list_images(bucket_name, prefix, limit)
+    print(f"Evaluating {len(keys)} images from s3://{bucket_name}/{prefix}")
+    batch = torch.stack([preprocess(image) for image in load_images(bucket_name, keys)])
+
+    fp32_embeddings, fp32_seconds = encode(fp32_model, batch, batch_size)
+    int8_embeddings, int8_seconds = encode(int8_model, batch, batch_size)
+    print(f"Throughput: float32 {len(keys) / fp32_seconds:.1f} img/s, int8 {len(keys) / int8_seconds:.1f} img/s "
+          f"({fp32_seconds / int8_seconds:.2f}x)")
+
+    cosines = np.sum(
+        (fp32_embeddings / np.linalg.norm(fp32_embeddings, axis=1, keepdims=True))
+        * (int8_embeddings / np.linalg.norm(int8_embeddings, axis=1, keepdims=True)),
+        axis=1,
+    )
+    print(f"Embedding cosine float32 vs int8: mean {cosines.mean():.4f}, min {cosines.min():.4f}")
+
+    index = build_vector_store()
+    overlaps = []
+    top1_agreement = 0
+    for fp32_embedding, int8_embedding in zip(fp32_embeddings, int8_embeddings):
+        fp32_ids = top_k_ids(index, fp32_embedding, top_k)
+        int8_ids = top_k_ids(index, int8_embedding, top_k)
+        if not fp32_ids:
+            continue
+        overlaps.append(len(set(fp32_ids) & set(int8_ids)) / len(fp32_ids))
+        top1_agreement += int(bool(int8_ids) and int8_ids[0] == fp32_ids[0])
+
+    if overlaps:
+        print(f"Top-{top_k} agreement with float32 results (recall@{top_k}): {np.mean(overlaps):.4f}")
+        print(f"Top-1 agreement: {top1_agreement / len(overlaps):.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure how int8 dynamic quantization of CLIP changes retrieval against the Pinecone index.')
+    parser.add_argument('-b', '--bucket', type=str, default='glacier-ml-training', help='The S3 bucket holding the evaluation crops.')
+    parser.add_argument('-f', '--folder', type=str, default='universal-db/crops_for_labeling/', help='The S3 prefix of the evaluation crops.')
+    parser.add_argument('-n', '--limit', type=int, default=200, help='Number of crops to evaluate.')
+    parser.add_argument('-k', '--top-k', type=int, default=settings.k, help='Number of neighbours to compare.')
+    parser.add_argument('--batch-size', type=int, default=32, help='Encode batch size.')
+
+    args = parser.parse_args()
+    main(args.bucket, args.folder, args.limit, args.top_k, args.batch_size)
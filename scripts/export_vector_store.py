@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.vector_store import LocalVectorStore, PineconeVectorStore
+
+
+def main(output_path, batch_size):
+    """
+    Copy every vector and its metadata from the Pinecone index into a local
+    vector store snapshot (VECTOR_STORE=local, VECTOR_STORE_PATH=output_path).
+    """
+    source = PineconeVectorStore(settings.get_pinecone_index())
+    store = LocalVectorStore(dimension=settings.model_dim, metric=settings.vector_store_metric)
+
+    started = time.monotonic()
+    for ids in source.list_ids(batch_size):
+        vectors = source.fetch(ids)['vectors']
+        store.upsert([
+            {'id': vector_id, 'values': vector['values'], 'metadata': vector.get('metadata', {})}
+            for vector_id, vector in vectors.items()
+        ])
+        print(f"Exported {store.describe_index_stats()['total_vector_count']} vectors", end='\r')
+
+    store.save(output_path)
+    print(f"\nExported {store.describe_index_stats()['total_vector_count']} vectors to {output_path} "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the Pinecone index to a local vector store snapshot.')
+    parser.add_argument('-o', '--output', type=str, default=settings.vector_store_path or 'vector-store', help='Snapshot directory.')
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of vectors fetched per request.')
+
+    args = parser.parse_args()
+    main(args.output, args.batch_size)
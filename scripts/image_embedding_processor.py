@@ -17,6 +17,7 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from api.config import settings
+from api.weights_cache import fetch_weights
 
 # Configuration
 FILE_TYPE = 'image'
@@ -29,12 +30,11 @@ device = "cuda" if torch.cuda.is_available() else "cpu"
 s3_model_path = os.getenv('MODEL_PATH')
 clip_model = os.getenv('MODEL')
 print(f"Loading model {clip_model} from {s3_model_path}")
-model, preprocess = clip.load(clip_model, device=device)
-finetuned_weights_path = "/tmp/best_fine_tuned_clip_model.pth"
+model, preprocess = clip.load(clip_model, device=device, download_root=settings.weights_cache_dir)
 
-# Download weights if not already downloaded
+# Reuse the locally cached weights unless the S3 copy changed
 s3_client = settings.get_s3_client()
-s3_client.download_file("glacier-ml-training", s3_model_path, finetuned_weights_path)
+finetuned_weights_path = fetch_weights("glacier-ml-training", s3_model_path)
 model.load_state_dict(torch.load(finetuned_weights_path, map_location=device, weights_only=True))
 
 def process_image(image_file, bucket_name, prefix, model, index, file_path, image_index, total_images, max_retries=5):
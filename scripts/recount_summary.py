@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.metadata_log import COMPACTED_THROUGH, metadata_log
+from api.metadata_summary import count_rows
+
+
+def diff_summaries(expected, actual):
+    """
+    Human-readable differences between two /summary documents.
+    """
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        left, right = expected.get(key), actual.get(key)
+        if not isinstance(left, dict) or not isinstance(right, dict):
+            if left != right:
+                differences.append(f"{key}: expected {left}, got {right}")
+            continue
+        for value in sorted(set(left) | set(right)):
+            if left.get(value, 0) != right.get(value, 0):
+                differences.append(f"{key}[{value!r}]: expected {left.get(value, 0)}, got {right.get(value, 0)}")
+    return differences
+
+
+def report(name, expected, actual):
+    differences = diff_summaries(expected, actual)
+    if differences:
+        print(f"{name}: {len(differences)} difference(s)")
+        for line in differences:
+            print(f"  {line}")
+    else:
+        print(f"{name}: OK")
+    return not differences
+
+
+def main(write):
+    """
+    Recount the facets from scratch and compare them with the incrementally
+    maintained counts (what /summary serves) and with the summary document
+    written by the last compaction. Exits non-zero on any difference.
+    """
+    table = metadata_log.read()
+    recount = count_rows(table.rows()).to_summary()
+    print(f"Merged table rows: {len(table)}, active: {recount['totalCrops']}")
+    ok = report("Incremental counts", recount, table.summary())
+
+    # The document describes the snapshot, so check it against a recount of the snapshot alone
+    snapshot, compacted_through, _ = metadata_log.read_snapshot()
+    snapshot_recount = count_rows(snapshot.rows()).to_summary()
+    document = metadata_log.read_summary()
+    if document is None:
+        print("Summary document: missing")
+        ok = False
+    elif document.get(COMPACTED_THROUGH) != compacted_through:
+        print(f"Summary document: stale (written for {document.get(COMPACTED_THROUGH) or '-'}, "
+              f"snapshot is compacted through {compacted_through or '-'})")
+        ok = False
+    else:
+        ok = report("Summary document", snapshot_recount, document.get("summary") or {}) and ok
+
+    if write:
+        metadata_log.write_summary(snapshot, compacted_through)
+        print(f"Summary document rewritten for {compacted_through or '-'}")
+
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify the /summary facet counts against a full recount.')
+    parser.add_argument('--write', action='store_true',
+                        help='Rewrite the summary document from the current snapshot.')
+
+    args = parser.parse_args()
+    sys.exit(0 if main(args.write) else 1)
@@ -0,0 +1,48 @@
+import argparse
+import os
+
+
+def read_memory(pid):
+    """
+    Return RSS, PSS, shared and private memory (MB) of a process from smaps_rollup.
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'shared': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+        'private': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+    }
+
+
+def child_pids(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def main(master_pid):
+    pids = [master_pid] + child_pids(master_pid)
+    total_pss = 0.0
+    print(f"{'pid':>8} {'role':>7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for pid in pids:
+        memory = read_memory(pid)
+        total_pss += memory['pss']
+        role = 'master' if pid == master_pid else 'worker'
+        print(f"{pid:>8} {role:>7} {memory['rss']:9.1f} {memory['pss']:9.1f} {memory['shared']:10.1f} {memory['private']:11.1f}")
+    print(f"Total PSS (actual memory used by the server): {total_pss:.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report per-process memory of a pre-forked gunicorn server (Linux only).')
+    parser.add_argument('pid', type=int, help='PID of the gunicorn master process.')
+
+    args = parser.parse_args()
+    main(args.pid)
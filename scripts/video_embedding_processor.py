@@ -1,6 +1,7 @@
 import argparse
 import base64
 import os
+import sys
 import uuid
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -14,6 +15,10 @@ from PIL import Image
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from api.config import settings
+from api.weights_cache import fetch_weights
+
 # Constants
 FILE_TYPE = 'video'
 MAX_RETRIES = 5
@@ -29,12 +34,17 @@ load_dotenv("../.env.development")
 
 # Initialize the CLIP model
 device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
+model, preprocess = clip.load("ViT-B/32", device=device, download_root=settings.weights_cache_dir)
 
-# Load fine-tuned weights from S3
-finetuned_weights_path = "/tmp/best_fine_tuned_clip_model.pth"
+# Videos and weights are read with boto3's default credential chain
 s3_client = boto3.client('s3')
-s3_client.download_file("glacier-ml-training", "artifacts/dev/CLIP/finetuned/best_fine_tuned_clip_model.pth", finetuned_weights_path)
+
+# Load fine-tuned weights, reusing the local cache unless the S3 copy changed
+finetuned_weights_path = fetch_weights(
+    "glacier-ml-training",
+    "artifacts/dev/CLIP/finetuned/best_fine_tuned_clip_model.pth",
+    s3_client=s3_client,
+)
 model.load_state_dict(torch.load(finetuned_weights_path, map_location=device, weights_only=True))
 
 
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import api.cache
+from api.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(api.cache.time, "monotonic", clock)
+    return clock
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = LRUCache(0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.get_or_compute("a", lambda: 2) == 2
+    assert len(cache) == 0
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(10, ttl=30)
+    cache.put("a", 1)
+
+    clock.now += 29.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_put_refreshes_ttl(clock):
+    cache = LRUCache(10, ttl=30)
+    cache.put("a", 1)
+    clock.now += 20
+    cache.put("a", 2)
+    clock.now += 20
+    assert cache.get("a") == 2
+
+
+def test_expired_entry_is_recomputed(clock):
+    cache = LRUCache(10, ttl=5)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute("a", compute) == 1
+    assert cache.get_or_compute("a", compute) == 1
+    clock.now += 5
+    assert cache.get_or_compute("a", compute) == 2
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = LRUCache(10)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    owner.start()
+    assert started.wait(5)
+    waiters = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+        for _ in range(4)
+    ]
+    for thread in waiters:
+        thread.start()
+    # Every waiter has registered on the in-flight lookup before it completes
+    deadline = time.monotonic() + 5
+    while cache.stats()["shared_inflight"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [owner, *waiters]:
+        thread.join(5)
+
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["shared_inflight"] == 4
+
+
+def test_failed_computation_reaches_waiters_and_is_not_cached():
+    cache = LRUCache(10)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("k", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["shared_inflight"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert errors == ["boom", "boom"]
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", lambda: "ok") == "ok"
+
+
+def test_async_concurrent_misses_share_one_computation():
+    cache = LRUCache(10)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*[cache.aget_or_compute("k", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["shared_inflight"] == 4
@@ -0,0 +1,111 @@
+import random
+
+from api.metadata_log import METADATA_COLUMNS, insert_record, parse_snapshot, update_record
+from api.metadata_summary import FacetCounts, count_rows
+from api.metadata_table import MetadataTable
+
+COLORS = ["Red", "Blue", " Green ", ""]
+BRANDS = ["pepsi", "Pepsi", "PEPSI", "coca cola", "Coca Cola", ""]
+MODIFIERS = ["", "crushed", "crushed, dirty", "dirty,,wet"]
+STATUSES = ["active", "Active", "inactive", ""]
+
+
+def random_fields(rng: random.Random) -> dict:
+    return {
+        "color": rng.choice(COLORS),
+        "material": rng.choice(["PET", "HDPE", ""]),
+        "brand": rng.choice(BRANDS),
+        "shape": rng.choice(["bottle", "can"]),
+        "robot": rng.choice(["R1", "R2"]),
+        "modifier": rng.choice(MODIFIERS),
+        "status": rng.choice(STATUSES),
+    }
+
+
+def test_summary_counts_active_rows_with_brand_and_modifier_normalisation():
+    counts = count_rows([
+        {"status": "active", "color": "Red", "brand": "pepsi", "modifier": "crushed, dirty"},
+        {"status": " Active ", "color": "Red ", "brand": "PEPSI", "modifier": "dirty"},
+        {"status": "active", "color": "", "brand": "coca cola", "modifier": ""},
+        {"status": "inactive", "color": "Blue", "brand": "Pepsi", "modifier": "crushed"},
+        {"status": "", "color": "Blue"},
+    ])
+    assert counts.to_summary() == {
+        "totalCrops": 3,
+        "colorCounts": {"Red": 2},
+        "materialCounts": {},
+        "brandCounts": {"Pepsi": 2, "Coca Cola": 1},
+        "shapeCounts": {},
+        "robotCounts": {},
+        "statusCounts": {"active": 3},
+        "modifierCounts": {"crushed": 1, "dirty": 2},
+    }
+
+
+def test_empty_summary():
+    assert FacetCounts().to_summary()["statusCounts"] == {}
+    assert FacetCounts().to_summary()["totalCrops"] == 0
+
+
+def test_remove_drops_values_that_reach_zero():
+    counts = FacetCounts()
+    row = {"status": "active", "color": "Red", "brand": "pepsi", "modifier": "crushed"}
+    counts.add(row)
+    counts.remove(row)
+    assert counts.to_summary() == FacetCounts().to_summary()
+
+
+def test_incremental_counts_match_full_recount():
+    rng = random.Random(7)
+    table = MetadataTable(METADATA_COLUMNS, [])
+    ids = []
+
+    for step in range(2000):
+        if not ids or rng.random() < 0.3:
+            row_id = f"crop-{step}"
+            ids.append(row_id)
+            table.apply(insert_record({"id": row_id, **random_fields(rng)}))
+        else:
+            fields = random_fields(rng)
+            changed = dict(rng.sample(sorted(fields.items()), rng.randint(1, 3)))
+            # Also touch columns that are not counted
+            if rng.random() < 0.2:
+                changed["comment"] = f"edit {step}"
+            table.apply(update_record(rng.choice(ids), changed))
+
+        if step % 250 == 0:
+            assert table.summary() == count_rows(table.rows()).to_summary()
+
+    assert table.summary() == count_rows(table.rows()).to_summary()
+    assert table.summary()["totalCrops"] > 0
+
+
+def test_deletes_and_orphan_updates():
+    table = MetadataTable(METADATA_COLUMNS, [])
+    table.apply(insert_record({"id": "a", "status": "active", "color": "Red", "brand": "pepsi"}))
+    table.apply(insert_record({"id": "b", "status": "active", "color": "Red", "brand": "Pepsi"}))
+    assert table.summary()["brandCounts"] == {"Pepsi": 2}
+
+    table.apply(update_record("a", {"status": "inactive"}))
+    table.apply(update_record("missing", {"status": "active", "color": "Blue"}))
+
+    summary = table.summary()
+    assert summary["totalCrops"] == 1
+    assert summary["colorCounts"] == {"Red": 1}
+    assert summary["brandCounts"] == {"Pepsi": 1}
+    assert table.orphan_updates == 1
+    assert summary == count_rows(table.rows()).to_summary()
+
+
+def test_counts_survive_a_snapshot_round_trip():
+    rng = random.Random(3)
+    table = MetadataTable(METADATA_COLUMNS, [])
+    for index in range(300):
+        table.apply(insert_record({"id": f"crop-{index}", **random_fields(rng)}))
+    for index in range(0, 300, 3):
+        table.apply(update_record(f"crop-{index}", {"status": "inactive"}))
+
+    reloaded = parse_snapshot(table.to_csv())
+    assert reloaded.summary() == table.summary()
+    assert len(reloaded) == 300
+
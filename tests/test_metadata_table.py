@@ -0,0 +1,53 @@
+import pytest
+
+import api.v1.endpoints.new as new
+from api.metadata_log import METADATA_COLUMNS, insert_record, update_record
+from api.metadata_table import MetadataTable
+
+
+@pytest.mark.parametrize("column", ["original_s3_uri", "s3_file_path"])
+def test_secondary_index_follows_updates(column):
+    table = MetadataTable(METADATA_COLUMNS, [])
+    table.apply(insert_record({"id": "a", column: "s3://bucket/frame-1.jpg", "status": "active"}))
+    table.apply(insert_record({"id": "b", column: "s3://bucket/frame-1.jpg", "status": "active"}))
+    assert [row["id"] for row in table.find(column, "s3://bucket/frame-1.jpg")] == ["a", "b"]
+
+    table.apply(update_record("a", {column: "s3://bucket/frame-2.jpg"}))
+    assert [row["id"] for row in table.find(column, "s3://bucket/frame-1.jpg")] == ["b"]
+    assert [row["id"] for row in table.find(column, "s3://bucket/frame-2.jpg")] == ["a"]
+    assert table.find(column, "s3://bucket/frame-3.jpg") == []
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = MetadataTable(METADATA_COLUMNS, [])
+    table.apply(insert_record({
+        "id": "a",
+        "original_s3_uri": "s3://bucket/frame-1.jpg",
+        "s3_file_path": "s3://bucket/crops/a.jpg",
+        "color": "Red",
+        "brand": "Pepsi",
+        "status": "active",
+    }))
+    monkeypatch.setattr(new.metadata_log, "table", lambda: table)
+    return table
+
+
+def test_duplicate_by_crop_path(table):
+    row = new.find_duplicate_in_metadata({
+        "original_s3_uri": "s3://bucket/frame-2.jpg",
+        "s3_file_path": "s3://bucket/crops/a.jpg",
+        "color": "Blue",
+    })
+    assert row["id"] == "a"
+
+
+def test_duplicate_by_labels_on_the_same_frame(table):
+    metadata = {"original_s3_uri": "s3://bucket/frame-1.jpg", "s3_file_path": "s3://bucket/crops/b.jpg"}
+    assert new.find_duplicate_in_metadata({**metadata, "color": "Red", "brand": "Pepsi"})["id"] == "a"
+    assert new.find_duplicate_in_metadata({**metadata, "color": "Blue", "brand": "Pepsi"}) is None
+
+
+def test_inactive_rows_are_not_duplicates(table):
+    table.apply(update_record("a", {"status": "inactive"}))
+    assert new.find_duplicate_in_metadata({"s3_file_path": "s3://bucket/crops/a.jpg"}) is None
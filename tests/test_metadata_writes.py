@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.metadata_log import insert_record, update_record
+from api.metadata_writes import MetadataWriteQueue
+
+
+class FakeLog:
+    """
+    Stands in for MetadataLog: records each appended segment.
+    """
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.segments = []
+        self.applied = []
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("S3 is down")
+        with self._lock:
+            self.segments.append(list(records))
+            return f"segment-{len(self.segments)}"
+
+    def apply_committed(self, segment_key, records):
+        self.applied.append((segment_key, list(records)))
+
+
+def test_concurrent_writes_share_one_segment():
+    log = FakeLog()
+    queue = MetadataWriteQueue(log, max_records=100, max_wait_ms=200)
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        keys = list(pool.map(lambda index: queue.commit([insert_record({"id": f"crop-{index}"})]), range(20)))
+
+    assert len(log.segments) == 1
+    assert set(keys) == {"segment-1"}
+    assert sorted(record["id"] for record in log.segments[0]) == sorted(f"crop-{index}" for index in range(20))
+    # Committed records are applied to the in-memory table under their segment
+    assert log.applied == [("segment-1", log.segments[0])]
+
+    stats = queue.stats()
+    assert stats["commits"] == 1
+    assert stats["records"] == 20
+    assert stats["requests"] == 20
+
+
+def test_commit_is_cut_at_max_records():
+    log = FakeLog()
+    queue = MetadataWriteQueue(log, max_records=5, max_wait_ms=200)
+
+    futures = [queue.submit([update_record(f"crop-{index}", {"status": "inactive"})]) for index in range(12)]
+    keys = [future.result(5) for future in futures]
+
+    assert [len(segment) for segment in log.segments] == [5, 5, 2]
+    assert keys == ["segment-1"] * 5 + ["segment-2"] * 5 + ["segment-3"] * 2
+    # Records keep their submission order across segments
+    assert [record["id"] for segment in log.segments for record in segment] == [f"crop-{index}" for index in range(12)]
+
+
+def test_writes_after_the_wait_window_go_to_a_new_segment():
+    log = FakeLog()
+    queue = MetadataWriteQueue(log, max_records=100, max_wait_ms=20)
+
+    assert queue.commit([insert_record({"id": "first"})]) == "segment-1"
+    assert queue.commit([insert_record({"id": "second"})]) == "segment-2"
+
+
+def test_failed_append_fails_every_request_in_the_commit():
+    log = FakeLog(fail=True)
+    queue = MetadataWriteQueue(log, max_records=100, max_wait_ms=100)
+
+    futures = [queue.submit([insert_record({"id": f"crop-{index}"})]) for index in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="S3 is down"):
+            future.result(5)
+    assert log.applied == []
+    assert queue.stats()["errors"] == 1
+
+    # The worker keeps running after a failed commit
+    log.fail = False
+    assert queue.commit([insert_record({"id": "retry"})]) == "segment-1"
+
+
+def test_empty_submission_resolves_immediately():
+    log = FakeLog()
+    queue = MetadataWriteQueue(log, max_records=100, max_wait_ms=100)
+    assert queue.submit([]).result(1) is None
+    assert log.segments == []
+
+
+def test_async_writes_are_group_committed():
+    log = FakeLog()
+    queue = MetadataWriteQueue(log, max_records=100, max_wait_ms=100)
+
+    async def main():
+        return await asyncio.gather(
+            *[queue.ainsert({"id": f"crop-{index}", "status": "active"}) for index in range(10)],
+            queue.aupdate("crop-0", {"status": "inactive"}),
+        )
+
+    keys = asyncio.run(main())
+    assert set(keys) == {"segment-1"}
+    assert len(log.segments[0]) == 11
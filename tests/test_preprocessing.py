@@ -0,0 +1,104 @@
+import io
+
+import numpy as np
+import pytest
+import torch
+from clip.clip import _transform
+from PIL import Image
+
+from api.preprocessing import DRAFT_OVERSAMPLE, decode_image, preprocess_bytes, preprocess_images
+
+N_PX = 224
+
+# Same pixels, same resampling: only float rounding of the normalization differs
+EXACT_TOLERANCE = 1e-4
+# JPEG draft decoding downscales in the DCT domain before the bicubic resize.
+# Values are normalized (about 1/(255 * 0.27) per 8-bit step), so these are
+# roughly a 17-level worst-case pixel error and a 2-level average one.
+DRAFT_MAX_TOLERANCE = 0.25
+DRAFT_MEAN_TOLERANCE = 0.025
+
+
+def synthetic_image(width: int, height: int, mode: str = "RGB", seed: int = 0) -> Image.Image:
+    """
+    Smooth gradients plus some noise, so resizing has real detail to work on.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 1, width)[None, :]
+    y = np.linspace(0, 1, height)[:, None]
+    channels = [
+        255 * x * np.ones_like(y),
+        255 * y * np.ones_like(x),
+        127.5 * (1 + np.sin(12 * x + 7 * y)),
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 3))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    if mode == "RGBA":
+        # Fully opaque: CLIP resizes before dropping alpha, which only matters for transparent pixels
+        image.putalpha(255)
+    elif mode != "RGB":
+        image = image.convert(mode)
+    return image
+
+
+def jpeg_bytes(image: Image.Image, quality: int = 95) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "size",
+    [
+        (224, 224),  # already the model resolution
+        (640, 480),  # landscape
+        (480, 640),  # portrait
+        (333, 777),  # odd sizes, odd crop offsets
+        (1001, 225),  # very wide
+        (100, 150),  # upscaled
+    ],
+)
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_preprocess_images_matches_clip_preprocess(size, mode):
+    preprocess = _transform(N_PX)
+    images = [synthetic_image(*size, mode=mode, seed=seed) for seed in range(2)]
+
+    expected = torch.stack([preprocess(image) for image in images])
+    actual = preprocess_images(images, N_PX)
+
+    assert actual.shape == (2, 3, N_PX, N_PX)
+    assert actual.dtype == torch.float32
+    assert float((expected - actual).abs().max()) < EXACT_TOLERANCE
+
+
+@pytest.mark.parametrize("size", [(640, 480), (480, 640), (1999, 1333)])
+def test_preprocess_bytes_without_draft_matches_clip_preprocess(size):
+    preprocess = _transform(N_PX)
+    data = jpeg_bytes(synthetic_image(*size))
+
+    expected = preprocess(Image.open(io.BytesIO(data))).unsqueeze(0)
+    actual = preprocess_images([decode_image(data)], N_PX)
+
+    assert float((expected - actual).abs().max()) < EXACT_TOLERANCE
+
+
+@pytest.mark.parametrize("size", [(1920, 1080), (1080, 1920), (2001, 1499)])
+def test_draft_decoding_stays_close_to_clip_preprocess(size, monkeypatch):
+    from api.config import settings
+
+    monkeypatch.setattr(settings, "fast_image_decode", True)
+    preprocess = _transform(N_PX)
+    data = jpeg_bytes(synthetic_image(*size))
+
+    # Draft mode really does decode at a reduced scale for these sizes
+    with decode_image(data, N_PX * DRAFT_OVERSAMPLE) as draft:
+        assert min(draft.size) < min(size)
+        assert min(draft.size) >= N_PX * DRAFT_OVERSAMPLE
+
+    expected = preprocess(Image.open(io.BytesIO(data))).unsqueeze(0)
+    actual = preprocess_bytes([data], N_PX)
+    difference = (expected - actual).abs()
+
+    assert actual.shape == (1, 3, N_PX, N_PX)
+    assert float(difference.max()) < DRAFT_MAX_TOLERANCE
+    assert float(difference.mean()) < DRAFT_MEAN_TOLERANCE
@@ -0,0 +1,66 @@
+import pytest
+
+import api.query_cache
+from api.query_cache import CachedVectorStore
+from api.vector_store import LocalVectorStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingStore(LocalVectorStore):
+    def __init__(self):
+        super().__init__(dimension=2, metric="cosine")
+        self.queries = 0
+
+    def query(self, *args, **kwargs):
+        self.queries += 1
+        return super().query(*args, **kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(api.query_cache.time, "monotonic", clock)
+    monkeypatch.setattr(api.query_cache._shared_last_write, "value", float("-inf"))
+    return clock
+
+
+def test_repeated_queries_are_cached_until_a_write(clock):
+    backend = CountingStore()
+    store = CachedVectorStore(backend, maxsize=10, ttl=300, settle_seconds=10)
+    store.upsert([{"id": "a", "values": [1.0, 0.0], "metadata": {}}])
+    clock.now += 10
+
+    assert store.query([1.0, 0.0], top_k=1)["matches"][0]["id"] == "a"
+    store.query([1.0, 0.0], top_k=1)
+    assert backend.queries == 1
+
+    store.upsert([{"id": "b", "values": [1.0, 0.1], "metadata": {}}])
+    clock.now += 10
+    store.query([1.0, 0.0], top_k=2)
+    store.query([1.0, 0.0], top_k=2)
+    assert backend.queries == 2
+
+
+def test_results_right_after_a_write_are_not_cached(clock):
+    backend = CountingStore()
+    store = CachedVectorStore(backend, maxsize=10, ttl=300, settle_seconds=10)
+    store.upsert([{"id": "a", "values": [1.0, 0.0], "metadata": {}}])
+
+    clock.now += 5
+    store.query([1.0, 0.0], top_k=1)
+    store.query([1.0, 0.0], top_k=1)
+    assert backend.queries == 2
+    assert store.stats()["query_cache"]["not_cached_settling"] == 2
+
+    # Once the write has settled, results are cached again
+    clock.now += 5
+    store.query([1.0, 0.0], top_k=1)
+    store.query([1.0, 0.0], top_k=1)
+    assert backend.queries == 3
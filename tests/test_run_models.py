@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import torch
+from PIL import Image
+
+import api.v1.endpoints.run_models as run_models
+from api.resources import resources
+
+BOXES = [
+    [0.0, 0.0, 10.0, 10.0, 0.75, 0.0],
+    [10.0, 10.0, 30.0, 20.0, 0.5, 0.0],
+    [5.0, 20.0, 25.0, 40.0, 0.25, 0.0],
+]
+
+
+class FakeBoxes:
+    def __init__(self, rows):
+        # [x1, y1, x2, y2, conf, cls_id] per box, like ultralytics' Boxes.data
+        self.data = torch.tensor(rows).reshape(-1, 6)
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.boxes = FakeBoxes(rows)
+
+
+class FakeDetectModel:
+    def predict(self, image):
+        return [FakeResult(BOXES)]
+
+
+class BarrierStore:
+    """
+    Vector store whose queries only return once every crop's query is in flight.
+    """
+
+    def __init__(self, parties):
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def query(self, vector, top_k, include_metadata=True):
+        self.barrier.wait()
+        return {"matches": [{"id": f"match-{vector[0]}", "score": vector[0], "metadata": {"color": f"c{vector[0]}"}}]}
+
+
+class GetRequest:
+    method = "GET"
+
+
+def test_crops_are_encoded_in_one_batch_and_looked_up_concurrently(monkeypatch):
+    batches = []
+
+    async def aencode_images(images):
+        batches.append([image.size for image in images])
+        return [[float(index), 0.0] for index in range(len(images))]
+
+    monkeypatch.setitem(resources._values, "detect_model", FakeDetectModel())
+    monkeypatch.setitem(resources._values, "vector_store", BarrierStore(len(BOXES)))
+    monkeypatch.setattr(run_models.embedding_service, "aencode_images", aencode_images)
+    monkeypatch.setattr(run_models, "load_image_from_s3", lambda s3_uri: Image.new("RGB", (64, 48)))
+
+    response = asyncio.run(run_models.detect_infer_metadata(GetRequest(), s3_uri="s3://bucket/frame.jpg"))
+
+    # One forward pass for all crops, in detection order
+    assert batches == [[(10, 10), (20, 10), (20, 20)]]
+    assert response["image_size"] == {"width": 64, "height": 48}
+    assert response["num_detections"] == 3
+    # Each detection gets the match for its own crop's embedding
+    assert [detection["pinecone_score"] for detection in response["detections"]] == [0.0, 1.0, 2.0]
+    assert [detection["pinecone_metadata"]["color"] for detection in response["detections"]] == ["c0.0", "c1.0", "c2.0"]
+    assert [detection["box"] for detection in response["detections"]] == [box[:4] for box in BOXES]
+    assert [detection["confidence"] for detection in response["detections"]] == [0.75, 0.5, 0.25]
+
+
+def test_image_without_detections_skips_encoding(monkeypatch):
+    class EmptyModel:
+        def predict(self, image):
+            return [FakeResult([])]
+
+    async def aencode_images(images):
+        raise AssertionError("nothing to encode")
+
+    monkeypatch.setitem(resources._values, "detect_model", EmptyModel())
+    monkeypatch.setattr(run_models.embedding_service, "aencode_images", aencode_images)
+    monkeypatch.setattr(run_models, "load_image_from_s3", lambda s3_uri: Image.new("RGB", (8, 8)))
+
+    response = asyncio.run(run_models.detect_infer_metadata(GetRequest(), s3_uri="s3://bucket/frame.jpg"))
+    assert response["num_detections"] == 0
+    assert response["detections"] == []
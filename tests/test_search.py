@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from api.search import DATETIME_TAKEN_TS, SearchFilters, build_filter, datetime_taken_timestamp
+from api.vector_store import matches_filter
+
+
+def test_no_filters():
+    assert build_filter(None) is None
+    assert build_filter(SearchFilters()) is None
+    # Empty values and empty lists are ignored
+    assert build_filter(SearchFilters(color="", brand=[], shape=["", ""])) is None
+
+
+def test_single_values_and_lists():
+    assert build_filter(SearchFilters(color="Red", brand=["Pepsi", "", "Coke"])) == {
+        "color": {"$eq": "Red"},
+        "brand": {"$in": ["Pepsi", "Coke"]},
+    }
+
+
+def test_date_range_is_inclusive_and_naive_datetimes_are_utc():
+    filters = SearchFilters(
+        datetime_taken_from=datetime(2024, 1, 1),
+        datetime_taken_to=datetime(2024, 1, 2, tzinfo=timezone.utc),
+    )
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    end = datetime(2024, 1, 2, tzinfo=timezone.utc).timestamp()
+    assert build_filter(filters) == {DATETIME_TAKEN_TS: {"$gte": start, "$lte": end}}
+
+    assert build_filter(SearchFilters(datetime_taken_to=datetime(2024, 1, 2))) == {
+        DATETIME_TAKEN_TS: {"$lte": end}
+    }
+
+
+def test_filters_parse_from_json():
+    filters = SearchFilters.model_validate_json(
+        '{"robot": ["R1", "R2"], "datetime_taken_from": "2024-01-01T00:00:00+00:00"}'
+    )
+    assert build_filter(filters) == {
+        "robot": {"$in": ["R1", "R2"]},
+        DATETIME_TAKEN_TS: {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()},
+    }
+
+
+@pytest.mark.parametrize(
+    "metadata, expected",
+    [
+        ({"color": "Red", "robot": "R1", "datetime_taken": "2024-01-01T12:00:00+00:00"}, True),
+        ({"color": "Red", "robot": "R3", "datetime_taken": "2024-01-01T12:00:00+00:00"}, False),
+        ({"color": "Blue", "robot": "R1", "datetime_taken": "2024-01-01T12:00:00+00:00"}, False),
+        ({"color": "Red", "robot": "R1", "datetime_taken": "2024-01-03T00:00:00+00:00"}, False),
+        # Records without the numeric timestamp never match a date range
+        ({"color": "Red", "robot": "R1", "datetime_taken": ""}, False),
+    ],
+)
+def test_built_filter_selects_matching_records(metadata, expected):
+    search_filter = build_filter(SearchFilters(
+        color="Red",
+        robot=["R1", "R2"],
+        datetime_taken_from=datetime(2024, 1, 1),
+        datetime_taken_to=datetime(2024, 1, 2),
+    ))
+    record = dict(metadata)
+    timestamp = datetime_taken_timestamp(record["datetime_taken"])
+    if timestamp is not None:
+        record[DATETIME_TAKEN_TS] = timestamp
+    assert matches_filter(record, search_filter) is expected
+
+
+def test_datetime_taken_timestamp():
+    assert datetime_taken_timestamp("2024-01-01 00:00:00.5+00:00") == pytest.approx(
+        datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp() + 0.5
+    )
+    assert datetime_taken_timestamp("") is None
+    assert datetime_taken_timestamp(None) is None
+    assert datetime_taken_timestamp("not a date") is None
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+from api.vector_store import LocalVectorStore, VectorStore, matches_filter
+
+METADATA = {
+    "color": "Red",
+    "brand": "Pepsi",
+    "tags": ["crushed", "dirty"],
+    "datetime_taken_ts": 1700000000.0,
+    "flag": True,
+}
+
+
+@pytest.mark.parametrize(
+    "filter, expected",
+    [
+        ({}, True),
+        ({"color": "Red"}, True),
+        ({"color": "Blue"}, False),
+        ({"color": {"$eq": "Red"}}, True),
+        ({"color": {"$ne": "Red"}}, False),
+        ({"color": {"$in": ["Blue", "Red"]}}, True),
+        ({"color": {"$nin": ["Blue", "Red"]}}, False),
+        # List-valued fields match if any element does
+        ({"tags": "dirty"}, True),
+        ({"tags": {"$in": ["clean", "crushed"]}}, True),
+        ({"tags": {"$nin": ["crushed"]}}, False),
+        ({"tags": {"$ne": "clean"}}, True),
+        ({"shape": {"$exists": False}}, True),
+        ({"color": {"$exists": True}}, True),
+        # A missing field never equals a value, and is never in a list
+        ({"shape": "Bottle"}, False),
+        ({"shape": {"$ne": "Bottle"}}, True),
+        ({"shape": {"$nin": ["Bottle"]}}, True),
+        ({"datetime_taken_ts": {"$gte": 1700000000, "$lt": 1800000000}}, True),
+        ({"datetime_taken_ts": {"$gt": 1700000000}}, False),
+        ({"datetime_taken_ts": {"$lte": 1600000000}}, False),
+        # Range operators only compare numbers
+        ({"color": {"$gt": 0}}, False),
+        ({"flag": {"$gte": 0}}, False),
+        ({"color": "Red", "brand": "Coke"}, False),
+        ({"$and": [{"color": "Red"}, {"brand": "Pepsi"}]}, True),
+        ({"$or": [{"color": "Blue"}, {"brand": "Pepsi"}]}, True),
+        ({"$or": [{"color": "Blue"}, {"brand": "Coke"}]}, False),
+    ],
+)
+def test_matches_filter(filter, expected):
+    assert matches_filter(METADATA, filter) is expected
+
+
+def test_matches_filter_rejects_unknown_operators():
+    with pytest.raises(ValueError):
+        matches_filter(METADATA, {"color": {"$regex": "R.*"}})
+
+
+def vector(*values):
+    return list(values) + [0.0] * (4 - len(values))
+
+
+@pytest.fixture
+def store():
+    store = LocalVectorStore(dimension=4, metric="cosine")
+    store.upsert([
+        {"id": "x", "values": vector(1.0), "metadata": {"color": "Red"}},
+        {"id": "xy", "values": vector(1.0, 1.0), "metadata": {"color": "Blue"}},
+        {"id": "y", "values": vector(0.0, 1.0), "metadata": {"color": "Red"}},
+        {"id": "neg", "values": vector(-1.0), "metadata": {"color": "Green"}},
+    ])
+    return store
+
+
+def test_query_ranks_by_cosine_similarity(store):
+    response = store.query(vector(2.0, 0.1), top_k=3)
+    assert [match["id"] for match in response["matches"]] == ["x", "xy", "y"]
+    scores = [match["score"] for match in response["matches"]]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(2.0 / np.linalg.norm([2.0, 0.1]), rel=1e-5)
+    assert response["matches"][0]["metadata"] == {"color": "Red"}
+
+
+def test_query_applies_filter_before_top_k(store):
+    response = store.query(vector(1.0), top_k=2, filter={"color": "Red"})
+    assert [match["id"] for match in response["matches"]] == ["x", "y"]
+
+    response = store.query(vector(1.0), top_k=5, filter={"color": {"$in": ["Green"]}})
+    assert [match["id"] for match in response["matches"]] == ["neg"]
+
+
+def test_query_include_flags(store):
+    match = store.query(vector(1.0), top_k=1, include_metadata=False, include_values=True)["matches"][0]
+    assert "metadata" not in match
+    assert match["values"] == vector(1.0)
+
+
+def test_query_rejects_wrong_dimension(store):
+    with pytest.raises(ValueError):
+        store.query([1.0, 0.0], top_k=1)
+    with pytest.raises(ValueError):
+        store.upsert([{"id": "bad", "values": [1.0, 0.0], "metadata": {}}])
+
+
+def test_upsert_overwrites_existing_ids(store):
+    store.upsert([{"id": "neg", "values": vector(1.0), "metadata": {"color": "Red"}}])
+    assert store.describe_index_stats()["total_vector_count"] == 4
+    assert store.fetch(["neg"])["vectors"]["neg"]["metadata"] == {"color": "Red"}
+    top = store.query(vector(1.0), top_k=2)["matches"]
+    assert {match["id"] for match in top} == {"x", "neg"}
+
+
+def test_delete_by_id_and_filter(store):
+    store.delete(ids=["x"])
+    assert store.fetch(["x"])["vectors"] == {}
+    # The row moved into the freed slot is still found by id and by query
+    assert store.fetch(["neg"])["vectors"]["neg"]["values"] == vector(-1.0)
+    assert store.query(vector(-1.0), top_k=1)["matches"][0]["id"] == "neg"
+
+    store.delete(filter={"color": "Red"})
+    assert sorted(vector_id for ids in store.list_ids() for vector_id in ids) == ["neg", "xy"]
+
+    store.delete(delete_all=True)
+    assert store.describe_index_stats()["total_vector_count"] == 0
+    assert store.query(vector(1.0), top_k=3)["matches"] == []
+
+
+def test_save_and_load_round_trip(store, tmp_path):
+    store.save(str(tmp_path))
+    loaded = LocalVectorStore(dimension=4, metric="cosine", path=str(tmp_path))
+
+    assert loaded.describe_index_stats()["total_vector_count"] == 4
+    expected = store.query(vector(1.0, 0.5), top_k=4, filter={"color": {"$ne": "Green"}})
+    assert loaded.query(vector(1.0, 0.5), top_k=4, filter={"color": {"$ne": "Green"}}) == expected
+
+
+def test_backends_must_implement_the_interface():
+    class QueryOnlyStore(VectorStore):
+        def query(self, vector, top_k, filter=None, include_metadata=True, include_values=False):
+            return {"matches": []}
+
+    with pytest.raises(TypeError):
+        QueryOnlyStore()